@@ -0,0 +1,91 @@
+"""
+Operational API Endpoints
+
+Disabled unless the BACKUP_TOKEN environment variable is set; callers must
+send it in the X-Backup-Token header. Covers backups, clinic-wide bulk
+export/import of plan data and cache metrics.
+"""
+import logging
+import os
+import secrets
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+
+import sys
+
+# 添加backend目录到路径
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from auth import session_cache
+from models.plan_generator import plan_generator
+from storage import DATA_DIR, get_plan_store
+from storage.aio import run_io
+from storage.backup import DEFAULT_BACKUP_DIR, create_backup
+from storage.bulk import DEFAULT_BATCH_SIZE, aimport_stream, aiter_ndjson
+from storage.cache import document_cache
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+def require_admin_token(x_backup_token: Optional[str] = Header(None)):
+    """Check the X-Backup-Token header against BACKUP_TOKEN"""
+    expected = os.environ.get("BACKUP_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_backup_token or not secrets.compare_digest(x_backup_token, expected):
+        raise HTTPException(status_code=403, detail="Invalid backup token")
+
+
+# ==================== Backup Endpoints ====================
+
+@router.post("/backup", dependencies=[Depends(require_admin_token)])
+async def backup(full: bool = False):
+    """Take an online backup of the data directory, including unflushed changes"""
+    try:
+        return await run_io(
+            create_backup, DATA_DIR, DEFAULT_BACKUP_DIR,
+            incremental=not full, cache=document_cache
+        )
+    except Exception as e:
+        logger.error(f"Backup failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
+
+
+# ==================== Bulk Export/Import Endpoints ====================
+
+@router.get("/export", dependencies=[Depends(require_admin_token)])
+async def export_all():
+    """Stream every user's children, test results and plans as NDJSON"""
+    return StreamingResponse(
+        aiter_ndjson(get_plan_store()),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="plan-data.ndjson"'}
+    )
+
+
+@router.post("/import", dependencies=[Depends(require_admin_token)])
+async def import_all(request: Request, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Import an NDJSON body, committing one batch of records at a time"""
+    try:
+        return await aimport_stream(get_plan_store(), request.stream(), max(1, batch_size))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Bulk import failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Bulk import failed: {str(e)}")
+
+
+# ==================== Monitoring Endpoints ====================
+
+@router.get("/metrics", dependencies=[Depends(require_admin_token)])
+async def metrics():
+    """Hit/miss counters of the in-process caches"""
+    return {
+        "session_cache": session_cache.stats(),
+        "parent_guidance_cache": plan_generator.guidance_cache.stats(),
+    }
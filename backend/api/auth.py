@@ -16,9 +16,11 @@ if backend_dir not in sys.path:
 
 from auth import (
     UserRegisterRequest, UserLoginRequest, UserResponse,
-    register_user, authenticate_user, create_session, delete_session,
+    register_user, authenticate_user_async, hash_password, run_password_hasher,
+    issue_token, delete_session,
     get_current_user, security
 )
+from storage.aio import run_io
 from user_data import (
     get_user_data, get_children, get_child, add_child,
     get_test_results, add_test_result,
@@ -39,10 +41,13 @@ async def register(request: UserRegisterRequest):
         logger.info(f"收到注册请求: {request.email}")
         
         # Register user
-        user = register_user(request.email, request.password, request.name)
+        password_hash = await run_password_hasher(hash_password, request.password)
+        user = await run_io(
+            register_user, request.email, request.password, request.name, password_hash
+        )
         
         # Create session
-        token = create_session(user.id)
+        token = await run_io(issue_token, user)
         
         return {
             "success": True,
@@ -66,7 +71,7 @@ async def login(request: UserLoginRequest):
         logger.info(f"收到登录请求: {request.email}")
         
         # Authenticate user
-        user = authenticate_user(request.email, request.password)
+        user = await authenticate_user_async(request.email, request.password)
         
         if not user:
             raise HTTPException(
@@ -75,7 +80,7 @@ async def login(request: UserLoginRequest):
             )
         
         # Create session
-        token = create_session(user.id)
+        token = await run_io(issue_token, user)
         
         return {
             "success": True,
@@ -97,7 +102,7 @@ async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Logout user"""
     try:
         token = credentials.credentials
-        delete_session(token)
+        await run_io(delete_session, token)
         
         return {
             "success": True,
@@ -113,7 +118,7 @@ async def get_current_user_info(user: UserResponse = Depends(get_current_user)):
     """Get current user information"""
     try:
         # Get user's data
-        user_data = get_user_data(user.id)
+        user_data = await run_io(get_user_data, user.id)
         
         return {
             "success": True,
@@ -4,13 +4,13 @@
 
 import logging
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict
 from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 import sys
 import os
-import json
 
 # 添加backend目录到路径
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,80 +18,119 @@ if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 
 from models.plan_generator import (
-    ChildInfo, TestResult, TrainingPlan, DailyTask,
-    plan_generator
+    ChildInfo, TestResult, TrainingPlan,
+    add_test_score, plan_generator, run_batch_generation, summarize_plan_progress, update_score_aggregate
 )
 from dataclasses import asdict
 from auth import get_current_user, UserResponse
+from storage import get_plan_archive, get_plan_store
+from storage.aio import run_io
+from storage.bulk import aimport_stream, aiter_ndjson
+from storage.indexes import find_task_position
 from utils.i18n import t, get_language_from_request
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/plans", tags=["plans"])
 
-# ==================== 用户数据存储文件 ====================
-DATA_DIR = "data"
-USER_CHILDREN_FILE = os.path.join(DATA_DIR, "user_children.json")
-USER_PLANS_FILE = os.path.join(DATA_DIR, "user_plans.json")
-USER_TEST_RESULTS_FILE = os.path.join(DATA_DIR, "user_test_results.json")
+# ==================== 数据存储函数（基于用户ID） ====================
+# 实际存储由 storage 包提供（默认SQLite，可通过 PLAN_STORE_BACKEND=json 使用旧的JSON文件）
+# 读写在存储线程池中执行，不阻塞事件循环
 
-# 确保数据目录存在
-os.makedirs(DATA_DIR, exist_ok=True)
+async def get_user_children(user_id: str) -> Dict:
+    """获取用户的所有孩子"""
+    return await get_plan_store().aload("children", user_id)
 
-# ==================== 数据存储函数（基于用户ID） ====================
+async def get_user_plan(user_id: str, plan_id: str) -> Optional[Dict]:
+    """获取用户的单个计划（只读取这一条记录）"""
+    return await get_plan_store().aget_record("plans", user_id, plan_id)
 
-def load_user_data_file(file_path: str) -> Dict:
-    """加载用户数据文件"""
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading {file_path}: {e}")
-            return {}
-    return {}
-
-def save_user_data_file(file_path: str, data: Dict):
-    """保存用户数据文件"""
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Error saving {file_path}: {e}")
-        raise
+async def get_child_plans_data(user_id: str, child_id: str) -> Dict:
+    """获取单个孩子的计划（通过 child_id 索引查找）"""
+    return await get_plan_store().aload_child_plans(user_id, child_id)
 
-def get_user_children(user_id: str) -> Dict:
-    """获取用户的所有孩子"""
-    data = load_user_data_file(USER_CHILDREN_FILE)
-    return data.get(user_id, {})
+async def get_user_archived_plans(user_id: str) -> Dict:
+    """获取用户已归档的计划（仅在明确请求时读取冷存储）"""
+    return await run_io(get_plan_archive().load, user_id)
 
-def save_user_children(user_id: str, children: Dict):
+async def save_user_children(user_id: str, children: Dict):
     """保存用户的孩子数据"""
-    data = load_user_data_file(USER_CHILDREN_FILE)
-    data[user_id] = children
-    save_user_data_file(USER_CHILDREN_FILE, data)
+    await get_plan_store().asave("children", user_id, children)
 
-def get_user_plans(user_id: str) -> Dict:
+async def get_user_plans(user_id: str) -> Dict:
     """获取用户的所有计划"""
-    data = load_user_data_file(USER_PLANS_FILE)
-    return data.get(user_id, {})
+    return await get_plan_store().aload("plans", user_id)
 
-def save_user_plans(user_id: str, plans: Dict):
+async def save_user_plans(user_id: str, plans: Dict):
     """保存用户的计划数据"""
-    data = load_user_data_file(USER_PLANS_FILE)
-    data[user_id] = plans
-    save_user_data_file(USER_PLANS_FILE, data)
+    await get_plan_store().asave("plans", user_id, plans)
 
-def get_user_test_results(user_id: str) -> Dict:
+async def get_user_test_results(user_id: str) -> Dict:
     """获取用户的所有测试结果"""
-    data = load_user_data_file(USER_TEST_RESULTS_FILE)
-    return data.get(user_id, {})
+    return await get_plan_store().aload("test_results", user_id)
 
-def save_user_test_results(user_id: str, test_results: Dict):
+async def save_user_test_results(user_id: str, test_results: Dict):
     """保存用户的测试结果数据"""
-    data = load_user_data_file(USER_TEST_RESULTS_FILE)
-    data[user_id] = test_results
-    save_user_data_file(USER_TEST_RESULTS_FILE, data)
+    await get_plan_store().asave("test_results", user_id, test_results)
+
+async def save_user_child(user_id: str, child_id: str, child: Dict):
+    """保存单个孩子（只写入这一条记录）"""
+    await get_plan_store().aput_record("children", user_id, child_id, child)
+
+async def save_user_plan(user_id: str, plan_id: str, plan: Dict):
+    """保存单个计划（只写入这一条记录）"""
+    await get_plan_store().aput_record("plans", user_id, plan_id, plan)
+
+async def save_child_test_results(user_id: str, child_id: str, results: List[Dict]):
+    """保存单个孩子的测试结果列表"""
+    await get_plan_store().aput_record("test_results", user_id, child_id, results)
+
+async def save_user_plans_batch(user_id: str, plans: List[Dict]):
+    """一次提交保存多个计划"""
+    await get_plan_store().aput_records(("plans", user_id, plan["plan_id"], plan) for plan in plans)
+
+
+def _aggregate_result_dicts(results: List[Dict]) -> Dict:
+    """从保存的测试结果列表计算得分统计"""
+    aggregates = {}
+    for result in results:
+        if 'score' in result:
+            add_test_score(aggregates, result.get('test_type', ''), result['score'], result.get('performance_level'))
+    return aggregates
+
+async def get_child_score_aggregates(user_id: str, child: Dict) -> Dict:
+    """孩子的得分累计统计；旧记录没有保存统计时从历史测试结果补算"""
+    aggregates = child.get("score_aggregates")
+    if aggregates is None:
+        history = await get_plan_store().aget_record("test_results", user_id, child.get("child_id")) or []
+        aggregates = _aggregate_result_dicts(history)
+    return aggregates
+
+def _child_score_update(test_type: str, score: float, performance_level: Optional[str],
+                        backfill: Dict) -> Callable[[Dict], None]:
+    """把一次测试并入孩子记录得分统计的 update_record 回调"""
+    def apply(child: Dict):
+        if child.get("score_aggregates") is None:
+            child["score_aggregates"] = backfill
+        add_test_score(child["score_aggregates"], test_type, score, performance_level)
+    return apply
+
+async def add_child_test_score(user_id: str, child_id: str, test_type: str, score: float,
+                               performance_level: Optional[str], backfill: Optional[Dict] = None):
+    """把一次测试并入孩子记录中的得分统计（backfill 为旧记录没有统计时的补算结果）"""
+    if backfill is None:
+        child = await get_plan_store().aget_record("children", user_id, child_id)
+        if child is None:
+            return
+        backfill = await get_child_score_aggregates(user_id, child)
+    
+    try:
+        await get_plan_store().aupdate_record(
+            "children", user_id, child_id,
+            _child_score_update(test_type, score, performance_level, backfill)
+        )
+    except KeyError:
+        pass  # 孩子已被删除
 
 
 # ==================== Request/Response Models ====================
@@ -126,6 +165,40 @@ class PlanCreateRequest(BaseModel):
     test_results: List[dict]
 
 
+class BatchPlanCreateRequest(BaseModel):
+    items: List[PlanCreateRequest]
+
+
+def _build_test_results(child_id: str, raw_results: List[dict]) -> List[TestResult]:
+    """把请求中的测试结果转换为TestResult；没有测试结果时使用默认的一般水平结果"""
+    test_results = []
+    for tr_data in raw_results:
+        result = TestResult(
+            test_id=tr_data.get('test_id', f"test_{datetime.now().strftime('%Y%m%d%H%M%S')}"),
+            child_id=child_id,
+            test_type=tr_data['test_type'],
+            test_data=tr_data.get('test_data', {}),
+            score=tr_data['score'],
+            performance_level=tr_data['performance_level'],
+            timestamp=tr_data.get('timestamp', datetime.now().isoformat())
+        )
+        test_results.append(result)
+    
+    # 如果没有测试结果，创建一个默认的
+    if not test_results:
+        default_result = TestResult(
+            test_id=f"default_test_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            child_id=child_id,
+            test_type="initial",
+            test_data={},
+            score=60.0,
+            performance_level="average",
+            timestamp=datetime.now().isoformat()
+        )
+        test_results.append(default_result)
+    return test_results
+
+
 # ==================== API Endpoints ====================
 
 @router.post("/children", response_model=dict)
@@ -152,14 +225,10 @@ async def create_child(
         )
         
         # 保存到用户数据
-        children = get_user_children(user.id)
-        children[child_id] = asdict(child)
-        save_user_children(user.id, children)
+        await save_user_child(user.id, child_id, asdict(child))
         
         # 初始化测试结果
-        test_results = get_user_test_results(user.id)
-        test_results[child_id] = []
-        save_user_test_results(user.id, test_results)
+        await save_child_test_results(user.id, child_id, [])
         
         logger.info(f"孩子信息创建成功: {child_id} for user {user.id}")
         return {
@@ -189,7 +258,7 @@ async def get_children(
 ):
     """获取当前用户的所有孩子"""
     try:
-        children = get_user_children(user.id)
+        children = await get_user_children(user.id)
         children_list = list(children.values())
         
         return {
@@ -211,7 +280,7 @@ async def get_child(
 ):
     """获取孩子信息（只返回属于当前用户的孩子）"""
     try:
-        children = get_user_children(user.id)
+        children = await get_user_children(user.id)
         if child_id not in children:
             error_msg = t("error.child_access_denied", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
@@ -248,7 +317,7 @@ async def submit_test_result(
     """提交测试结果（关联到当前用户）"""
     try:
         # 验证孩子属于当前用户
-        children = get_user_children(user.id)
+        children = await get_user_children(user.id)
         if test_result.child_id not in children:
             error_msg = t("error.child_access_denied", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
@@ -263,12 +332,21 @@ async def submit_test_result(
             timestamp=datetime.now().isoformat()
         )
         
-        # 保存到用户数据
-        test_results = get_user_test_results(user.id)
-        if test_result.child_id not in test_results:
-            test_results[test_result.child_id] = []
-        test_results[test_result.child_id].append(asdict(result))
-        save_user_test_results(user.id, test_results)
+        # 旧的孩子记录没有得分统计时，用追加本次结果之前的历史补算
+        backfill = await get_child_score_aggregates(user.id, children[test_result.child_id])
+        # 结果列表和孩子的得分统计在同一次存储提交中读改写：并发提交不会互相覆盖，
+        # 中途失败也不会只留下其中一个
+        try:
+            await get_plan_store().aupdate_records([
+                ("test_results", user.id, test_result.child_id,
+                 lambda results: results.append(asdict(result)), []),
+                ("children", user.id, test_result.child_id,
+                 _child_score_update(result.test_type, result.score, result.performance_level, backfill), None),
+            ])
+        except KeyError:
+            # 孩子在提交过程中被删除
+            error_msg = t("error.child_access_denied", request=request)
+            raise HTTPException(status_code=404, detail=error_msg)
         
         return {
             "success": True,
@@ -296,12 +374,12 @@ async def get_test_results(
     """获取孩子的测试结果历史（只返回属于当前用户的孩子）"""
     try:
         # 验证孩子属于当前用户
-        children = get_user_children(user.id)
+        children = await get_user_children(user.id)
         if child_id not in children:
             error_msg = t("error.child_access_denied", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
         
-        test_results = get_user_test_results(user.id)
+        test_results = await get_user_test_results(user.id)
         results = test_results.get(child_id, [])
         
         return {
@@ -328,7 +406,7 @@ async def create_plan(
     """创建训练计划（关联到当前用户）"""
     try:
         # 验证孩子属于当前用户
-        children = get_user_children(user.id)
+        children = await get_user_children(user.id)
         if request.child_id not in children:
             error_msg = t("error.child_access_denied", request=http_request)
             raise HTTPException(status_code=404, detail=error_msg)
@@ -337,32 +415,11 @@ async def create_plan(
         # 将字典转换为ChildInfo对象
         child = ChildInfo(**child_data)
         
-        # 转换测试结果
-        test_results = []
-        for tr_data in request.test_results:
-            result = TestResult(
-                test_id=tr_data.get('test_id', f"test_{datetime.now().strftime('%Y%m%d%H%M%S')}"),
-                child_id=request.child_id,
-                test_type=tr_data['test_type'],
-                test_data=tr_data.get('test_data', {}),
-                score=tr_data['score'],
-                performance_level=tr_data['performance_level'],
-                timestamp=tr_data.get('timestamp', datetime.now().isoformat())
-            )
-            test_results.append(result)
-        
-        # 如果没有测试结果，创建一个默认的
-        if not test_results:
-            default_result = TestResult(
-                test_id=f"default_test_{datetime.now().strftime('%Y%m%d%H%M%S')}",
-                child_id=request.child_id,
-                test_type="initial",
-                test_data={},
-                score=60.0,
-                performance_level="average",
-                timestamp=datetime.now().isoformat()
-            )
-            test_results.append(default_result)
+        # 没有提交测试结果时使用孩子已累计的得分统计，都没有时使用默认结果
+        score_aggregates = None
+        if not request.test_results:
+            score_aggregates = await get_child_score_aggregates(user.id, child_data) or None
+        test_results = [] if score_aggregates else _build_test_results(request.child_id, request.test_results)
         
         # Get language from request
         from utils.i18n import get_language_from_request
@@ -370,12 +427,12 @@ async def create_plan(
         logger.info(f"Language detected from request: {language} (X-Language: {http_request.headers.get('X-Language', 'not set')}, Accept-Language: {http_request.headers.get('Accept-Language', 'not set')})")
         
         # 生成计划
-        plan = plan_generator.generate_plan(child, test_results, request.plan_type, language=language)
+        plan = plan_generator.generate_plan(
+            child, test_results, request.plan_type, language=language, score_aggregates=score_aggregates
+        )
         
-        # 保存到用户数据
-        plans = get_user_plans(user.id)
-        plans[plan.plan_id] = asdict(plan)
-        save_user_plans(user.id, plans)
+        # 保存到用户数据（只保存模板引用，文本在读取时按语言渲染）
+        await save_user_plan(user.id, plan.plan_id, plan_generator.compact_plan(asdict(plan)))
         
         # 返回计划数据
         return {
@@ -416,6 +473,81 @@ async def create_plan(
         raise HTTPException(status_code=500, detail=f"{error_msg}: {str(e)}")
 
 
+@router.post("/plans/batch", response_model=dict)
+async def create_plans_batch(
+    request: BatchPlanCreateRequest,
+    http_request: Request,
+    user: UserResponse = Depends(get_current_user)
+):
+    """批量创建训练计划：在进程池中并行生成，所有计划一次提交保存，逐项返回结果"""
+    try:
+        children = await get_user_children(user.id)
+        language = get_language_from_request(http_request)
+        
+        results: List[Optional[Dict]] = [None] * len(request.items)
+        jobs = []
+        job_indexes = []
+        for index, item in enumerate(request.items):
+            if item.child_id not in children:
+                error_msg = t("error.child_access_denied", request=http_request)
+                results[index] = {"child_id": item.child_id, "success": False, "error": error_msg}
+                continue
+            score_aggregates = None
+            if not item.test_results:
+                score_aggregates = await get_child_score_aggregates(user.id, children[item.child_id]) or None
+            try:
+                test_results = [] if score_aggregates else _build_test_results(item.child_id, item.test_results)
+            except (KeyError, TypeError, ValueError) as e:
+                results[index] = {"child_id": item.child_id, "success": False, "error": f"invalid test result: {e}"}
+                continue
+            jobs.append({
+                "child": children[item.child_id],
+                "test_results": [asdict(result) for result in test_results],
+                "plan_type": item.plan_type,
+                "language": language,
+                "score_aggregates": score_aggregates,
+            })
+            job_indexes.append(index)
+        
+        plans = []
+        plan_ids = set(await get_user_plans(user.id)) if jobs else set()
+        for index, generated in zip(job_indexes, await run_batch_generation(jobs)):
+            child_id = request.items[index].child_id
+            if "error" in generated:
+                results[index] = {"child_id": child_id, "success": False, "error": generated["error"]}
+                continue
+            plan = generated["plan"]
+            # 同一孩子在同一秒内生成的计划ID相同，加上序号，直到与已有计划和本批次的计划都不重复
+            plan_id, suffix = plan["plan_id"], index
+            while plan_id in plan_ids:
+                plan_id = f"{plan['plan_id']}_{suffix}"
+                suffix += 1
+            plan["plan_id"] = plan_id
+            plan_ids.add(plan_id)
+            plans.append(plan)
+            results[index] = {"child_id": child_id, "success": True, "plan_id": plan["plan_id"]}
+        
+        if plans:
+            await save_user_plans_batch(user.id, plans)
+        
+        return {
+            "success": True,
+            "data": {
+                "results": results,
+                "succeeded": len(plans),
+                "failed": len(results) - len(plans)
+            },
+            "message": t("success.plans_batch_generated", request=http_request,
+                         succeeded=len(plans), total=len(results))
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量创建计划失败: {e}", exc_info=True)
+        error_msg = t("error.create_plan_failed", request=http_request)
+        raise HTTPException(status_code=500, detail=f"{error_msg}: {str(e)}")
+
+
 @router.get("/plans", response_model=dict)
 async def get_all_plans(
     request: Request,
@@ -423,7 +555,7 @@ async def get_all_plans(
 ):
     """获取当前用户的所有计划"""
     try:
-        plans = get_user_plans(user.id)
+        plans = await get_user_plans(user.id)
         plans_list = []
         
         # Get language from request
@@ -450,6 +582,36 @@ async def get_all_plans(
         error_msg = t("error.get_plans_failed", request=request)
         raise HTTPException(status_code=500, detail=f"{error_msg}: {str(e)}")
 
+@router.get("/archived-plans", response_model=dict)
+async def get_archived_plans(
+    request: Request,
+    user: UserResponse = Depends(get_current_user)
+):
+    """获取当前用户已归档（已完成或已过期）的计划"""
+    try:
+        plans = await get_user_archived_plans(user.id)
+        language = get_language_from_request(request)
+        
+        plans_list = []
+        for plan_data in plans.values():
+            translated_plan = _translate_plan_data(plan_data, language)
+            plans_list.append({
+                **translated_plan,
+                "progress": _calculate_progress_from_dict(translated_plan)
+            })
+        
+        return {
+            "success": True,
+            "data": {
+                "plans": plans_list
+            }
+        }
+    except Exception as e:
+        logger.error(f"获取归档计划失败: {e}")
+        error_msg = t("error.get_plans_failed", request=request)
+        raise HTTPException(status_code=500, detail=f"{error_msg}: {str(e)}")
+
+
 @router.get("/plans/{plan_id}", response_model=dict)
 async def get_plan(
     plan_id: str,
@@ -458,13 +620,14 @@ async def get_plan(
 ):
     """获取训练计划（只返回属于当前用户的计划）"""
     try:
-        plans = get_user_plans(user.id)
-        if plan_id not in plans:
+        plan_data = await get_user_plan(user.id, plan_id)
+        if plan_data is None:
+            # 已结束的计划可能已被移入冷存储归档
+            plan_data = (await get_user_archived_plans(user.id)).get(plan_id)
+        if plan_data is None:
             error_msg = t("error.plan_access_denied", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
         
-        plan_data = plans[plan_id]
-        
         # Get language from request and translate plan data
         language = get_language_from_request(request)
         logger.info(f"[GET /plans/{plan_id}] Language detected: {language}, X-Language header: {request.headers.get('X-Language', 'not set')}, Accept-Language header: {request.headers.get('Accept-Language', 'not set')}")
@@ -491,16 +654,12 @@ async def get_child_plans(
     """获取孩子的所有计划（只返回属于当前用户的孩子）"""
     try:
         # 验证孩子属于当前用户
-        children = get_user_children(user.id)
+        children = await get_user_children(user.id)
         if child_id not in children:
             error_msg = t("error.child_access_denied", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
         
-        plans = get_user_plans(user.id)
-        child_plans = [
-            plan_data for plan_data in plans.values()
-            if plan_data.get("child_id") == child_id
-        ]
+        child_plans = list((await get_child_plans_data(user.id, child_id)).values())
         
         # Get language from request and translate plans
         language = get_language_from_request(request)
@@ -537,59 +696,72 @@ async def update_daily_task(
 ):
     """更新每日任务状态（只更新属于当前用户的计划）"""
     try:
-        plans = get_user_plans(user.id)
-        if plan_id not in plans:
+        def apply_update(plan_data: Dict) -> Dict:
+            """只修改目标任务（以及难度调整涉及的后续任务），不重建整个计划"""
+            daily_tasks = plan_data.get("daily_tasks", [])
+            # 先找到对应的任务再修改计划；在存储线程中执行，找不到时抛出 IndexError 由外层转换为 404
+            task_index = find_task_position(daily_tasks, day)
+            if task_index is None:
+                raise IndexError(day)
+            
+            stats = plan_data.get("progress_stats")
+            if stats is None:
+                # 旧格式计划（没有进度统计）在第一次更新时一次性转换为模板引用格式
+                daily_tasks = plan_data["daily_tasks"] = [plan_generator.compact_task(item) for item in daily_tasks]
+                stats = plan_data["progress_stats"] = summarize_plan_progress(daily_tasks)
+            task = daily_tasks[task_index]
+            
+            # 更新任务状态
+            stats["tasks_completed"] += int(update.completed) - int(bool(task.get("completed")))
+            task["completed"] = update.completed
+            
+            # 如果有测试结果，更新测试状态并调整后续任务
+            previous_result = task.get("test_result")
+            if update.test_result:
+                if not task.get("test_completed"):
+                    stats["tests_completed"] += 1
+                test_result = TestResult(
+                    test_id=f"test_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                    child_id=plan_data.get("child_id"),
+                    test_type=task.get("test_type") or "general",
+                    test_data=update.test_result.get('test_data', {}),
+                    score=update.test_result.get('score', 0),
+                    performance_level=update.test_result.get('performance_level', 'average'),
+                    timestamp=datetime.now().isoformat()
+                )
+                plan_generator.apply_test_result_to_tasks(
+                    daily_tasks, task_index, plan_data.get("duration_days", len(daily_tasks)), test_result
+                )
+                task["test_result"] = update.test_result
+                if previous_result:
+                    # 重新提交同一天的测试：从各天结果重算，旧分数不重复计入
+                    stats["scores"] = summarize_plan_progress(daily_tasks)["scores"]
+                elif 'score' in update.test_result:
+                    stats["scores"] = update_score_aggregate(
+                        stats["scores"], update.test_result['score'],
+                        update.test_result.get('performance_level', 'average')
+                    )
+            
+            # 所有任务完成后计划标记为已完成（结束后会被归档），取消完成的任务后恢复为进行中
+            plan_data["status"] = "completed" if stats["tasks_completed"] >= stats["tasks_total"] else "active"
+            
+            return dict(task, child_id=plan_data.get("child_id")), previous_result is None
+        
+        try:
+            task, first_result = await get_plan_store().aupdate_record("plans", user.id, plan_id, apply_update)
+        except KeyError:
             error_msg = t("error.plan_access_denied", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
-        
-        plan_data = plans[plan_id]
-        daily_tasks = plan_data.get("daily_tasks", [])
-        
-        # 找到对应的任务
-        task = None
-        task_index = None
-        for i, task_item in enumerate(daily_tasks):
-            if task_item.get("day") == day:
-                task = task_item
-                task_index = i
-                break
-        
-        if not task:
+        except IndexError:
             error_msg = t("error.task_not_found", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
         
-        # 更新任务状态
-        task["completed"] = update.completed
-        
-        # 如果有测试结果，更新测试状态
-        if update.test_result:
-            # 将字典转换为TrainingPlan对象用于更新
-            plan_obj = TrainingPlan(**plan_data)
-            daily_task_obj = DailyTask(**task)
-            
-            test_result = TestResult(
-                test_id=f"test_{datetime.now().strftime('%Y%m%d%H%M%S')}",
-                child_id=plan_obj.child_id,
-                test_type=daily_task_obj.test_type or "general",
-                test_data=update.test_result.get('test_data', {}),
-                score=update.test_result.get('score', 0),
-                performance_level=update.test_result.get('performance_level', 'average'),
-                timestamp=datetime.now().isoformat()
+        # 任务测试同样计入孩子的得分累计统计（同一天重新提交的不再计入）
+        if update.test_result and 'score' in update.test_result and first_result:
+            await add_child_test_score(
+                user.id, task["child_id"], task.get("test_type") or "general",
+                update.test_result['score'], update.test_result.get('performance_level', 'average')
             )
-            
-            # 更新计划
-            updated_plan = plan_generator.update_plan_with_test_result(plan_obj, day, test_result)
-            plan_data = asdict(updated_plan)
-            
-            task["test_completed"] = True
-            task["test_result"] = update.test_result
-        
-        # 更新daily_tasks
-        plan_data["daily_tasks"] = daily_tasks
-        
-        # 保存更新
-        plans[plan_id] = plan_data
-        save_user_plans(user.id, plans)
         
         return {
             "success": True,
@@ -617,20 +789,23 @@ async def get_plan_progress(
 ):
     """获取计划进度（只返回属于当前用户的计划）"""
     try:
-        plans = get_user_plans(user.id)
-        if plan_id not in plans:
+        plan_data = await get_user_plan(user.id, plan_id)
+        if plan_data is None:
+            # 已结束的计划可能已被移入冷存储归档
+            plan_data = (await get_user_archived_plans(user.id)).get(plan_id)
+        if plan_data is None:
             error_msg = t("error.plan_access_denied", request=request)
             raise HTTPException(status_code=404, detail=error_msg)
-        
-        plan_data = plans[plan_id]
         daily_tasks = plan_data.get("daily_tasks", [])
         
-        completed_tasks = sum(1 for task in daily_tasks if task.get("completed", False))
-        completed_tests = sum(1 for task in daily_tasks if task.get("test_completed", False))
-        total_tasks = len(daily_tasks)
-        total_tests = sum(1 for task in daily_tasks if task.get("test_required", False))
+        # 计数和分数统计随任务更新累计保存在计划中，旧计划没有时临时计算
+        stats = plan_data.get("progress_stats") or summarize_plan_progress(daily_tasks)
+        completed_tasks = stats["tasks_completed"]
+        completed_tests = stats["tests_completed"]
+        total_tasks = stats["tasks_total"]
+        total_tests = stats["tests_total"]
         
-        # 计算测试分数趋势
+        # 各天的测试分数
         test_scores = []
         for task in daily_tasks:
             test_result = task.get("test_result")
@@ -654,6 +829,7 @@ async def get_plan_progress(
                     "tests_percentage": round(completed_tests / total_tests * 100, 1) if total_tests > 0 else 0
                 },
                 "test_scores": test_scores,
+                "score_summary": stats["scores"],
                 "improvement_trend": _calculate_improvement_trend(test_scores, request)
             }
         }
@@ -666,119 +842,15 @@ async def get_plan_progress(
 
 
 def _translate_plan_data(plan_data: dict, language: str) -> dict:
-    """翻译计划数据到指定语言"""
-    from utils.i18n import t, get_language_from_request
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    logger.info(f"Translating plan data to language: {language}")
-    
-    def translate_text(key: str, **kwargs) -> str:
-        return t(key, language=language, request=None, **kwargs)
-    
-    translated_plan = plan_data.copy()
-    
-    # Translate goals
-    if "goals" in translated_plan and isinstance(translated_plan["goals"], list):
-        # Goals are already translated when created, but we need to re-translate them
-        # Since we don't have the original keys, we'll keep them as-is for now
-        # In a production system, you'd store translation keys with the plan
-        pass
-    
-    # Translate daily tasks
-    if "daily_tasks" in translated_plan and isinstance(translated_plan["daily_tasks"], list):
-        translated_tasks = []
-        for task in translated_plan["daily_tasks"]:
-            translated_task = task.copy()
-            
-            # Translate activities
-            if "activities" in translated_task and isinstance(translated_task["activities"], list):
-                translated_activities = []
-                for activity in translated_task["activities"]:
-                    translated_activity = activity.copy()
-                    
-                    # Translate activity name, description, and instructions based on activity type
-                    activity_type = activity.get("type", "")
-                    game_type = activity.get("game_type", "")
-                    
-                    # Map activity types to translation keys
-                    if activity_type == "online_game":
-                        if game_type == "schulte" or "schulte" in activity.get("name", "").lower():
-                            if "advanced" in activity.get("name", "").lower():
-                                translated_activity["name"] = translate_text("activity.name.schulte_advanced")
-                                translated_activity["description"] = translate_text("activity.desc.schulte_advanced")
-                                translated_activity["detailed_instructions"] = translate_text("activity.instruction.schulte_advanced")
-                            else:
-                                translated_activity["name"] = translate_text("activity.name.schulte_basic")
-                                translated_activity["description"] = translate_text("activity.desc.schulte_basic")
-                                translated_activity["detailed_instructions"] = translate_text("activity.instruction.schulte_basic")
-                        elif game_type == "attention_tracking" or "attention" in activity.get("name", "").lower():
-                            translated_activity["name"] = translate_text("activity.name.attention_tracking")
-                            translated_activity["description"] = translate_text("activity.desc.attention_tracking")
-                            translated_activity["detailed_instructions"] = translate_text("activity.instruction.attention_tracking")
-                        elif game_type == "puzzle" or "puzzle" in activity.get("name", "").lower():
-                            translated_activity["name"] = translate_text("activity.name.online_puzzle")
-                            translated_activity["description"] = translate_text("activity.desc.online_puzzle")
-                            translated_activity["detailed_instructions"] = translate_text("activity.instruction.online_puzzle")
-                        elif game_type == "memory" or "memory" in activity.get("name", "").lower():
-                            translated_activity["name"] = translate_text("activity.name.memory_cards")
-                            translated_activity["description"] = translate_text("activity.desc.memory_cards")
-                            translated_activity["detailed_instructions"] = translate_text("activity.instruction.memory_cards")
-                        elif game_type == "color_match" or "color" in activity.get("name", "").lower():
-                            translated_activity["name"] = translate_text("activity.name.color_match")
-                            translated_activity["description"] = translate_text("activity.desc.color_match")
-                            translated_activity["detailed_instructions"] = translate_text("activity.instruction.color_match")
-                        elif game_type == "sound_play" or "sound" in activity.get("name", "").lower():
-                            translated_activity["name"] = translate_text("activity.name.sound_play")
-                            translated_activity["description"] = translate_text("activity.desc.sound_play")
-                            translated_activity["detailed_instructions"] = translate_text("activity.instruction.sound_play")
-                    elif activity_type == "reading":
-                        translated_activity["name"] = translate_text("activity.name.focused_reading")
-                        translated_activity["description"] = translate_text("activity.desc.focused_reading")
-                        translated_activity["detailed_instructions"] = translate_text("activity.instruction.focused_reading")
-                    elif activity_type == "role_play":
-                        translated_activity["name"] = translate_text("activity.name.role_play")
-                        translated_activity["description"] = translate_text("activity.desc.role_play")
-                        translated_activity["detailed_instructions"] = translate_text("activity.instruction.role_play")
-                    elif activity_type == "conversation":
-                        translated_activity["name"] = translate_text("activity.name.conversation_practice")
-                        translated_activity["description"] = translate_text("activity.desc.conversation_practice")
-                        translated_activity["detailed_instructions"] = translate_text("activity.instruction.conversation_practice")
-                    
-                    translated_activities.append(translated_activity)
-                translated_task["activities"] = translated_activities
-            
-            # Regenerate parent guidance with correct language
-            if "parent_guidance" in translated_task and "activities" in translated_task:
-                # Extract focus areas from plan data if available
-                focus_areas = translated_plan.get("focus_areas", [])
-                if not focus_areas:
-                    # Infer from activities
-                    focus_areas = []
-                    for act in translated_task["activities"]:
-                        act_type = act.get("type", "")
-                        if act_type == "online_game" and "attention" in act.get("name", "").lower():
-                            if "attention" not in focus_areas:
-                                focus_areas.append("attention")
-                
-                # Regenerate parent guidance using plan generator
-                day = translated_task.get("day", 1)
-                activities = translated_task["activities"]
-                translated_task["parent_guidance"] = plan_generator._generate_parent_guidance(
-                    focus_areas, day, activities, language
-                )
-            
-            translated_tasks.append(translated_task)
-        translated_plan["daily_tasks"] = translated_tasks
-    
-    return translated_plan
+    """按指定语言渲染存储的计划（活动文本和家长指导在读取时生成）"""
+    return plan_generator.render_plan(plan_data, language)
 
 
 def _calculate_progress_from_dict(plan_data: dict) -> dict:
-    """从字典计算计划进度"""
-    daily_tasks = plan_data.get("daily_tasks", [])
-    completed = sum(1 for task in daily_tasks if task.get("completed", False))
-    total = len(daily_tasks)
+    """从字典计算计划进度（优先读取保存的进度统计）"""
+    stats = plan_data.get("progress_stats") or summarize_plan_progress(plan_data.get("daily_tasks", []))
+    completed = stats["tasks_completed"]
+    total = stats["tasks_total"]
     return {
         "completed": completed,
         "total": total,
@@ -797,22 +869,22 @@ def _calculate_progress(plan: TrainingPlan) -> dict:
 
 
 def _calculate_improvement_trend(test_scores: List[dict], request: Request = None) -> str:
-    """计算改善趋势"""
+    """按天数顺序比较第一次和最后一次测试的分数计算改善趋势"""
     from utils.i18n import t, get_language_from_request
     
     if len(test_scores) < 2:
         return t("trend.insufficient_data", request=request)
     
-    scores = [s['score'] for s in test_scores]
-    if scores[-1] > scores[0]:
-        improvement = ((scores[-1] - scores[0]) / scores[0]) * 100
+    first, last = test_scores[0]['score'], test_scores[-1]['score']
+    if last > first:
+        improvement = ((last - first) / first) * 100 if first else 100
         if improvement > 10:
             return t("trend.significant_improvement", request=request)
         elif improvement > 5:
             return t("trend.steady_improvement", request=request)
         else:
             return t("trend.slight_improvement", request=request)
-    elif scores[-1] < scores[0]:
+    elif last < first:
         return t("trend.needs_attention", request=request)
     else:
         return t("trend.stable", request=request)
@@ -826,9 +898,12 @@ async def get_user_all_data(
 ):
     """获取当前用户的所有数据（孩子、测试结果、计划）"""
     try:
-        children = get_user_children(user.id)
-        test_results = get_user_test_results(user.id)
-        plans = get_user_plans(user.id)
+        children = await get_user_children(user.id)
+        test_results = await get_user_test_results(user.id)
+        plans = await get_user_plans(user.id)
+        
+        # 存储的是模板引用格式，和其他读取计划的接口一样按请求语言渲染
+        language = get_language_from_request(request)
         
         return {
             "success": True,
@@ -836,7 +911,7 @@ async def get_user_all_data(
                 "user_id": user.id,
                 "children": list(children.values()),
                 "test_results": test_results,
-                "plans": list(plans.values())
+                "plans": [_translate_plan_data(plan, language) for plan in plans.values()]
             },
             "message": t("success.user_data_retrieved", request=request)
         }
@@ -845,3 +920,35 @@ async def get_user_all_data(
         error_msg = t("error.get_user_data_failed", request=request)
         raise HTTPException(status_code=500, detail=f"{error_msg}: {str(e)}")
 
+
+
+@router.get("/user-data/export")
+async def export_user_data(user: UserResponse = Depends(get_current_user)):
+    """以NDJSON流式导出当前用户的所有数据（每行一个孩子、测试结果或计划）"""
+    return StreamingResponse(
+        aiter_ndjson(get_plan_store(), user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="user-data.ndjson"'}
+    )
+
+
+@router.post("/user-data/import", response_model=dict)
+async def import_user_data(
+    request: Request,
+    user: UserResponse = Depends(get_current_user)
+):
+    """从NDJSON请求体批量导入数据到当前用户（边接收边分批写入）"""
+    try:
+        counts = await aimport_stream(get_plan_store(), request.stream(), user_id=user.id)
+        return {
+            "success": True,
+            "data": counts,
+            "message": t("success.user_data_imported", request=request)
+        }
+    except ValueError as e:
+        error_msg = t("error.import_user_data_failed", request=request)
+        raise HTTPException(status_code=400, detail=f"{error_msg}: {str(e)}")
+    except Exception as e:
+        logger.error(f"导入用户数据失败: {e}", exc_info=True)
+        error_msg = t("error.import_user_data_failed", request=request)
+        raise HTTPException(status_code=500, detail=f"{error_msg}: {str(e)}")
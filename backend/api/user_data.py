@@ -22,6 +22,7 @@ from user_data import (
     create_training_plan, get_training_plans, get_training_plan,
     update_daily_task, get_current_task
 )
+from storage.aio import run_io
 from utils.i18n import t
 
 logger = logging.getLogger(__name__)
@@ -68,7 +69,8 @@ async def create_child(
     try:
         logger.info(f"User {user.id} creating child: {request.name}")
         
-        child_id = add_child(
+        child_id = await run_io(
+            add_child,
             user.id,
             request.name,
             request.age,
@@ -101,7 +103,7 @@ async def list_children(
 ):
     """Get all children for current user"""
     try:
-        children = get_children(user.id)
+        children = await run_io(get_children, user.id)
         
         return {
             "success": True,
@@ -123,7 +125,7 @@ async def get_child_info(
 ):
     """Get specific child information"""
     try:
-        child = get_child(user.id, child_id)
+        child = await run_io(get_child, user.id, child_id)
         
         if not child:
             error_msg = t("error.child_not_found", request=http_request)
@@ -155,7 +157,8 @@ async def create_test_result(
     try:
         logger.info(f"User {user.id} creating test result for child {request.child_id}")
         
-        test_id = add_test_result(
+        test_id = await run_io(
+            add_test_result,
             user.id,
             request.child_id,
             request.test_type,
@@ -184,7 +187,7 @@ async def list_test_results(
 ):
     """Get test results for user or specific child"""
     try:
-        results = get_test_results(user.id, child_id)
+        results = await run_io(get_test_results, user.id, child_id)
         
         return {
             "success": True,
@@ -210,7 +213,8 @@ async def create_plan(
     try:
         logger.info(f"User {user.id} creating plan for child {request.child_id}")
         
-        plan_id = create_training_plan(
+        plan_id = await run_io(
+            create_training_plan,
             user.id,
             request.child_id,
             request.plan_name,
@@ -240,7 +244,7 @@ async def list_plans(
 ):
     """Get training plans for user or specific child"""
     try:
-        plans = get_training_plans(user.id, child_id)
+        plans = await run_io(get_training_plans, user.id, child_id)
         
         return {
             "success": True,
@@ -262,7 +266,7 @@ async def get_plan_info(
 ):
     """Get specific training plan"""
     try:
-        plan = get_training_plan(user.id, plan_id)
+        plan = await run_io(get_training_plan, user.id, plan_id)
         
         if not plan:
             error_msg = t("error.plan_not_found", request=http_request)
@@ -294,7 +298,7 @@ async def update_task(
     try:
         logger.info(f"User {user.id} updating task day {day} in plan {plan_id}")
         
-        update_daily_task(user.id, plan_id, day, request.status, request.notes)
+        await run_io(update_daily_task, user.id, plan_id, day, request.status, request.notes)
         
         return {
             "success": True,
@@ -314,7 +318,7 @@ async def get_current_day_task(
 ):
     """Get current day's task for a child"""
     try:
-        current_task = get_current_task(user.id, child_id)
+        current_task = await run_io(get_current_task, user.id, child_id)
         
         if not current_task:
             return {
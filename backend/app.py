@@ -3,12 +3,30 @@ SpecialCare Connect - Unified Backend Application
 Integrates AI models, API interfaces and static file services
 """
 
+# ==================== 主程序入口 ====================
+
+if __name__ == "__main__":
+    # 直接运行本文件时改由 uvicorn 按模块名加载应用：否则计划生成进程池（forkserver/spawn）
+    # 的每个工作进程都会把本文件当作 __mp_main__ 重新导入，再加载一遍 torch 并创建 EducationAnalyzer
+    import os
+    import subprocess
+    import sys
+    try:
+        sys.exit(subprocess.call([
+            sys.executable, "-m", "uvicorn", "app:app",
+            "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+            "--host", "0.0.0.0", "--port", "8001",
+        ]))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
 import json
 import pickle
+import asyncio
 import logging
 import os
 from datetime import datetime
@@ -21,14 +39,24 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from storage import DATA_DIR, get_plan_archive, get_plan_store
+from storage.aio import run_io, shutdown_io_executor
+from storage.archive import archive_plans
+from storage.cache import document_cache
+from storage.journal import close_journals
+from storage.locking import claim_data_dir
+from storage.migrate import migrate_legacy_json
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Import authentication and user data modules
 try:
-    from api import auth, user_data
+    from api import admin, auth, user_data
     from api.plans import router as plans_router
+    from auth import last_login_buffer, run_last_login_flusher, run_session_sweeper
+    from models.plan_generator import shutdown_generation_executor, start_generation_executor
     AUTH_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Authentication modules not available: {e}")
@@ -597,6 +625,9 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     logger.info("正在启动SpecialCare Connect API...")
     
+    # 未设置 WEB_CONCURRENCY 却启动了多个工作进程时直接启动失败，而不是让写回缓存互相覆盖数据
+    data_dir_lock = claim_data_dir(DATA_DIR)
+    
     # 挂载静态文件
     try:
         frontend_path = os.path.join(os.path.dirname(__file__), "..", "frontend", "public")
@@ -619,12 +650,42 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("未找到已保存的模型，将使用规则基础分析")
     
+    # 默认的 SQLite 存储为空而 data/ 下还有旧版 JSON 文件时，先导入这些数据
+    migrated = await run_io(migrate_legacy_json, get_plan_store())
+    if migrated:
+        logger.info(f"已从旧版JSON文件迁移数据: {migrated}")
+    
+    # 在后台把已完成/已过期的计划移入冷存储归档
+    # 定期清理过期的登录会话，并批量写入缓冲的最近登录时间
+    background_tasks = []
+    if AUTH_AVAILABLE:
+        # 批量生成计划的进程池在启动时创建，避免在请求线程中启动子进程
+        start_generation_executor()
+        background_tasks.append(
+            asyncio.ensure_future(run_io(archive_plans, get_plan_store(), get_plan_archive()))
+        )
+        background_tasks.append(asyncio.ensure_future(run_session_sweeper()))
+        background_tasks.append(asyncio.ensure_future(run_last_login_flusher()))
+    
     logger.info("API启动完成")
     
     yield
     
     # 关闭时执行
     logger.info("API正在关闭...")
+    
+    for task in background_tasks:
+        task.cancel()
+    
+    # 等待存储线程池中的读写完成，再写回缓存中尚未落盘的数据并压缩日志
+    shutdown_io_executor()
+    if AUTH_AVAILABLE:
+        shutdown_generation_executor()
+        last_login_buffer.flush()
+    document_cache.close()
+    close_journals()
+    if data_dir_lock is not None:
+        os.close(data_dir_lock)
 
 # ==================== FastAPI应用 ====================
 
@@ -655,6 +716,7 @@ if AUTH_AVAILABLE:
     app.include_router(auth.router)
     app.include_router(user_data.router)
     app.include_router(plans_router)
+    app.include_router(admin.router)
     logger.info("Authentication and user data APIs enabled")
 
 # ==================== API路由 ====================
@@ -984,12 +1046,3 @@ async def get_statistics():
     except Exception as e:
         logger.error(f"获取统计信息失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
-
-
-
-# ==================== 主程序入口 ====================
-
-if __name__ == "__main__":
-    import uvicorn
-    logger.info("启动SpecialCare Connect API服务器...")
-    uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
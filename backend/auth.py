@@ -2,16 +2,33 @@
 Authentication and User Management System
 """
 import os
-import json
+import asyncio
+import atexit
+import base64
+import binascii
 import hashlib
+import heapq
+import hmac
+import itertools
 import secrets
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Any, Callable, Optional, Dict, List, Tuple
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 
+from storage.aio import run_io
+from storage.cache import document_cache
+from storage.files import atomic_write
+from storage.locking import file_lock
+from storage.serialization import dumps_json, loads_json
+from utils.bloom import BloomFilter
+from utils.lru_cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
 # Security scheme for JWT token
@@ -21,10 +38,47 @@ security = HTTPBearer()
 DATA_DIR = "data"
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 SESSIONS_FILE = os.path.join(DATA_DIR, "sessions.json")
+REVOKED_TOKENS_FILE = os.path.join(DATA_DIR, "revoked_tokens.json")
+TOKEN_SECRET_FILE = os.path.join(DATA_DIR, "token_secret")
 
 # Create data directory if it doesn't exist
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Validated sessions are cached for SESSION_CACHE_TTL seconds so token checks are a
+# dict lookup. Logout and user updates invalidate entries of this process; with
+# several workers the TTL bounds how long another worker may accept a revoked token.
+SESSION_CACHE_TTL = float(os.environ.get("SESSION_CACHE_TTL", "60"))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+
+session_cache = LRUCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+# Expired sessions are purged in bulk every SESSION_SWEEP_INTERVAL seconds
+SESSION_SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", "3600"))
+SESSION_LIFETIME = timedelta(days=30)
+
+# Logins are recorded in memory and written to users.json in one batch every
+# LAST_LOGIN_FLUSH_INTERVAL seconds, so logging in never rewrites the user table
+LAST_LOGIN_FLUSH_INTERVAL = float(os.environ.get("LAST_LOGIN_FLUSH_INTERVAL", "30"))
+
+# Passwords are hashed with scrypt (memory-hard) on a bounded pool of
+# PASSWORD_HASH_WORKERS threads; scrypt releases the GIL, so hashes run in
+# parallel without blocking the event loop. Each hash needs 128 * N * r bytes.
+PASSWORD_SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", "1"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# "session": random tokens stored in sessions.json (default)
+# "signed": HMAC-signed tokens validated without a session lookup; they carry only
+# the user id, and the profile is read from the cached users document
+AUTH_TOKEN_MODE = os.environ.get("AUTH_TOKEN_MODE", "session")
+# Bits of the Bloom filter in front of the revocation set (0 disables it)
+TOKEN_REVOCATION_BLOOM_BITS = int(os.environ.get("TOKEN_REVOCATION_BLOOM_BITS", "0"))
+
+# user_id -> version, bumped whenever the user record changes
+_user_versions: Dict[str, int] = {}
+_version_counter = itertools.count(1)
+
 # ==================== Data Models ====================
 
 class UserRegisterRequest(BaseModel):
@@ -46,49 +100,286 @@ class UserResponse(BaseModel):
 # ==================== Storage Functions ====================
 
 def load_users() -> Dict:
-    """Load users from file"""
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading users: {e}")
-            return {}
-    return {}
+    """Load users (served from the in-memory document cache)"""
+    return document_cache.read(USERS_FILE)
 
 def save_users(users: Dict):
-    """Save users to file"""
-    try:
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Error saving users: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save user data")
+    """Replace the users document; the cache flushes it to disk"""
+    document_cache.replace(USERS_FILE, users)
+    session_cache.clear()
+
+def invalidate_user_sessions(user_id: str):
+    """Drop cached sessions of a user whose record changed"""
+    _user_versions[user_id] = next(_version_counter)
 
 def load_sessions() -> Dict:
-    """Load sessions from file"""
-    if os.path.exists(SESSIONS_FILE):
-        try:
-            with open(SESSIONS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading sessions: {e}")
-            return {}
-    return {}
+    """Load sessions (served from the in-memory document cache)"""
+    return document_cache.read(SESSIONS_FILE)
 
 def save_sessions(sessions: Dict):
-    """Save sessions to file"""
+    """Replace the sessions document; the cache flushes it to disk"""
+    document_cache.replace(SESSIONS_FILE, sessions)
+
+# ==================== Email Index ====================
+
+def normalize_email(email: str) -> str:
+    """Emails are unique regardless of case and surrounding whitespace"""
+    return email.strip().lower()
+
+class EmailIndex:
+    """Normalized email -> user_id, derived from the users document
+
+    The index is rebuilt whenever a different users document is seen (first
+    load, replacement, or a reload after another process wrote the file), so
+    it can never drift from users.json. Callers hold the users file lock while
+    checking and adding, which keeps registrations unique.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source: Optional[Dict] = None
+        self._ids: Dict[str, str] = {}
+
+    def _sync(self, users: Dict):
+        if self._source is users:
+            return
+        ids: Dict[str, str] = {}
+        for user_id, user_data in users.items():
+            key = normalize_email(user_data.get('email', ''))
+            if key in ids:
+                logger.warning(f"Duplicate email in users file: {key} (keeping {ids[key]})")
+                continue
+            ids[key] = user_id
+        self._ids = ids
+        self._source = users
+
+    def lookup(self, users: Dict, email: str) -> Optional[str]:
+        with self._lock:
+            self._sync(users)
+            return self._ids.get(normalize_email(email))
+
+    def add(self, users: Dict, email: str, user_id: str):
+        with self._lock:
+            self._sync(users)
+            self._ids[normalize_email(email)] = user_id
+
+email_index = EmailIndex()
+
+# ==================== Last Login Buffer ====================
+
+class LastLoginBuffer:
+    """Pending last_login timestamps (user_id -> ISO time) not yet in users.json"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+
+    def record(self, user_id: str, timestamp: str):
+        with self._lock:
+            self._pending[user_id] = timestamp
+
+    def get(self, user_id: str) -> Optional[str]:
+        return self._pending.get(user_id)
+
+    def flush(self) -> int:
+        """Write all pending timestamps with a single users.json edit"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+        try:
+            with document_cache.edit(USERS_FILE) as users:
+                for user_id, timestamp in pending.items():
+                    user_data = users.get(user_id)
+                    # Another worker may have flushed a later login already
+                    if user_data is not None and (user_data.get('last_login') or '') < timestamp:
+                        user_data['last_login'] = timestamp
+        except Exception:
+            with self._lock:
+                for user_id, timestamp in pending.items():
+                    self._pending.setdefault(user_id, timestamp)
+            raise
+        return len(pending)
+
+last_login_buffer = LastLoginBuffer()
+atexit.register(last_login_buffer.flush)
+
+# ==================== Session Expiry Queue ====================
+
+class SessionExpiryQueue:
+    """Min-heap of (expires_at, token) over the sessions document
+
+    Like EmailIndex it is rebuilt whenever a different sessions document is
+    seen. Entries of sessions deleted in the meantime are skipped when popped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source: Optional[Dict] = None
+        self._heap: List[Tuple[datetime, str]] = []
+
+    def _sync(self, sessions: Dict):
+        if self._source is sessions:
+            return
+        heap = []
+        for token, session_data in sessions.items():
+            try:
+                heap.append((datetime.fromisoformat(session_data['expires_at']), token))
+            except (KeyError, TypeError, ValueError):
+                heap.append((datetime.min, token))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._source = sessions
+
+    def push(self, sessions: Dict, token: str, expires_at: datetime):
+        with self._lock:
+            self._sync(sessions)
+            heapq.heappush(self._heap, (expires_at, token))
+
+    def pop_expired(self, sessions: Dict, now: datetime) -> List[str]:
+        """Remove and return tokens that expired by now"""
+        with self._lock:
+            self._sync(sessions)
+            expired = []
+            while self._heap and self._heap[0][0] <= now:
+                _, token = heapq.heappop(self._heap)
+                if token in sessions:
+                    expired.append(token)
+            return expired
+
+session_expiry_queue = SessionExpiryQueue()
+
+# ==================== Signed Tokens ====================
+# <base64url(payload)>.<base64url(HMAC-SHA256(payload))>; the payload carries the
+# user claims, a token id (jti) and the expiry. Random session tokens never contain
+# a ".", so both kinds can be told apart and stay valid when the mode changes.
+
+_token_secret: Optional[bytes] = None
+
+def _get_token_secret() -> bytes:
+    """AUTH_TOKEN_SECRET, or a random secret generated once and shared via data/"""
+    global _token_secret
+    if _token_secret is None:
+        secret = os.environ.get("AUTH_TOKEN_SECRET")
+        if secret:
+            _token_secret = secret.encode()
+        else:
+            with file_lock(TOKEN_SECRET_FILE):
+                if not os.path.exists(TOKEN_SECRET_FILE):
+                    # mkstemp creates the file readable by its owner only
+                    atomic_write(TOKEN_SECRET_FILE, secrets.token_bytes(32))
+                with open(TOKEN_SECRET_FILE, 'rb') as f:
+                    _token_secret = f.read()
+    return _token_secret
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(body: str) -> str:
+    return _b64encode(hmac.new(_get_token_secret(), body.encode(), hashlib.sha256).digest())
+
+def is_signed_token(token: str) -> bool:
+    return "." in token
+
+def create_signed_token(user: "UserResponse") -> str:
+    """Issue a signed token identifying the user; the profile is looked up on use"""
+    payload = {
+        'sub': user.id,
+        'jti': secrets.token_urlsafe(12),
+        'exp': int(time.time() + SESSION_LIFETIME.total_seconds()),
+    }
+    body = _b64encode(dumps_json(payload))
+    return f"{body}.{_sign(body)}"
+
+def decode_signed_token(token: str) -> Optional[Dict]:
+    """Return the payload of a valid, unexpired and unrevoked signed token"""
+    body, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(body)):
+        return None
     try:
-        with open(SESSIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(sessions, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Error saving sessions: {e}")
-        raise HTTPException(status_code=500, detail="Failed to save session data")
+        payload = loads_json(_b64decode(body))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(payload, dict) or payload.get('exp', 0) <= time.time():
+        return None
+    if revocation_list.is_revoked(payload.get('jti', '')):
+        return None
+    return payload
+
+class RevocationList:
+    """Ids of signed tokens revoked before expiry (jti -> exp) in revoked_tokens.json
+
+    Entries are pruned once the token would have expired anyway, so the set only
+    holds tokens logged out within the last token lifetime.
+    """
+
+    def __init__(self, bloom_bits: int = TOKEN_REVOCATION_BLOOM_BITS):
+        self.bloom_bits = bloom_bits
+        self._lock = threading.Lock()
+        self._source: Optional[Dict] = None
+        self._bloom: Optional[BloomFilter] = None
+
+    def _sync(self, revoked: Dict):
+        if self._source is not revoked:
+            self._bloom = BloomFilter(self.bloom_bits, keys=revoked) if self.bloom_bits else None
+            self._source = revoked
+
+    def is_revoked(self, jti: str) -> bool:
+        revoked = document_cache.read(REVOKED_TOKENS_FILE)
+        with self._lock:
+            self._sync(revoked)
+            if self._bloom is not None and jti not in self._bloom:
+                return False
+        return jti in revoked
+
+    def revoke(self, jti: str, exp: int):
+        with document_cache.edit(REVOKED_TOKENS_FILE) as revoked:
+            revoked[jti] = exp
+            with self._lock:
+                self._sync(revoked)
+                if self._bloom is not None:
+                    self._bloom.add(jti)
+
+    def prune(self, now: float) -> int:
+        """Forget revocations of tokens that have expired"""
+        with document_cache.locked():
+            if not any(exp <= now for exp in document_cache.read(REVOKED_TOKENS_FILE).values()):
+                return 0
+            with document_cache.edit(REVOKED_TOKENS_FILE) as revoked:
+                expired = [jti for jti, exp in revoked.items() if exp <= now]
+                for jti in expired:
+                    del revoked[jti]
+                with self._lock:
+                    # Bloom filters cannot forget keys; rebuild from what is left
+                    self._source = None
+                    self._sync(revoked)
+        return len(expired)
+
+revocation_list = RevocationList()
 
 # ==================== Security Functions ====================
 
-def hash_password(password: str) -> str:
-    """Hash password using SHA-256"""
+def hash_password(password: str, n: Optional[int] = None, r: Optional[int] = None,
+                  p: Optional[int] = None) -> str:
+    """Hash password with scrypt as scrypt$N$r$p$salt$hash"""
+    n = n or PASSWORD_SCRYPT_N
+    r = r or PASSWORD_SCRYPT_R
+    p = p or PASSWORD_SCRYPT_P
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, n, r, p)
+    return f"scrypt${n}${r}${p}${_b64encode(salt)}${_b64encode(digest)}"
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=2 * 128 * n * r * p + 2 ** 20, dklen=32
+    )
+
+def _legacy_hash(password: str) -> str:
+    """The original unsalted SHA-256 hash, still accepted for existing accounts"""
     return hashlib.sha256(password.encode()).hexdigest()
 
 def generate_token() -> str:
@@ -96,36 +387,64 @@ def generate_token() -> str:
     return secrets.token_urlsafe(32)
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify password against hash"""
-    return hash_password(password) == hashed
+    """Verify password against an scrypt or legacy SHA-256 hash"""
+    if not hashed.startswith("scrypt$"):
+        return hmac.compare_digest(_legacy_hash(password), hashed)
+    try:
+        _, n, r, p, salt, digest = hashed.split("$")
+        expected = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    except (ValueError, binascii.Error):
+        return False
+    return hmac.compare_digest(expected, _b64decode(digest))
+
+def needs_rehash(hashed: str) -> bool:
+    """Legacy hashes and hashes made with other cost parameters are upgraded on login"""
+    return not hashed.startswith(
+        f"scrypt${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}$"
+    )
+
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+
+async def run_password_hasher(func: Callable, *args) -> Any:
+    """Run a hashing/verification call on the bounded password pool"""
+    global _password_executor
+    if _password_executor is None:
+        with _password_executor_lock:
+            if _password_executor is None:
+                _password_executor = ThreadPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+                )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, func, *args)
 
 # ==================== User Management Functions ====================
 
-def register_user(email: str, password: str, name: str) -> UserResponse:
-    """Register a new user"""
-    users = load_users()
-    
-    # Check if user already exists
-    for user_id, user_data in users.items():
-        if user_data.get('email') == email:
+def register_user(email: str, password: str, name: str,
+                  password_hash: Optional[str] = None) -> UserResponse:
+    """Register a new user (pass password_hash to skip hashing under the users lock)"""
+    password_hash = password_hash or hash_password(password)
+    with document_cache.edit(USERS_FILE) as users:
+        # Check if user already exists (the edit holds the users file lock)
+        if email_index.lookup(users, email) is not None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
-    
-    # Create new user
-    user_id = secrets.token_urlsafe(16)
-    user_data = {
-        'id': user_id,
-        'email': email,
-        'name': name,
-        'password_hash': hash_password(password),
-        'created_at': datetime.now().isoformat(),
-        'last_login': None
-    }
-    
-    users[user_id] = user_data
-    save_users(users)
+        
+        # Create new user
+        user_id = secrets.token_urlsafe(16)
+        user_data = {
+            'id': user_id,
+            'email': email,
+            'name': name,
+            'password_hash': password_hash,
+            'created_at': datetime.now().isoformat(),
+            'last_login': None
+        }
+        
+        users[user_id] = user_data
+        email_index.add(users, email, user_id)
     
     logger.info(f"New user registered: {email}")
     
@@ -137,83 +456,196 @@ def register_user(email: str, password: str, name: str) -> UserResponse:
         last_login=None
     )
 
-def authenticate_user(email: str, password: str) -> Optional[UserResponse]:
-    """Authenticate user and return user info"""
+def find_user_by_email(email: str) -> Optional[Tuple[str, Dict]]:
+    """Return (user_id, user record) for an email"""
     users = load_users()
+    user_id = email_index.lookup(users, email)
+    user_data = users.get(user_id) if user_id is not None else None
+    return (user_id, user_data) if user_data is not None else None
+
+def update_password_hash(user_id: str, old_hash: str, new_hash: str):
+    """Swap in an upgraded hash unless the password changed meanwhile"""
+    with document_cache.edit(USERS_FILE) as users:
+        user_data = users.get(user_id)
+        if user_data is not None and user_data.get('password_hash') == old_hash:
+            user_data['password_hash'] = new_hash
+
+def _complete_login(user_id: str, user_data: Dict) -> UserResponse:
+    # Update last login (buffered; users.json is written by the periodic flush)
+    last_login = datetime.now().isoformat()
+    last_login_buffer.record(user_id, last_login)
+    invalidate_user_sessions(user_id)
     
-    for user_id, user_data in users.items():
-        if user_data.get('email') == email:
-            if verify_password(password, user_data.get('password_hash', '')):
-                # Update last login
-                user_data['last_login'] = datetime.now().isoformat()
-                save_users(users)
-                
-                logger.info(f"User authenticated: {email}")
-                
-                return UserResponse(
-                    id=user_id,
-                    email=email,
-                    name=user_data.get('name', ''),
-                    created_at=user_data.get('created_at', ''),
-                    last_login=user_data['last_login']
-                )
+    logger.info(f"User authenticated: {user_data.get('email', '')}")
     
-    return None
+    return UserResponse(
+        id=user_id,
+        email=user_data.get('email', ''),
+        name=user_data.get('name', ''),
+        created_at=user_data.get('created_at', ''),
+        last_login=last_login
+    )
+
+def authenticate_user(email: str, password: str) -> Optional[UserResponse]:
+    """Authenticate user and return user info"""
+    found = find_user_by_email(email)
+    if found is None:
+        return None
+    user_id, user_data = found
+    password_hash = user_data.get('password_hash', '')
+    if not verify_password(password, password_hash):
+        return None
+    if needs_rehash(password_hash):
+        update_password_hash(user_id, password_hash, hash_password(password))
+    return _complete_login(user_id, user_data)
+
+async def authenticate_user_async(email: str, password: str) -> Optional[UserResponse]:
+    """authenticate_user with hashing on the password pool and storage on the I/O pool"""
+    found = await run_io(find_user_by_email, email)
+    if found is None:
+        return None
+    user_id, user_data = found
+    password_hash = user_data.get('password_hash', '')
+    if not await run_password_hasher(verify_password, password, password_hash):
+        return None
+    if needs_rehash(password_hash):
+        new_hash = await run_password_hasher(hash_password, password)
+        await run_io(update_password_hash, user_id, password_hash, new_hash)
+    return await run_io(_complete_login, user_id, user_data)
 
 def create_session(user_id: str) -> str:
     """Create a new session for user"""
-    sessions = load_sessions()
     token = generate_token()
+    expires_at = datetime.now() + SESSION_LIFETIME
     
-    sessions[token] = {
-        'user_id': user_id,
-        'created_at': datetime.now().isoformat(),
-        'expires_at': (datetime.now() + timedelta(days=30)).isoformat()
-    }
+    with document_cache.edit(SESSIONS_FILE) as sessions:
+        sessions[token] = {
+            'user_id': user_id,
+            'created_at': datetime.now().isoformat(),
+            'expires_at': expires_at.isoformat()
+        }
+        session_expiry_queue.push(sessions, token, expires_at)
     
-    save_sessions(sessions)
     logger.info(f"Session created for user: {user_id}")
     
     return token
 
+def _cached_session_valid(entry: tuple) -> bool:
+    user, expires_at, version = entry
+    return version == _user_versions.get(user.id, 0) and datetime.now() <= expires_at
+
+def issue_token(user: UserResponse) -> str:
+    """Create an access token for a logged-in user in the configured AUTH_TOKEN_MODE"""
+    if AUTH_TOKEN_MODE == "signed":
+        return create_signed_token(user)
+    return create_session(user.id)
+
+def _lookup_user(user_id: str) -> Optional[UserResponse]:
+    """Build the current profile of a user from the cached users document"""
+    user_data = load_users().get(user_id)
+    if user_data is None:
+        return None
+    return UserResponse(
+        id=user_id,
+        email=user_data.get('email', ''),
+        name=user_data.get('name', ''),
+        created_at=user_data.get('created_at', ''),
+        last_login=last_login_buffer.get(user_id) or user_data.get('last_login')
+    )
+
 def get_user_from_session(token: str) -> Optional[UserResponse]:
     """Get user from session token"""
-    sessions = load_sessions()
-    users = load_users()
-    
-    if token not in sessions:
-        return None
+    if is_signed_token(token):
+        # Signature, expiry and revocation are checked on every use
+        payload = decode_signed_token(token)
+        if payload is None:
+            return None
+        user_id = payload['sub']
+        expires_at = datetime.fromtimestamp(payload['exp'])
+    else:
+        user_id = expires_at = None
     
-    session_data = sessions[token]
+    cached = session_cache.get(token, valid=_cached_session_valid)
+    if cached is not None:
+        return cached[0]
     
-    # Check if session expired
-    expires_at = datetime.fromisoformat(session_data['expires_at'])
-    if datetime.now() > expires_at:
-        # Clean up expired session
-        del sessions[token]
-        save_sessions(sessions)
-        return None
+    if user_id is None:
+        session_data = load_sessions().get(token)
+        if session_data is None:
+            return None
+        
+        # Check if session expired
+        expires_at = datetime.fromisoformat(session_data['expires_at'])
+        if datetime.now() > expires_at:
+            # Clean up expired session
+            delete_session(token)
+            return None
+        user_id = session_data['user_id']
     
     # Get user data
-    user_id = session_data['user_id']
-    if user_id in users:
-        user_data = users[user_id]
-        return UserResponse(
-            id=user_id,
-            email=user_data.get('email', ''),
-            name=user_data.get('name', ''),
-            created_at=user_data.get('created_at', ''),
-            last_login=user_data.get('last_login')
-        )
-    
-    return None
+    version = _user_versions.get(user_id, 0)
+    user = _lookup_user(user_id)
+    if user is not None:
+        session_cache.put(token, (user, expires_at, version))
+    return user
 
 def delete_session(token: str):
     """Delete a session"""
-    sessions = load_sessions()
-    if token in sessions:
-        del sessions[token]
-        save_sessions(sessions)
+    if is_signed_token(token):
+        payload = decode_signed_token(token)
+        if payload is not None:
+            revocation_list.revoke(payload['jti'], payload['exp'])
+        return
+    session_cache.pop(token)
+    if token in load_sessions():
+        with document_cache.edit(SESSIONS_FILE) as sessions:
+            sessions.pop(token, None)
+
+def _session_expired(session_data: Dict, now: datetime) -> bool:
+    try:
+        return datetime.fromisoformat(session_data['expires_at']) <= now
+    except (KeyError, TypeError, ValueError):
+        return True
+
+def purge_expired_sessions(now: Optional[datetime] = None) -> int:
+    """Delete every expired session in one write, returning how many were removed"""
+    now = now or datetime.now()
+    removed = 0
+    with document_cache.locked():
+        expired = session_expiry_queue.pop_expired(load_sessions(), now)
+        if expired:
+            with document_cache.edit(SESSIONS_FILE) as sessions:
+                for token in expired:
+                    session_data = sessions.get(token)
+                    # Re-check: with several workers the edit may have reloaded the document
+                    if session_data is not None and _session_expired(session_data, now):
+                        del sessions[token]
+                        session_cache.pop(token)
+                        removed += 1
+    if removed:
+        logger.info(f"Purged {removed} expired sessions")
+    pruned = revocation_list.prune(now.timestamp())
+    if pruned:
+        logger.info(f"Pruned {pruned} expired token revocations")
+    return removed
+
+async def run_session_sweeper(interval: float = SESSION_SWEEP_INTERVAL):
+    """Purge expired sessions periodically until cancelled"""
+    while True:
+        try:
+            await run_io(purge_expired_sessions)
+        except Exception as e:
+            logger.error(f"Session sweep failed: {e}")
+        await asyncio.sleep(interval)
+
+async def run_last_login_flusher(interval: float = LAST_LOGIN_FLUSH_INTERVAL):
+    """Write buffered last_login timestamps periodically until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_io(last_login_buffer.flush)
+        except Exception as e:
+            logger.error(f"Flushing last_login updates failed: {e}")
 
 # ==================== Dependency Functions ====================
 
@@ -222,7 +654,7 @@ async def get_current_user(
 ) -> UserResponse:
     """Dependency to get current authenticated user"""
     token = credentials.credentials
-    user = get_user_from_session(token)
+    user = await run_io(get_user_from_session, token)
     
     if user is None:
         raise HTTPException(
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+密码哈希性能基准：不同 scrypt 成本参数下每秒可处理的登录数
+
+用法:
+    python benchmark_password_hashing.py [--costs 4096,16384,32768,65536] [--logins 200] [--workers 4]
+
+每个成本档位先生成一个该参数下的密码哈希，再通过与 /api/auth/login 相同的
+密码线程池并发校验 --logins 次，统计吞吐量（登录/秒）、p50/p99 延迟和每次哈希的内存占用。
+旧的 SHA-256 哈希作为对照一并列出。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_logins(auth, password_hash: str, logins: int):
+    latencies = []
+
+    async def login():
+        start = time.perf_counter()
+        assert await auth.run_password_hasher(auth.verify_password, "correct horse", password_hash)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark password hashing throughput per scrypt cost")
+    parser.add_argument("--costs", default="4096,16384,32768,65536", help="comma-separated scrypt N values")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None, help="password pool size (PASSWORD_HASH_WORKERS)")
+    args = parser.parse_args()
+
+    if args.workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    # auth 在导入时会创建 data/ 目录，放到临时目录中避免影响真实数据
+    os.chdir(tempfile.mkdtemp(prefix="bench-password-"))
+    import auth
+
+    print(f"密码线程池: {auth.PASSWORD_HASH_WORKERS} 个线程, r={auth.PASSWORD_SCRYPT_R}, p={auth.PASSWORD_SCRYPT_P}")
+    print(f"{'成本':<16}{'内存/次':>10}{'登录/秒':>12}{'p50(ms)':>10}{'p99(ms)':>10}")
+
+    settings = [("sha256 (旧)", auth._legacy_hash("correct horse"), 0)]
+    for n in (int(value) for value in args.costs.split(",")):
+        memory = 128 * n * auth.PASSWORD_SCRYPT_R * auth.PASSWORD_SCRYPT_P
+        settings.append((f"scrypt N={n}", auth.hash_password("correct horse", n=n), memory))
+
+    for label, password_hash, memory in settings:
+        elapsed, latencies = asyncio.run(run_logins(auth, password_hash, args.logins))
+        memory_text = f"{memory / 2 ** 20:.0f} MB" if memory else "-"
+        print(f"{label:<16}{memory_text:>10}{args.logins / elapsed:>12.1f}"
+              f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
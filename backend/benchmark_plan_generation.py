@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+批量生成计划性能基准：不同进程池大小下每秒可生成的计划数
+
+用法:
+    python benchmark_plan_generation.py [--plans 400] [--workers 0,1,2,4]
+
+与 POST /api/plans/plans/batch 相同，通过 run_batch_generation 把任务分块分发到进程池；
+workers=0 表示不使用进程池（在存储线程池中依次生成，相当于逐个调用单个创建接口）。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import plan_generator as generator_module
+
+
+def build_jobs(count: int):
+    jobs = []
+    for i in range(count):
+        child_id = f"child_{i}"
+        jobs.append({
+            "child": {
+                "child_id": child_id, "name": f"孩子{i}", "age": 4 + i % 8, "gender": "male",
+                "birth_date": "2018-01-01", "parent_name": "家长", "created_at": "2024-01-01T00:00:00",
+                "main_problems": ["注意力不集中"] if i % 3 == 0 else [],
+            },
+            "test_results": [{
+                "test_id": f"test_{i}", "child_id": child_id, "test_type": "schulte", "test_data": {},
+                "score": 40 + i % 60, "performance_level": ["needs_improvement", "average", "good"][i % 3],
+                "timestamp": "2024-01-01T00:00:00",
+            }],
+            "plan_type": "monthly" if i % 4 == 0 else "weekly",
+            "language": "zh",
+        })
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch plan generation per process pool size")
+    parser.add_argument("--plans", type=int, default=400)
+    parser.add_argument("--workers", default="0,1,2,4", help="comma-separated PLAN_GENERATION_WORKERS values")
+    args = parser.parse_args()
+
+    jobs = build_jobs(args.plans)
+    print(f"CPU核数: {os.cpu_count()}, 每轮 {args.plans} 个计划")
+    print(f"{'进程数':<10}{'计划/秒':>12}{'耗时(s)':>10}")
+    for workers in (int(value) for value in args.workers.split(",")):
+        generator_module.PLAN_GENERATION_WORKERS = workers
+        # 先预热进程池（进程启动和模板目录构建不计入）
+        asyncio.run(generator_module.run_batch_generation(jobs[:max(workers, 1)]))
+        start = time.perf_counter()
+        results = asyncio.run(generator_module.run_batch_generation(jobs))
+        elapsed = time.perf_counter() - start
+        generator_module.shutdown_generation_executor()
+        assert all("plan" in result for result in results)
+        print(f"{workers:<10}{args.plans / elapsed:>12.1f}{elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+序列化性能对比：原有的 indent=2 JSON vs 紧凑JSON / orjson / msgpack
+
+用法:
+    python benchmark_serialization.py [--families 200] [--repeat 5]
+
+生成带有中文家长指导的真实训练计划文档（与 user_plans.json 结构相同），
+分别统计编码耗时、解码耗时和文件大小。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.plan_generator import ChildInfo, TestResult, plan_generator
+from storage import serialization
+
+
+def build_plans_document(families: int, language: str = 'zh') -> dict:
+    """构造 {user_id: {plan_id: plan}} 结构的计划文档"""
+    document = {}
+    for i in range(families):
+        child = ChildInfo(
+            child_id=f"child_{i}", name=f"孩子{i}", age=4 + i % 8, gender="male",
+            birth_date="2018-01-01", parent_name="家长", created_at="2024-01-01T00:00:00",
+            main_problems=["注意力不集中"] if i % 3 == 0 else []
+        )
+        results = [TestResult(
+            test_id=f"test_{i}", child_id=child.child_id, test_type="schulte", test_data={},
+            score=40 + i % 60, performance_level=["needs_improvement", "average", "good"][i % 3],
+            timestamp="2024-01-01T00:00:00"
+        )]
+        plan = plan_generator.generate_plan(
+            child, results, 'monthly' if i % 4 == 0 else 'weekly', language=language
+        )
+        document[f"user_{i}"] = {plan.plan_id: plan_generator.compact_plan(asdict(plan))}
+    return document
+
+
+def codecs():
+    yield "json indent=2 (当前)", lambda d: json.dumps(d, indent=2, ensure_ascii=False).encode('utf-8'), json.loads
+    yield "json 紧凑 (标准库)", lambda d: json.dumps(d, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), json.loads
+    if serialization.orjson is not None:
+        yield "orjson", serialization.orjson.dumps, serialization.orjson.loads
+    if serialization.msgpack is not None:
+        yield "msgpack", lambda d: serialization.msgpack.packb(d, use_bin_type=True), \
+            lambda b: serialization.msgpack.unpackb(b, raw=False)
+
+
+def timed(func, arg, repeat: int):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark persisted-data serialization formats")
+    parser.add_argument("--families", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    document = build_plans_document(args.families)
+    print(f"文档: {args.families} 个家庭的训练计划, 最佳耗时取 {args.repeat} 次中的最小值\n")
+    print(f"{'格式':<24}{'编码(ms)':>12}{'解码(ms)':>12}{'大小(KB)':>12}")
+
+    for name, encode, decode in codecs():
+        encode_time, payload = timed(encode, document, args.repeat)
+        decode_time, decoded = timed(decode, payload, args.repeat)
+        assert decoded == document
+        print(f"{name:<24}{encode_time * 1000:>12.2f}{decode_time * 1000:>12.2f}{len(payload) / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
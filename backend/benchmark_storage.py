@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+存储基准测试：在 1k / 10k / 100k 个家庭的规模下测量各存储操作
+
+用法:
+    python benchmark_storage.py [--families 1000,10000] [--backends sqlite,sharded,json]
+                                [--suites plans,user_data,auth] [--ops 300]
+
+每个规模、每个后端都在独立的临时目录和子进程中运行：先合成用户、孩子、测试结果
+和训练计划，再通过真实的存储函数（与API端点相同的调用方式）执行各类操作，
+报告 ops/sec、p50/p99 延迟以及每次操作写入磁盘的字节数（含缓存回写）。
+
+注意：100k 个家庭的计划数据约为数GB，JSON单文件后端在该规模下非常慢。
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+SUITES = ("plans", "user_data", "auth")
+
+
+# ==================== 数据合成 ====================
+
+def _plan_templates(count: int = 8) -> List[Dict]:
+    """用计划生成器生成少量真实计划，合成数据时复制使用"""
+    from models.plan_generator import ChildInfo, TestResult, plan_generator
+
+    templates = []
+    for i in range(count):
+        child = ChildInfo(
+            child_id="child_template", name="孩子", age=4 + i, gender="female",
+            birth_date="2018-01-01", parent_name="家长", created_at="2024-01-01T00:00:00",
+            main_problems=["注意力不集中"] if i % 2 else []
+        )
+        results = [TestResult(
+            test_id="test_template", child_id=child.child_id, test_type="schulte", test_data={},
+            score=40 + i * 7, performance_level=["needs_improvement", "average", "good"][i % 3],
+            timestamp="2024-01-01T00:00:00"
+        )]
+        templates.append(plan_generator.compact_plan(asdict(
+            plan_generator.generate_plan(child, results, 'weekly', language='zh')
+        )))
+    return templates
+
+
+def _make_plan(templates: List[Dict], rng: random.Random, child_id: str, plan_id: str) -> Dict:
+    plan = copy.deepcopy(rng.choice(templates))
+    plan["plan_id"] = plan_id
+    plan["child_id"] = child_id
+    return plan
+
+
+def _make_test_result(rng: random.Random, child_id: str, test_id: str) -> Dict:
+    score = rng.randint(20, 100)
+    return {
+        "test_id": test_id, "child_id": child_id, "test_type": "schulte",
+        "test_data": {"time_seconds": rng.randint(20, 120), "errors": rng.randint(0, 5)},
+        "score": score,
+        "performance_level": "good" if score > 70 else "average" if score > 40 else "needs_improvement",
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def _family_layout(rng: random.Random, index: int):
+    """每个家庭 1-2 个孩子，每个孩子 2 条测试结果、1 个周计划"""
+    user_id = f"user{index:06d}"
+    child_ids = [f"child{index:06d}_{c}" for c in range(rng.randint(1, 2))]
+    return user_id, child_ids
+
+
+# ==================== 测量 ====================
+
+def _written_bytes() -> Optional[int]:
+    """本进程累计写出的字节数（Linux /proc/self/io 的 wchar）"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _measure(name: str, op: Callable[[int], None], ops: int, flush: Callable[[], None]) -> Dict:
+    latencies = []
+    before = _written_bytes()
+    started = time.perf_counter()
+    for i in range(ops):
+        t0 = time.perf_counter()
+        op(i)
+        latencies.append(time.perf_counter() - t0)
+    # Deferred cache writes belong to the operations that caused them
+    flush()
+    elapsed = time.perf_counter() - started
+    after = _written_bytes()
+    latencies.sort()
+    return {
+        "op": name,
+        "ops_per_sec": ops / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "bytes_per_op": (after - before) / ops if before is not None and after is not None else None,
+    }
+
+
+# ==================== 各套件 ====================
+
+def run_plans_suite(families: int, ops: int, rng: random.Random) -> List[Dict]:
+    """api/plans.py 使用的计划存储（后端由 PLAN_STORE_BACKEND 决定）"""
+    from storage import get_plan_store
+    from storage.indexes import find_task_position
+
+    store = get_plan_store()
+    templates = _plan_templates()
+    population = []
+    for index in range(families):
+        user_id, child_ids = _family_layout(rng, index)
+        children, results, plans = {}, {}, {}
+        for child_id in child_ids:
+            children[child_id] = {"child_id": child_id, "name": "孩子", "age": rng.randint(4, 12),
+                                  "gender": "male", "birth_date": "2018-01-01", "parent_name": "家长",
+                                  "created_at": datetime.now().isoformat()}
+            results[child_id] = [_make_test_result(rng, child_id, f"test_{child_id}_{n}") for n in range(2)]
+            plan_id = f"plan_{child_id}"
+            plans[plan_id] = _make_plan(templates, rng, child_id, plan_id)
+        store.save("children", user_id, children)
+        store.save("test_results", user_id, results)
+        store.save("plans", user_id, plans)
+        population.append((user_id, child_ids))
+    store.close()
+
+    def pick():
+        return population[rng.randrange(len(population))]
+
+    def create_child(i):
+        user_id, _ = pick()
+        child_id = f"bench_child_{i}"
+        store.put_record("children", user_id, child_id, {"child_id": child_id, "name": "新孩子", "age": 6})
+        store.put_record("test_results", user_id, child_id, [])
+
+    def submit_test_result(i):
+        user_id, child_ids = pick()
+        child_id = rng.choice(child_ids)
+        store.load("children", user_id)
+        child_results = store.get_record("test_results", user_id, child_id) or []
+        child_results.append(_make_test_result(rng, child_id, f"bench_test_{i}"))
+        store.put_record("test_results", user_id, child_id, child_results)
+
+    def create_plan(i):
+        user_id, child_ids = pick()
+        child_id = rng.choice(child_ids)
+        store.load("children", user_id)
+        plan_id = f"bench_plan_{i}"
+        store.put_record("plans", user_id, plan_id, _make_plan(templates, rng, child_id, plan_id))
+
+    def update_task(i):
+        user_id, child_ids = pick()
+        day = rng.randint(1, 7)
+
+        def apply_update(plan):
+            task_index = find_task_position(plan["daily_tasks"], day)
+            plan["daily_tasks"][task_index]["completed"] = True
+
+        store.update_record("plans", user_id, f"plan_{rng.choice(child_ids)}", apply_update)
+
+    def list_plans(i):
+        store.load("plans", pick()[0])
+
+    def child_plans(i):
+        user_id, child_ids = pick()
+        store.load_child_plans(user_id, rng.choice(child_ids))
+
+    from storage.cache import document_cache
+    return [
+        _measure(name, op, ops, document_cache.flush)
+        for name, op in [
+            ("create_child", create_child), ("submit_test_result", submit_test_result),
+            ("create_plan", create_plan), ("update_task", update_task),
+            ("list_plans", list_plans), ("child_plans", child_plans),
+        ]
+    ]
+
+
+def run_user_data_suite(families: int, ops: int, rng: random.Random) -> List[Dict]:
+    """user_data.py（快照 + 日志）"""
+    import user_data
+
+    templates = _plan_templates()
+    all_data, population = {}, []
+    for index in range(families):
+        user_id, child_ids = _family_layout(rng, index)
+        user = user_data._new_user(user_id, datetime.now().isoformat())
+        plan_ids = []
+        for child_id in child_ids:
+            user['children'].append({"id": child_id, "name": "孩子", "age": 6, "gender": "male",
+                                     "birth_date": {}, "created_at": datetime.now().isoformat()})
+            for n in range(2):
+                user['test_results'].append({"id": f"test_{child_id}_{n}", "child_id": child_id,
+                                             "test_type": "schulte", "results": {"score": 60},
+                                             "timestamp": datetime.now().isoformat()})
+            plan_id = f"plan_{child_id}"
+            template = rng.choice(templates)
+            user['training_plans'].append({
+                "id": plan_id, "child_id": child_id, "plan_name": "周计划",
+                "start_date": "2024-01-01", "end_date": "2099-01-01",
+                "daily_tasks": copy.deepcopy(template["daily_tasks"]),
+                "completed_days": [], "created_at": datetime.now().isoformat()
+            })
+            plan_ids.append(plan_id)
+        all_data[user_id] = user
+        population.append((user_id, child_ids, plan_ids))
+    user_data.save_user_data(all_data)
+    daily_tasks = copy.deepcopy(templates[0]["daily_tasks"])
+
+    def pick():
+        return population[rng.randrange(len(population))]
+
+    def create_child(i):
+        user_data.add_child(pick()[0], "新孩子", 6, "male", {})
+
+    def submit_test_result(i):
+        user_id, child_ids, _ = pick()
+        user_data.add_test_result(user_id, rng.choice(child_ids), "schulte", {"score": 70})
+
+    def create_plan(i):
+        user_id, child_ids, _ = pick()
+        user_data.create_training_plan(user_id, rng.choice(child_ids), "新计划",
+                                       "2024-01-01", "2099-01-01", daily_tasks)
+
+    def update_task(i):
+        user_id, _, plan_ids = pick()
+        user_data.update_daily_task(user_id, rng.choice(plan_ids), rng.randint(1, 7), "completed")
+
+    def list_plans(i):
+        user_id, child_ids, _ = pick()
+        user_data.get_training_plans(user_id, rng.choice(child_ids))
+
+    return [
+        _measure(name, op, ops, lambda: None)
+        for name, op in [
+            ("create_child", create_child), ("submit_test_result", submit_test_result),
+            ("create_plan", create_plan), ("update_task", update_task), ("list_plans", list_plans),
+        ]
+    ]
+
+
+def run_auth_suite(families: int, ops: int, rng: random.Random) -> List[Dict]:
+    """auth.py（用户与会话文档）"""
+    import auth
+    from storage.cache import document_cache
+
+    password_hash = auth.hash_password("secret")
+    users, sessions, tokens = {}, {}, []
+    for index in range(families):
+        user_id = f"user{index:06d}"
+        users[user_id] = {"id": user_id, "email": f"user{index}@example.com", "name": "家长",
+                          "password_hash": password_hash, "created_at": datetime.now().isoformat(),
+                          "last_login": None}
+        token = f"token{index:06d}"
+        sessions[token] = {"user_id": user_id, "created_at": datetime.now().isoformat(),
+                           "expires_at": "2099-01-01T00:00:00"}
+        tokens.append(token)
+    auth.save_users(users)
+    auth.save_sessions(sessions)
+    document_cache.flush()
+
+    def register(i):
+        auth.register_user(f"bench{i}@example.com", "secret", "新家长")
+
+    def login(i):
+        auth.authenticate_user(f"user{rng.randrange(families)}@example.com", "secret")
+
+    def create_session(i):
+        auth.create_session(f"user{rng.randrange(families):06d}")
+
+    def resolve_session(i):
+        auth.get_user_from_session(rng.choice(tokens))
+
+    return [
+        _measure(name, op, ops, document_cache.flush)
+        for name, op in [
+            ("register", register), ("login", login),
+            ("create_session", create_session), ("resolve_session", resolve_session),
+        ]
+    ]
+
+
+SUITE_RUNNERS = {
+    "plans": run_plans_suite,
+    "user_data": run_user_data_suite,
+    "auth": run_auth_suite,
+}
+
+
+# ==================== 调度 ====================
+
+def _run_single(args):
+    """子进程入口：在当前目录（临时目录）中运行一个套件，结果以JSON输出到最后一行"""
+    import logging
+    logging.disable(logging.WARNING)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    results = SUITE_RUNNERS[args.run](args.families_count, args.ops, rng)
+    print(json.dumps({"results": results, "elapsed": time.perf_counter() - started}))
+
+
+def _spawn(suite: str, families: int, backend: str, ops: int, seed: int) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="storage-bench-") as work_dir:
+        env = dict(os.environ, PLAN_STORE_BACKEND=backend)
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run", suite,
+             "--families-count", str(families), "--ops", str(ops), "--seed", str(seed)],
+            cwd=work_dir, env=env, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"{suite}/{backend}/{families} failed:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _format_bytes(value: Optional[float]) -> str:
+    if value is None:
+        return "n/a"
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024:
+            return f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}TB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the storage layer at several population sizes")
+    parser.add_argument("--families", default="1000,10000",
+                        help="comma-separated population sizes, e.g. 1000,10000,100000")
+    parser.add_argument("--backends", default="sqlite,sharded,json",
+                        help="plan store backends for the plans suite")
+    parser.add_argument("--suites", default=",".join(SUITES))
+    parser.add_argument("--ops", type=int, default=300, help="operations measured per op type")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--run", choices=SUITES, help=argparse.SUPPRESS)
+    parser.add_argument("--families-count", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        _run_single(args)
+        return
+
+    populations = [int(n) for n in args.families.split(",") if n]
+    backends = [b for b in args.backends.split(",") if b]
+    print(f"{'套件':<18}{'家庭数':>8}  {'操作':<20}{'ops/sec':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'写入/次':>12}")
+    for suite in [s for s in args.suites.split(",") if s]:
+        for families in populations:
+            for backend in (backends if suite == "plans" else [backends[0]]):
+                label = f"plans[{backend}]" if suite == "plans" else suite
+                outcome = _spawn(suite, families, backend, args.ops, args.seed)
+                for row in outcome["results"]:
+                    print(f"{label:<18}{families:>8}  {row['op']:<20}{row['ops_per_sec']:>10.0f}"
+                          f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{_format_bytes(row['bytes_per_op']):>12}")
+                sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
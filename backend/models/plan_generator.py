@@ -3,14 +3,38 @@ AI训练计划生成器
 根据孩子的测试结果生成个性化训练计划
 """
 
+import asyncio
 import json
 import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 from dataclasses import dataclass, asdict
 
+from utils.lru_cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
+# 批量生成计划的进程池大小，0 表示不使用进程池（在存储线程池中依次生成）
+PLAN_GENERATION_WORKERS = int(os.environ.get("PLAN_GENERATION_WORKERS", str(os.cpu_count() or 1)))
+
+# 进程池的启动方式：uvicorn 进程是多线程的，fork 可能把别的线程持有的锁复制进子进程导致死锁，
+# 因此默认用 forkserver（不支持时用 spawn）
+PLAN_GENERATION_START_METHOD = os.environ.get(
+    "PLAN_GENERATION_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+# 得分指数加权平均的权重（越大越偏重最近的测试）
+SCORE_EWMA_ALPHA = float(os.environ.get("SCORE_EWMA_ALPHA", "0.3"))
+
+# 渲染好的家长指导按 (重点领域, 天数, 活动, 语言) 缓存，列出计划时相同的任务不再重复拼接
+PARENT_GUIDANCE_CACHE_SIZE = int(os.environ.get("PARENT_GUIDANCE_CACHE_SIZE", "4096"))
+
 
 @dataclass
 class ChildInfo:
@@ -24,6 +48,7 @@ class ChildInfo:
     created_at: str
     child_condition: Optional[str] = None  # 孩子状况说明
     main_problems: Optional[List[str]] = None  # 主要问题列表
+    score_aggregates: Optional[Dict] = None  # 各类别得分的累计统计，见 add_test_score
 
 
 @dataclass
@@ -69,220 +94,269 @@ class TrainingPlan:
     status: str = 'active'  # 'active', 'completed', 'paused'
 
 
+class ActivityTemplate(NamedTuple):
+    """活动模板（不可变，同一语言的所有计划共享）"""
+    template_id: str  # 对应 activity.name/desc/instruction.<template_id> 翻译键
+    type: str
+    duration: int
+    can_play_online: bool
+    game_type: Optional[str] = None
+    min_age: int = 0  # 适合的最小年龄
+    name: str = ''
+    description: str = ''
+    detailed_instructions: str = ''
+
+    def to_activity(self, overrides: Optional[Dict] = None) -> Dict:
+        """生成属于单个计划的活动记录，overrides 为该计划对模板的覆盖（如调整后的时长）"""
+        activity = {
+            'template_id': self.template_id,
+            'type': self.type,
+            'name': self.name,
+            'duration': self.duration,
+            'description': self.description,
+            'detailed_instructions': self.detailed_instructions,
+            'can_play_online': self.can_play_online,
+        }
+        if self.game_type:
+            activity['game_type'] = self.game_type
+        if self.min_age:
+            activity['min_age'] = self.min_age
+        if overrides:
+            activity.update(overrides)
+        return activity
+
+
+# 活动中随语言变化的文本字段，存储时不保存，读取时按模板重新生成
+LOCALIZED_ACTIVITY_FIELDS = frozenset({'name', 'description', 'detailed_instructions'})
+
+
+# 与语言无关的活动模板定义（包含可在网站内进行的游戏），按领域和表现水平组织
+ACTIVITY_TEMPLATE_SPECS = {
+    'attention': {
+        'excellent': (
+            ActivityTemplate('schulte_advanced', 'online_game', 15, True, 'schulte', min_age=6),
+            ActivityTemplate('mindfulness_breathing', 'mindfulness', 10, False, min_age=6),
+        ),
+        'good': (
+            ActivityTemplate('attention_tracking', 'online_game', 20, True, 'attention_tracking'),
+            ActivityTemplate('focused_reading', 'reading', 15, False),
+        ),
+        'average': (
+            ActivityTemplate('simple_attention', 'online_game', 15, True, 'simple_attention'),
+            ActivityTemplate('focused_task', 'task', 10, False),
+        ),
+        'needs_improvement': (
+            ActivityTemplate('guided_attention', 'online_game', 10, True, 'guided_attention', min_age=3),
+            ActivityTemplate('color_match', 'online_game', 5, True, 'color_match', min_age=2),
+            ActivityTemplate('sound_play', 'online_game', 5, True, 'sound_play', min_age=2),
+            ActivityTemplate('parent_guided_focus', 'guided', 5, False, min_age=1),
+        ),
+    },
+    'cognitive': (
+        ActivityTemplate('online_puzzle', 'online_game', 20, True, 'puzzle'),
+        ActivityTemplate('memory_cards', 'online_game', 15, True, 'memory'),
+        ActivityTemplate('logic_thinking', 'offline', 15, False),
+    ),
+    'social': (
+        ActivityTemplate('role_play', 'role_play', 20, False),
+        ActivityTemplate('conversation', 'conversation', 15, False),
+    ),
+    'motor': (
+        ActivityTemplate('exercise', 'exercise', 20, False),
+        ActivityTemplate('fine_motor', 'fine_motor', 15, False),
+    ),
+}
+
+
+class ActivityCatalog:
+    """某一语言的活动模板目录，构建后只读，可被并发生成的计划共享"""
+    __slots__ = ('language', 'areas', 'by_id', 'area_by_id')
+
+    def __init__(self, language: str, areas: Mapping):
+        self.language = language
+        self.areas = areas
+        by_id = {}
+        area_by_id = {}
+        for area, templates in areas.items():
+            for group in (templates.values() if isinstance(templates, Mapping) else (templates,)):
+                for template in group:
+                    by_id[template.template_id] = template
+                    area_by_id[template.template_id] = area
+        self.by_id = MappingProxyType(by_id)
+        self.area_by_id = MappingProxyType(area_by_id)
+
+    def for_area(self, area: str, performance_level: str = 'average') -> Tuple[ActivityTemplate, ...]:
+        """返回某领域（注意力领域按表现水平区分）的模板"""
+        templates = self.areas.get(area, ())
+        if isinstance(templates, Mapping):
+            return templates.get(performance_level, templates['average'])
+        return templates
+
+
+def build_activity_catalog(language: str = 'en') -> ActivityCatalog:
+    """按语言翻译模板文本，构建只读目录"""
+    # Import i18n here to avoid circular imports
+    from utils.i18n import t
+
+    def localize(template: ActivityTemplate) -> ActivityTemplate:
+        key = template.template_id
+        return template._replace(
+            name=t(f'activity.name.{key}', language=language, request=None),
+            description=t(f'activity.desc.{key}', language=language, request=None),
+            detailed_instructions=t(f'activity.instruction.{key}', language=language, request=None),
+        )
+
+    areas = {}
+    for area, templates in ACTIVITY_TEMPLATE_SPECS.items():
+        if isinstance(templates, Mapping):
+            areas[area] = MappingProxyType({
+                level: tuple(localize(template) for template in group)
+                for level, group in templates.items()
+            })
+        else:
+            areas[area] = tuple(localize(template) for template in templates)
+    return ActivityCatalog(language, MappingProxyType(areas))
+
+
+ATTENTION_TEST_TYPES = frozenset({'schulte', 'attention', 'color_match', 'sound_play', 'simple_attention'})
+COGNITIVE_TEST_TYPES = frozenset({'cognitive', 'memory', 'memory_cards', 'online_puzzle'})
+AGE_ADAPTIVE_TEST_TYPES = frozenset({'age_adaptive', 'shape_sort', 'pattern_complete'})
+
+
+def score_categories(test_type: str, score: float) -> Tuple[str, ...]:
+    """一次测试计入的得分类别，所有测试都计入 overall"""
+    if test_type in ATTENTION_TEST_TYPES:
+        return ('overall', 'attention')
+    if test_type in COGNITIVE_TEST_TYPES:
+        return ('overall', 'cognitive')
+    if test_type == 'social':
+        return ('overall', 'social')
+    if test_type in AGE_ADAPTIVE_TEST_TYPES:
+        # 年龄适配游戏根据得分判断
+        return ('overall', 'attention', 'cognitive') if score >= 70 else ('overall', 'attention')
+    return ('overall',)
+
+
+def update_score_aggregate(entry: Optional[Dict], score: float,
+                           performance_level: Optional[str] = None) -> Dict:
+    """把一个得分并入 {count, sum, min, max, first, last, ewma, last_level} 统计"""
+    if not entry:
+        return {
+            'count': 1, 'sum': score, 'min': score, 'max': score,
+            'first': score, 'last': score, 'ewma': score, 'last_level': performance_level,
+        }
+    entry['count'] += 1
+    entry['sum'] += score
+    entry['min'] = min(entry['min'], score)
+    entry['max'] = max(entry['max'], score)
+    entry['last'] = score
+    entry['ewma'] = SCORE_EWMA_ALPHA * score + (1 - SCORE_EWMA_ALPHA) * entry['ewma']
+    entry['last_level'] = performance_level
+    return entry
+
+
+def add_test_score(aggregates: Dict, test_type: str, score: float,
+                   performance_level: Optional[str] = None) -> Dict:
+    """把一次测试结果并入各类别的累计统计（原地修改并返回 aggregates）"""
+    for category in score_categories(test_type, score):
+        aggregates[category] = update_score_aggregate(aggregates.get(category), score, performance_level)
+    return aggregates
+
+
+def aggregate_test_results(test_results: List[TestResult]) -> Dict:
+    """从测试结果列表计算累计统计（没有保存统计的旧数据使用）"""
+    aggregates = {}
+    for result in test_results:
+        add_test_score(aggregates, result.test_type, result.score, result.performance_level)
+    return aggregates
+
+
+def average_score(aggregates: Dict, *categories: str) -> Optional[float]:
+    """若干类别合并后的平均分，没有数据时返回 None"""
+    entries = [aggregates[category] for category in categories if category in aggregates]
+    count = sum(entry['count'] for entry in entries)
+    return sum(entry['sum'] for entry in entries) / count if count else None
+
+
+def summarize_plan_progress(daily_tasks: List[Dict]) -> Dict:
+    """从任务列表计算计划的进度统计（保存在计划的 progress_stats 中，旧计划读取时补算）"""
+    stats = {
+        'tasks_total': len(daily_tasks), 'tasks_completed': 0,
+        'tests_total': 0, 'tests_completed': 0, 'scores': None,
+    }
+    for task in daily_tasks:
+        stats['tasks_completed'] += bool(task.get('completed'))
+        stats['tests_total'] += bool(task.get('test_required'))
+        stats['tests_completed'] += bool(task.get('test_completed'))
+        test_result = task.get('test_result')
+        if test_result and 'score' in test_result:
+            stats['scores'] = update_score_aggregate(
+                stats['scores'], test_result['score'], test_result.get('performance_level', 'average')
+            )
+    return stats
+
+
 class PlanGenerator:
     """训练计划生成器"""
     
     def __init__(self):
         # Don't load templates in __init__ - load them with language when needed
-        self._cached_templates = {}
+        self._cached_templates: Dict[str, ActivityCatalog] = {}
+        self._templates_lock = threading.Lock()
+        self._template_ids_by_name: Optional[Dict[str, str]] = None
+        self.guidance_cache = LRUCache(maxsize=PARENT_GUIDANCE_CACHE_SIZE)
     
-    def _load_activity_templates(self, language: str = 'en') -> Dict:
-        """加载活动模板（包含详细说明和可在网站内进行的游戏）"""
-        # Use cached templates if available for this language
-        if language in self._cached_templates:
-            return self._cached_templates[language]
-        
-        # Import i18n here to avoid circular imports
-        from utils.i18n import t
-        
-        # Create a translation function for this language
-        def translate(key: str) -> str:
-            return t(key, language=language, request=None)
-        
-        templates = {
-            'attention': {
-                'excellent': [
-                    {
-                        'type': 'online_game',
-                        'name': translate('activity.name.schulte_advanced'),
-                        'duration': 15,
-                        'description': translate('activity.desc.schulte_advanced'),
-                        'game_type': 'schulte',
-                        'detailed_instructions': translate('activity.instruction.schulte_advanced'),
-                        'can_play_online': True,
-                        'min_age': 6  # 适合6岁以上
-                    },
-                    {
-                        'type': 'mindfulness',
-                        'name': translate('activity.name.mindfulness_breathing'),
-                        'duration': 10,
-                        'description': translate('activity.desc.mindfulness_breathing'),
-                        'detailed_instructions': translate('activity.instruction.mindfulness_breathing'),
-                        'can_play_online': False,
-                        'min_age': 6  # 适合6岁以上
-                    },
-                ],
-                'good': [
-                    {
-                        'type': 'online_game',
-                        'name': translate('activity.name.attention_tracking'),
-                        'duration': 20,
-                        'description': translate('activity.desc.attention_tracking'),
-                        'game_type': 'attention_tracking',
-                        'detailed_instructions': translate('activity.instruction.attention_tracking'),
-                        'can_play_online': True
-                    },
-                    {
-                        'type': 'reading',
-                        'name': translate('activity.name.focused_reading'),
-                        'duration': 15,
-                        'description': translate('activity.desc.focused_reading'),
-                        'detailed_instructions': translate('activity.instruction.focused_reading'),
-                        'can_play_online': False
-                    },
-                ],
-                'average': [
-                    {
-                        'type': 'online_game',
-                        'name': translate('activity.name.simple_attention'),
-                        'duration': 15,
-                        'description': translate('activity.desc.simple_attention'),
-                        'game_type': 'simple_attention',
-                        'detailed_instructions': translate('activity.instruction.simple_attention'),
-                        'can_play_online': True
-                    },
-                    {
-                        'type': 'task',
-                        'name': translate('activity.name.focused_task'),
-                        'duration': 10,
-                        'description': translate('activity.desc.focused_task'),
-                        'detailed_instructions': translate('activity.instruction.focused_task'),
-                        'can_play_online': False
-                    },
-                ],
-                'needs_improvement': [
-                    {
-                        'type': 'online_game',
-                        'name': translate('activity.name.guided_attention'),
-                        'duration': 10,
-                        'description': translate('activity.desc.guided_attention'),
-                        'game_type': 'guided_attention',
-                        'detailed_instructions': translate('activity.instruction.guided_attention'),
-                        'can_play_online': True,
-                        'min_age': 3  # 适合3岁以上
-                    },
-                    {
-                        'type': 'online_game',
-                        'name': translate('activity.name.color_match'),
-                        'duration': 5,
-                        'description': translate('activity.desc.color_match'),
-                        'game_type': 'color_match',
-                        'detailed_instructions': translate('activity.instruction.color_match'),
-                        'can_play_online': True,
-                        'min_age': 2  # 适合2岁以上
-                    },
-                    {
-                        'type': 'online_game',
-                        'name': translate('activity.name.sound_play'),
-                        'duration': 5,
-                        'description': translate('activity.desc.sound_play'),
-                        'game_type': 'sound_play',
-                        'detailed_instructions': translate('activity.instruction.sound_play'),
-                        'can_play_online': True,
-                        'min_age': 2  # 适合2岁以上
-                    },
-                    {
-                        'type': 'guided',
-                        'name': translate('activity.name.parent_guided_focus'),
-                        'duration': 5,
-                        'description': translate('activity.desc.parent_guided_focus'),
-                        'detailed_instructions': translate('activity.instruction.parent_guided_focus'),
-                        'can_play_online': False,
-                        'min_age': 1  # 适合1岁以上
-                    },
-                ]
-            },
-            'cognitive': [
-                {
-                    'type': 'online_game',
-                    'name': translate('activity.name.online_puzzle'),
-                    'duration': 20,
-                    'description': translate('activity.desc.online_puzzle'),
-                    'game_type': 'puzzle',
-                    'detailed_instructions': translate('activity.instruction.online_puzzle'),
-                    'can_play_online': True
-                },
-                {
-                    'type': 'online_game',
-                    'name': translate('activity.name.memory_cards'),
-                    'duration': 15,
-                    'description': translate('activity.desc.memory_cards'),
-                    'game_type': 'memory',
-                    'detailed_instructions': translate('activity.instruction.memory_cards'),
-                    'can_play_online': True
-                },
-                {
-                    'type': 'offline',
-                    'name': translate('activity.name.logic_thinking'),
-                    'duration': 15,
-                    'description': translate('activity.desc.logic_thinking'),
-                    'detailed_instructions': translate('activity.instruction.logic_thinking'),
-                    'can_play_online': False
-                },
-            ],
-            'social': [
-                {
-                    'type': 'role_play',
-                    'name': translate('activity.name.role_play'),
-                    'duration': 20,
-                    'description': translate('activity.desc.role_play'),
-                    'detailed_instructions': translate('activity.instruction.role_play'),
-                    'can_play_online': False
-                },
-                {
-                    'type': 'conversation',
-                    'name': translate('activity.name.conversation'),
-                    'duration': 15,
-                    'description': translate('activity.desc.conversation'),
-                    'detailed_instructions': translate('activity.instruction.conversation'),
-                    'can_play_online': False
-                },
-            ],
-            'motor': [
-                {
-                    'type': 'exercise',
-                    'name': translate('activity.name.exercise'),
-                    'duration': 20,
-                    'description': translate('activity.desc.exercise'),
-                    'detailed_instructions': translate('activity.instruction.exercise'),
-                    'can_play_online': False
-                },
-                {
-                    'type': 'fine_motor',
-                    'name': translate('activity.name.fine_motor'),
-                    'duration': 15,
-                    'description': translate('activity.desc.fine_motor'),
-                    'detailed_instructions': translate('activity.instruction.fine_motor'),
-                    'can_play_online': False
-                },
-            ]
-        }
-        
-        # Cache templates for this language
-        self._cached_templates[language] = templates
-        return templates
+    def _load_activity_templates(self, language: str = 'en') -> ActivityCatalog:
+        """获取某语言的活动模板目录（每种语言只构建一次）"""
+        catalog = self._cached_templates.get(language)
+        if catalog is None:
+            with self._templates_lock:
+                catalog = self._cached_templates.get(language)
+                if catalog is None:
+                    catalog = build_activity_catalog(language)
+                    self._cached_templates[language] = catalog
+        return catalog
+    
+    def _template_id_for_name(self, name: Optional[str]) -> Optional[str]:
+        """根据任一支持语言的活动名称找到模板ID（用于旧格式计划）"""
+        if self._template_ids_by_name is None:
+            from utils.i18n import SUPPORTED_LANGUAGES
+            
+            ids_by_name = {}
+            for language in SUPPORTED_LANGUAGES:
+                for template in self._load_activity_templates(language).by_id.values():
+                    ids_by_name.setdefault(template.name, template.template_id)
+            self._template_ids_by_name = ids_by_name
+        return self._template_ids_by_name.get(name) if name else None
     
     def generate_plan(self, child_info: ChildInfo, test_results: List[TestResult], 
-                      plan_type: str = 'weekly', language: str = 'en') -> TrainingPlan:
-        """生成训练计划"""
+                      plan_type: str = 'weekly', language: str = 'en',
+                      score_aggregates: Optional[Dict] = None) -> TrainingPlan:
+        """生成训练计划
+
+        score_aggregates 为已累计的得分统计（如孩子记录中保存的），提供时不再逐条扫描 test_results。
+        """
         try:
+            if score_aggregates is None:
+                score_aggregates = aggregate_test_results(test_results)
+            
             # Load activity templates for the specified language
             logger.info(f"Loading activity templates for language: {language}")
-            self.activity_templates = self._load_activity_templates(language)
+            catalog = self._load_activity_templates(language)
             
             # 分析测试结果，确定重点改善领域
-            focus_areas = self._analyze_test_results(test_results, child_info)
+            focus_areas = self._analyze_test_results(score_aggregates, child_info)
             
             # 确定计划时长
             duration_days = 7 if plan_type == 'weekly' else 30
             
             # 生成每日任务
             daily_tasks = self._generate_daily_tasks(
-                child_info, test_results, focus_areas, duration_days, language
+                child_info, score_aggregates, focus_areas, duration_days, language, catalog
             )
             
             # 生成训练目标
-            goals = self._generate_goals(focus_areas, test_results, child_info, language)
+            goals = self._generate_goals(focus_areas, score_aggregates, child_info, language)
             
             # 创建计划
             plan_id = f"plan_{child_info.child_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
@@ -310,35 +384,13 @@ class PlanGenerator:
             logger.error(f"生成计划失败: {e}")
             raise
     
-    def _analyze_test_results(self, test_results: List[TestResult], child_info: ChildInfo) -> List[str]:
-        """分析测试结果和问题，确定重点改善领域"""
+    def _analyze_test_results(self, score_aggregates: Dict, child_info: ChildInfo) -> List[str]:
+        """根据得分统计和问题，确定重点改善领域"""
         focus_areas = []
         
-        # 分析各种测试结果
-        attention_scores = []
-        cognitive_scores = []
-        social_scores = []
-        motor_scores = []
-        
-        for result in test_results:
-            # 支持多种测试类型
-            if result.test_type in ['schulte', 'attention', 'color_match', 'sound_play', 'simple_attention']:
-                attention_scores.append(result.score)
-            elif result.test_type in ['cognitive', 'memory', 'memory_cards', 'online_puzzle']:
-                cognitive_scores.append(result.score)
-            elif result.test_type == 'social':
-                social_scores.append(result.score)
-            elif result.test_type in ['age_adaptive', 'shape_sort', 'pattern_complete']:
-                # 年龄适配游戏根据得分判断
-                if result.score >= 70:
-                    attention_scores.append(result.score)
-                    cognitive_scores.append(result.score)
-                else:
-                    attention_scores.append(result.score)
-        
-        # 根据分数和表现水平确定重点领域
-        if attention_scores:
-            avg_attention = sum(attention_scores) / len(attention_scores)
+        # 根据各类别平均分和表现水平确定重点领域（测试类型的归类见 score_categories）
+        avg_attention = average_score(score_aggregates, 'attention')
+        if avg_attention is not None:
             # 根据分数区间判断严重程度
             if avg_attention < 50:
                 focus_areas.append('attention')  # 严重需要改善
@@ -348,8 +400,8 @@ class PlanGenerator:
                 # 如果分数很好，可以考虑增强而不是干预
                 pass
         
-        if cognitive_scores:
-            avg_cognitive = sum(cognitive_scores) / len(cognitive_scores)
+        avg_cognitive = average_score(score_aggregates, 'cognitive')
+        if avg_cognitive is not None:
             if avg_cognitive < 50:
                 focus_areas.append('cognitive')  # 严重需要改善
             elif avg_cognitive < 70:
@@ -375,9 +427,8 @@ class PlanGenerator:
                         focus_areas.append(area)
         
         # 如果分数很好（>=85）且没有明显问题，则生成增强计划而不是干预计划
-        all_scores = attention_scores + cognitive_scores + social_scores
-        if all_scores:
-            avg_all = sum(all_scores) / len(all_scores)
+        avg_all = average_score(score_aggregates, 'attention', 'cognitive', 'social')
+        if avg_all is not None:
             if avg_all >= 85 and not child_info.main_problems:
                 # 高分且无问题，生成增强计划
                 if not focus_areas:
@@ -386,9 +437,9 @@ class PlanGenerator:
         # 如果没有明确领域，根据年龄和测试结果推断
         if not focus_areas:
             # 如果没有任何测试结果，根据常见问题推断
-            if not test_results and child_info.main_problems:
+            if not score_aggregates and child_info.main_problems:
                 focus_areas = ['attention', 'cognitive']
-            elif test_results:
+            elif score_aggregates:
                 # 有测试结果但分数中等，默认关注注意力
                 focus_areas = ['attention']
             else:
@@ -396,22 +447,25 @@ class PlanGenerator:
         
         return focus_areas[:3]  # 最多3个重点领域
     
-    def _generate_daily_tasks(self, child_info: ChildInfo, test_results: List[TestResult],
-                             focus_areas: List[str], duration_days: int, language: str = 'en') -> List[DailyTask]:
+    def _generate_daily_tasks(self, child_info: ChildInfo, score_aggregates: Dict,
+                             focus_areas: List[str], duration_days: int, language: str = 'en',
+                             catalog: Optional[ActivityCatalog] = None) -> List[DailyTask]:
         """生成每日任务"""
+        if catalog is None:
+            catalog = self._load_activity_templates(language)
         daily_tasks = []
         start_date = datetime.now()
         
         # 根据最新的测试结果确定性能水平
-        latest_result = test_results[-1] if test_results else None
-        performance_level = latest_result.performance_level if latest_result else 'average'
+        latest = score_aggregates.get('overall')
+        performance_level = (latest and latest.get('last_level')) or 'average'
         
         for day in range(1, duration_days + 1):
             task_date = (start_date + timedelta(days=day - 1)).strftime('%Y-%m-%d')
             
             # 生成每日活动（根据年龄过滤）
             activities = self._generate_day_activities(
-                focus_areas, performance_level, day, duration_days, child_info.age
+                catalog, focus_areas, performance_level, day, duration_days, child_info.age
             )
             
             # 生成家长指导
@@ -440,8 +494,6 @@ class PlanGenerator:
                     test_type = 'schulte'
                 
                 # 调试日志
-                import logging
-                logger = logging.getLogger(__name__)
                 logger.info(f"第{day}天测试类型设置: 年龄={age}, test_type={test_type}, test_required={test_required}")
             
             task = DailyTask(
@@ -460,49 +512,38 @@ class PlanGenerator:
         
         return daily_tasks
     
-    def _generate_day_activities(self, focus_areas: List[str], performance_level: str,
-                                day: int, total_days: int, child_age: int = 6) -> List[Dict]:
-        """生成单日活动（根据年龄过滤）"""
-        activities = []
+    def _generate_day_activities(self, catalog: ActivityCatalog, focus_areas: List[str],
+                                performance_level: str, day: int, total_days: int,
+                                child_age: int = 6) -> List[Dict]:
+        """生成单日活动（根据年龄过滤），每个活动都是属于本计划的新记录，不与模板共享"""
+        selected_templates = []
         
-        # 根据重点领域选择活动
+        # 根据重点领域选择活动（注意力领域按表现水平选择模板）
         for area in focus_areas:
-            if area == 'attention':
-                # 从注意力模板中选择
-                area_activities = self.activity_templates['attention'].get(
-                    performance_level,
-                    self.activity_templates['attention']['average']
-                )
+            area_activities = catalog.for_area(area, performance_level)
+            if area_activities:
                 # 根据天数调整难度，并过滤年龄不适合的活动
                 selected = self._select_activities_for_day(area_activities, day, total_days, child_age)
-                activities.extend(selected)
-            else:
-                # 其他领域的活动
-                if area in self.activity_templates:
-                    area_activities = self.activity_templates[area]
-                    selected = self._select_activities_for_day(area_activities, day, total_days, child_age)
-                    activities.extend(selected)
+                selected_templates.extend(selected)
         
         # 确保每天至少2-3个活动，不超过5个（需要过滤年龄）
-        if len(activities) < 2:
-            fallback_activities = [a for a in self.activity_templates['attention']['average'] 
-                                 if a.get('min_age', 0) <= child_age]
-            activities.extend(fallback_activities[:2])
-        if len(activities) > 5:
-            activities = activities[:5]
-        
-        return activities
+        if len(selected_templates) < 2:
+            fallback_activities = [a for a in catalog.for_area('attention', 'average')
+                                 if a.min_age <= child_age]
+            selected_templates.extend(fallback_activities[:2])
+        
+        return [template.to_activity() for template in selected_templates[:5]]
     
-    def _select_activities_for_day(self, available_activities: List[Dict], 
-                                   day: int, total_days: int, child_age: int = 6) -> List[Dict]:
+    def _select_activities_for_day(self, available_activities: Sequence[ActivityTemplate],
+                                   day: int, total_days: int, child_age: int = 6) -> List[ActivityTemplate]:
         """为特定一天选择活动（根据年龄过滤）"""
         # 首先过滤年龄不适合的活动
         age_appropriate = [a for a in available_activities 
-                          if a.get('min_age', 0) <= child_age]
+                          if a.min_age <= child_age]
         
         # 如果没有年龄适合的活动，使用所有活动（但记录警告）
         if not age_appropriate:
-            age_appropriate = available_activities
+            age_appropriate = list(available_activities)
             logger.warning(f"没有找到适合{child_age}岁的活动，使用所有活动")
         
         # 根据天数选择不同难度的活动
@@ -519,7 +560,21 @@ class PlanGenerator:
     
     def _generate_parent_guidance(self, focus_areas: List[str], day: int,
                                   activities: List[Dict], language: str = 'en') -> str:
-        """生成家长指导"""
+        """生成家长指导（结果按输入缓存）"""
+        key = (
+            'attention' in focus_areas, day, language,
+            tuple((a['name'], a['duration'], a['description'], a.get('can_play_online', False),
+                   a.get('detailed_instructions')) for a in activities),
+        )
+        guidance = self.guidance_cache.get(key)
+        if guidance is None:
+            guidance = self._render_parent_guidance(focus_areas, day, activities, language)
+            self.guidance_cache.put(key, guidance)
+        return guidance
+    
+    def _render_parent_guidance(self, focus_areas: List[str], day: int,
+                                activities: List[Dict], language: str = 'en') -> str:
+        """拼接家长指导文本"""
         from utils.i18n import t
         
         def translate(key: str, **kwargs) -> str:
@@ -563,9 +618,9 @@ class PlanGenerator:
         
         return "\n".join(guidance_parts)
     
-    def _generate_goals(self, focus_areas: List[str], test_results: List[TestResult], 
+    def _generate_goals(self, focus_areas: List[str], score_aggregates: Dict,
                        child_info: ChildInfo, language: str = 'en') -> List[str]:
-        """根据测试结果、年龄和问题动态生成训练目标"""
+        """根据得分统计、年龄和问题动态生成训练目标"""
         from utils.i18n import t
         
         def translate(key: str, **kwargs) -> str:
@@ -573,23 +628,10 @@ class PlanGenerator:
         
         goals = []
         
-        # 分析测试结果的平均分数
-        all_scores = []
-        attention_scores = []
-        cognitive_scores = []
-        social_scores = []
-        
-        for result in test_results:
-            all_scores.append(result.score)
-            if result.test_type in ['schulte', 'attention', 'color_match', 'sound_play']:
-                attention_scores.append(result.score)
-            elif result.test_type in ['cognitive', 'memory', 'memory_cards']:
-                cognitive_scores.append(result.score)
-            elif result.test_type == 'social':
-                social_scores.append(result.score)
-        
         # 判断是否需要干预计划还是增强计划
-        avg_score = sum(all_scores) / len(all_scores) if all_scores else 70
+        avg_score = average_score(score_aggregates, 'overall')
+        if avg_score is None:
+            avg_score = 70
         needs_intervention = avg_score < 70 or (child_info.main_problems and len(child_info.main_problems) > 0)
         
         # 根据年龄调整目标时长
@@ -611,8 +653,8 @@ class PlanGenerator:
         if 'attention' in focus_areas:
             if needs_intervention:
                 # 干预计划
-                if attention_scores:
-                    avg_att = sum(attention_scores) / len(attention_scores)
+                avg_att = average_score(score_aggregates, 'attention')
+                if avg_att is not None:
                     if avg_att < 50:
                         goals.append(translate('goal.attention.improve_focus', duration=attention_duration, task_type=task_duration))
                         goals.append(translate('goal.attention.reduce_distraction'))
@@ -629,8 +671,8 @@ class PlanGenerator:
         
         if 'cognitive' in focus_areas:
             if needs_intervention:
-                if cognitive_scores:
-                    avg_cog = sum(cognitive_scores) / len(cognitive_scores)
+                avg_cog = average_score(score_aggregates, 'cognitive')
+                if avg_cog is not None:
                     if avg_cog < 50:
                         goals.append(translate('goal.cognitive.establish_basic'))
                         goals.append(translate('goal.cognitive.improve_memory'))
@@ -709,11 +751,176 @@ class PlanGenerator:
             # 保持当前难度或增加练习时间
             for task in plan.daily_tasks:
                 if task.day > completed_day and not task.completed:
-                    # 可以延长活动时间
+                    # 可以延长活动时间（活动记录属于本计划，不会影响共享的模板目录）
                     for activity in task.activities:
                         activity['duration'] = min(activity['duration'] + 5, 30)
 
+    def apply_test_result_to_tasks(self, daily_tasks: List[Dict], task_index: int,
+                                   duration_days: int, test_result: TestResult) -> Dict:
+        """update_plan_with_test_result 的字典版本：只修改当天任务及受影响的后续任务，不重建整个计划"""
+        task = daily_tasks[task_index]
+        task['test_completed'] = True
+        task['test_result'] = asdict(test_result)
+        
+        day = task['day']
+        if day < duration_days:
+            self._adjust_future_task_dicts(daily_tasks, day, test_result)
+        
+        return task
+    
+    def _adjust_future_task_dicts(self, daily_tasks: List[Dict], completed_day: int,
+                                  test_result: TestResult):
+        """_adjust_future_tasks 的字典版本"""
+        if test_result.performance_level == 'needs_improvement':
+            for task in daily_tasks:
+                if task.get('day', 0) > completed_day and not task.get('completed'):
+                    for activity in task.get('activities', []):
+                        activity['duration'] = min(activity['duration'] + 5, 30)
+
+    
+    def compact_plan(self, plan_data: Dict) -> Dict:
+        """转换为存储格式：活动只保存模板ID、时长和覆盖字段，不保存本地化文本和家长指导"""
+        compacted = dict(plan_data)
+        if isinstance(plan_data.get('daily_tasks'), list):
+            compacted['daily_tasks'] = [self.compact_task(task) for task in plan_data['daily_tasks']]
+            compacted.setdefault('progress_stats', summarize_plan_progress(compacted['daily_tasks']))
+        return compacted
+    
+    def compact_task(self, task: Dict) -> Dict:
+        """单日任务的存储格式，家长指导在读取时重新生成"""
+        compacted = {key: value for key, value in task.items() if key != 'parent_guidance'}
+        if isinstance(task.get('activities'), list):
+            compacted['activities'] = [self.compact_activity(activity) for activity in task['activities']]
+        return compacted
+    
+    def compact_activity(self, activity: Dict) -> Dict:
+        """活动的存储格式；不是由模板生成的活动原样保存"""
+        template_id = activity.get('template_id') or self._template_id_for_name(activity.get('name'))
+        template = self._load_activity_templates().by_id.get(template_id)
+        if template is None:
+            return activity
+        
+        compacted = {'template_id': template_id, 'duration': activity.get('duration', template.duration)}
+        for key, value in activity.items():
+            if key in compacted or key in LOCALIZED_ACTIVITY_FIELDS:
+                continue
+            if key in ActivityTemplate._fields and value == getattr(template, key):
+                continue
+            compacted[key] = value
+        return compacted
+    
+    def render_plan(self, plan_data: Dict, language: str = 'en') -> Dict:
+        """按指定语言把存储的计划渲染为完整的响应数据（活动文本和家长指导）"""
+        catalog = self._load_activity_templates(language)
+        rendered = dict(plan_data)
+        if not isinstance(plan_data.get('daily_tasks'), list):
+            return rendered
+        
+        focus_areas = plan_data.get('focus_areas') or []
+        rendered_tasks = []
+        for task in plan_data['daily_tasks']:
+            rendered_task = dict(task)
+            if isinstance(task.get('activities'), list):
+                activities = [self._render_activity(catalog, activity) for activity in task['activities']]
+                rendered_task['activities'] = activities
+                task_focus_areas = focus_areas or list(dict.fromkeys(
+                    catalog.area_by_id[a['template_id']] for a in activities if a.get('template_id') in catalog.area_by_id
+                ))
+                rendered_task['parent_guidance'] = self._generate_parent_guidance(
+                    task_focus_areas, task.get('day', 1), activities, language
+                )
+            rendered_tasks.append(rendered_task)
+        rendered['daily_tasks'] = rendered_tasks
+        return rendered
+    
+    def _render_activity(self, catalog: ActivityCatalog, activity: Dict) -> Dict:
+        """模板文本 + 本计划保存的覆盖字段；旧格式活动按名称找到模板"""
+        template_id = activity.get('template_id') or self._template_id_for_name(activity.get('name'))
+        template = catalog.by_id.get(template_id)
+        if template is None:
+            return dict(activity)
+        overrides = {key: value for key, value in activity.items() if key not in LOCALIZED_ACTIVITY_FIELDS}
+        return template.to_activity(overrides)
+
 
 # 全局计划生成器实例
 plan_generator = PlanGenerator()
 
+
+# ==================== 批量生成（进程池） ====================
+
+def generate_stored_plans(jobs: List[Dict]) -> List[Dict]:
+    """依次生成一组计划（在工作进程中执行），返回存储格式的计划或错误信息
+
+    每个 job 包含 child（ChildInfo 字段）、test_results（TestResult 字段列表）、plan_type、language，
+    以及可选的 score_aggregates（提供时不再从 test_results 计算）。
+    """
+    results = []
+    for job in jobs:
+        try:
+            plan = plan_generator.generate_plan(
+                ChildInfo(**job['child']),
+                [TestResult(**result) for result in job['test_results']],
+                job.get('plan_type', 'weekly'),
+                language=job.get('language', 'en'),
+                score_aggregates=job.get('score_aggregates'),
+            )
+            results.append({'plan': plan_generator.compact_plan(asdict(plan))})
+        except Exception as e:
+            logger.error(f"批量生成计划失败: {e}")
+            results.append({'error': str(e)})
+    return results
+
+
+_generation_executor: Optional[ProcessPoolExecutor] = None
+_generation_executor_lock = threading.Lock()
+
+
+def start_generation_executor() -> Optional[ProcessPoolExecutor]:
+    """创建批量生成用的进程池（应用启动时调用，不在请求中创建）"""
+    global _generation_executor
+    if PLAN_GENERATION_WORKERS <= 0:
+        return None
+    with _generation_executor_lock:
+        if _generation_executor is None:
+            context = multiprocessing.get_context(PLAN_GENERATION_START_METHOD)
+            if PLAN_GENERATION_START_METHOD == "forkserver":
+                # 在 forkserver 中预先导入本模块，工作进程 fork 出来即可使用
+                context.set_forkserver_preload([__name__])
+            _generation_executor = ProcessPoolExecutor(
+                max_workers=PLAN_GENERATION_WORKERS, mp_context=context
+            )
+    return _generation_executor
+
+
+def get_generation_executor() -> ProcessPoolExecutor:
+    """返回批量生成用的进程池；未在启动时创建的（脚本、测试）在此补建"""
+    return _generation_executor or start_generation_executor()
+
+
+async def run_batch_generation(jobs: List[Dict]) -> List[Dict]:
+    """把任务分块分发到进程池并行生成，按原顺序返回结果"""
+    if not jobs:
+        return []
+    if PLAN_GENERATION_WORKERS <= 0:
+        from storage.aio import run_io
+        return await run_io(generate_stored_plans, jobs)
+    
+    # 每个工作进程一块，减少进程间传输次数
+    chunk_size = -(-len(jobs) // PLAN_GENERATION_WORKERS)
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    loop = asyncio.get_running_loop()
+    executor = get_generation_executor()
+    chunk_results = await asyncio.gather(
+        *(loop.run_in_executor(executor, generate_stored_plans, chunk) for chunk in chunks)
+    )
+    return [result for chunk in chunk_results for result in chunk]
+
+
+def shutdown_generation_executor(wait: bool = True):
+    """停止批量生成进程池"""
+    global _generation_executor
+    with _generation_executor_lock:
+        executor, _generation_executor = _generation_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
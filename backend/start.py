@@ -65,10 +65,19 @@ def start_server():
         logger.info("API文档: http://localhost:8001/docs")
         logger.info("按 Ctrl+C 停止服务器")
         
-        # 启动服务器
-        subprocess.run([
+        command = [
             sys.executable, "-m", "uvicorn", "app:app", "--host", "0.0.0.0", "--port", "8001"
-        ], check=True)
+        ]
+        
+        # 多进程：必须通过 WEB_CONCURRENCY=N 设置工作进程数（不要直接给 uvicorn 传 --workers），
+        # 数据存储据此切换为跨进程加锁的写穿模式；单进程模式下启动第二个工作进程会直接失败
+        workers = int(os.environ.get("WEB_CONCURRENCY", "1") or 1)
+        if workers > 1:
+            logger.info(f"工作进程数: {workers}")
+            command += ["--workers", str(workers)]
+        
+        # 启动服务器
+        subprocess.run(command, check=True)
         
     except KeyboardInterrupt:
         logger.info("服务器已停止")
@@ -0,0 +1,76 @@
+"""
+Storage backends for per-user data
+
+The plan store backend is chosen with the PLAN_STORE_BACKEND environment
+variable: "sqlite" (default), "sharded" (one JSON file per user and
+collection) or "json" (legacy single-file layout).
+"""
+import os
+import threading
+from typing import Optional
+
+from .archive import PlanArchive
+from .base import COLLECTIONS, PlanStore
+from .json_store import JsonPlanStore
+from .sharded_store import ShardedJsonPlanStore
+from .sqlite_store import SqlitePlanStore
+
+DATA_DIR = "data"
+DEFAULT_BACKEND = "sqlite"
+
+PLAN_STORE_BACKENDS = {
+    SqlitePlanStore.name: SqlitePlanStore,
+    ShardedJsonPlanStore.name: ShardedJsonPlanStore,
+    JsonPlanStore.name: JsonPlanStore,
+}
+
+_plan_store: Optional[PlanStore] = None
+_plan_store_lock = threading.Lock()
+_plan_archive: Optional[PlanArchive] = None
+
+
+def create_plan_store(backend: str, data_dir: str = DATA_DIR) -> PlanStore:
+    """Instantiate a plan store by backend name"""
+    if backend not in PLAN_STORE_BACKENDS:
+        raise ValueError(
+            f"Unknown plan store backend: {backend} "
+            f"(expected one of {', '.join(PLAN_STORE_BACKENDS)})"
+        )
+    return PLAN_STORE_BACKENDS[backend](data_dir)
+
+
+def get_plan_store() -> PlanStore:
+    """Return the process-wide plan store, creating it on first use"""
+    global _plan_store
+    if _plan_store is None:
+        with _plan_store_lock:
+            if _plan_store is None:
+                backend = os.environ.get("PLAN_STORE_BACKEND", DEFAULT_BACKEND)
+                _plan_store = create_plan_store(backend)
+    return _plan_store
+
+
+def set_plan_store(store: Optional[PlanStore]):
+    """Replace the process-wide plan store (used by tools and tests)"""
+    global _plan_store
+    with _plan_store_lock:
+        if _plan_store is not None and _plan_store is not store:
+            _plan_store.close()
+        _plan_store = store
+
+
+def get_plan_archive() -> PlanArchive:
+    """Return the process-wide cold archive for finished plans"""
+    global _plan_archive
+    if _plan_archive is None:
+        with _plan_store_lock:
+            if _plan_archive is None:
+                _plan_archive = PlanArchive(DATA_DIR)
+    return _plan_archive
+
+
+__all__ = [
+    'COLLECTIONS', 'PlanStore', 'JsonPlanStore', 'ShardedJsonPlanStore', 'SqlitePlanStore',
+    'PLAN_STORE_BACKENDS', 'create_plan_store', 'get_plan_store', 'set_plan_store',
+    'PlanArchive', 'get_plan_archive',
+]
@@ -0,0 +1,70 @@
+"""
+Bounded thread pool for calling blocking storage code from async endpoints
+
+File reads/writes, fsync and (de)serialization all block. Running them on the
+event loop stalls every other request, so the routers await them through
+run_io(), which hands the call to a fixed-size pool. The pool size
+(STORAGE_IO_THREADS, default 8) also caps the number of per-thread SQLite
+connections.
+"""
+import asyncio
+import functools
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+STORAGE_IO_THREADS = int(os.environ.get("STORAGE_IO_THREADS", "8"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Return the storage thread pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=STORAGE_IO_THREADS, thread_name_prefix="storage-io"
+                )
+    return _executor
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking storage call on the pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(func, *args, **kwargs))
+
+
+def awaitable(func: Callable) -> Callable:
+    """Wrap a blocking storage function as a coroutine function that runs on the pool"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_io(func, *args, **kwargs)
+    return wrapper
+
+
+async def iterate_io(iterable: Iterable, chunk_size: int = 100) -> AsyncIterator:
+    """Drive a blocking iterator on the pool, fetching chunk_size items per hop"""
+    iterator = iter(iterable)
+    while True:
+        chunk = await run_io(list, itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        for item in chunk:
+            yield item
+
+
+def shutdown_io_executor(wait: bool = True):
+    """Wait for queued storage calls and stop the pool"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,146 @@
+"""
+Cold archive for finished training plans
+
+Plans whose end date has passed and that are completed, or that expired more
+than PLAN_ARCHIVE_GRACE_DAYS ago, are moved out of the hot plan store into one
+gzip-compressed document per user: data/archive/<user_id>/plans.gz. Archived
+plans are only read when explicitly requested, so listing and updating plans
+touches active ones only.
+
+Usage (from the backend directory, e.g. from a daily cron job):
+    python -m storage.archive [--grace-days 30]
+"""
+import argparse
+import gzip
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime
+from typing import Dict, Iterator, Optional
+
+from .base import PlanStore
+from .files import atomic_write
+from .locking import file_lock
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR_NAME = "archive"
+DEFAULT_GRACE_DAYS = int(os.environ.get("PLAN_ARCHIVE_GRACE_DAYS", "30"))
+
+_SAFE_USER_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def is_archivable(plan: Dict, today: date, grace_days: int = DEFAULT_GRACE_DAYS) -> bool:
+    """A plan is cold once it has ended and is completed, or ended more than grace_days ago"""
+    try:
+        end_date = datetime.strptime(str(plan.get("end_date", ""))[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return False
+    if end_date >= today:
+        return False
+    return plan.get("status") == "completed" or (today - end_date).days > grace_days
+
+
+class PlanArchive:
+    """Per-user gzip documents holding archived plans, keyed by plan_id"""
+
+    def __init__(self, data_dir: str = "data", compresslevel: int = 6):
+        self.archive_dir = os.path.join(data_dir, ARCHIVE_DIR_NAME)
+        self.compresslevel = compresslevel
+
+    def path_for(self, user_id: str) -> str:
+        if not _SAFE_USER_ID.match(user_id):
+            raise ValueError(f"Invalid user id for plan archive: {user_id!r}")
+        return os.path.join(self.archive_dir, user_id, "plans.gz")
+
+    def _read(self, path: str) -> Dict:
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'rb') as f:
+            return loads(gzip.decompress(f.read()))
+
+    def load(self, user_id: str) -> Dict:
+        """Load every archived plan of a user"""
+        path = self.path_for(user_id)
+        with file_lock(path, shared=True):
+            return self._read(path)
+
+    def get(self, user_id: str, plan_id: str) -> Optional[Dict]:
+        return self.load(user_id).get(plan_id)
+
+    def add(self, user_id: str, plans: Dict):
+        """Merge plans into the user's archive"""
+        path = self.path_for(user_id)
+        with file_lock(path):
+            archived = self._read(path)
+            archived.update(plans)
+            atomic_write(path, gzip.compress(dumps(archived), self.compresslevel, mtime=0))
+
+    def iter_users(self) -> Iterator[str]:
+        if not os.path.isdir(self.archive_dir):
+            return iter(())
+        return iter(sorted(
+            user_id for user_id in os.listdir(self.archive_dir)
+            if os.path.exists(os.path.join(self.archive_dir, user_id, "plans.gz"))
+        ))
+
+
+def archive_user_plans(store: PlanStore, archive: PlanArchive, user_id: str,
+                       today: Optional[date] = None, grace_days: int = DEFAULT_GRACE_DAYS) -> int:
+    """Move one user's cold plans to the archive, returning how many were moved"""
+    today = today or date.today()
+
+    def archive_cold(plans: Dict) -> Dict:
+        # Runs on the current records while the store holds them locked, so a
+        # concurrent update either lands before the check or waits for the delete
+        cold = {
+            plan_id: plan for plan_id, plan in plans.items()
+            if is_archivable(plan, today, grace_days)
+        }
+        if cold:
+            # Archive first: a crash in between leaves a duplicate, never a lost plan
+            archive.add(user_id, cold)
+        return cold
+
+    return len(store.delete_records("plans", user_id, archive_cold))
+
+def archive_plans(store: PlanStore, archive: PlanArchive, today: Optional[date] = None,
+                  grace_days: int = DEFAULT_GRACE_DAYS) -> Dict[str, int]:
+    """Sweep every user's plans into the archive"""
+    counts = {"users": 0, "plans": 0}
+    for user_id in list(store.iter_users("plans")):
+        try:
+            moved = archive_user_plans(store, archive, user_id, today, grace_days)
+        except Exception as e:
+            logger.error(f"Archiving plans of user {user_id} failed: {e}")
+            continue
+        if moved:
+            counts["users"] += 1
+            counts["plans"] += moved
+    if counts["plans"]:
+        logger.info(f"Archived {counts['plans']} plans of {counts['users']} users")
+    return counts
+
+
+def main(argv=None) -> int:
+    from . import DATA_DIR, DEFAULT_BACKEND, create_plan_store
+
+    parser = argparse.ArgumentParser(description="Move completed and expired plans to the cold archive")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--grace-days", type=int, default=DEFAULT_GRACE_DAYS)
+    args = parser.parse_args(argv)
+
+    store = create_plan_store(os.environ.get("PLAN_STORE_BACKEND", DEFAULT_BACKEND), args.data_dir)
+    try:
+        counts = archive_plans(store, PlanArchive(args.data_dir), grace_days=args.grace_days)
+    finally:
+        store.close()
+    print(f"{counts['plans']} plans of {counts['users']} users archived")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+Online backups of the data directory
+
+A backup is a directory <dest>/<timestamp>/ mirroring data/, taken while the
+API keeps serving requests. It is a point-in-time copy: for a brief capture
+phase the process's writers are paused (the journals' locks and the document
+cache are held, so neither edits nor flushes run) and everything is pinned at
+that moment:
+
+- documents with unflushed changes in the write-behind cache are serialized
+  from memory
+- every other file is hard-linked into a staging directory inside data/;
+  writers replace files by atomic rename, so the linked inode keeps the
+  captured content
+- journals (``*.journal.ndjson``) are linked together with their snapshot and
+  their current length, since journals are appended in place
+- SQLite databases get a read transaction, whose snapshot sqlite3's online
+  backup API copies later
+
+Writers resume as soon as the capture phase ends; the captured files are then
+read, compared with the previous backup and written out. With several worker
+processes, writes made by the other workers are only paused per file (through
+the file locks), not for the whole capture.
+
+Incremental backups hard-link every file whose content is unchanged since the
+previous backup (tracked in manifest.json by size and SHA-256), so only
+changed files, e.g. the shards of users who were active, take new space.
+To restore, stop the API and copy a backup directory over data/.
+
+Usage (from the backend directory):
+    python -m storage.backup [--dest backups] [--full]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cache import DocumentCache
+from .files import atomic_write
+from .journal import JournalStore, registered_journals
+from .locking import file_lock
+from .serialization import dumps_json, loads_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+MANIFEST_NAME = "manifest.json"
+JOURNAL_SUFFIX = ".journal.ndjson"
+SNAPSHOT_SUFFIX = ".snapshot.json"
+SQLITE_SUFFIX = ".sqlite3"
+
+
+def _skipped(name: str) -> bool:
+    """Lock files, temp files from atomic writes and SQLite side files"""
+    return (name.startswith(".") or name.endswith(".lock")
+            or name.endswith(SQLITE_SUFFIX + "-wal") or name.endswith(SQLITE_SUFFIX + "-shm"))
+
+
+def _latest_backup(dest_root: str) -> Optional[str]:
+    if not os.path.isdir(dest_root):
+        return None
+    completed = sorted(
+        name for name in os.listdir(dest_root)
+        if not name.startswith(".") and os.path.exists(os.path.join(dest_root, name, MANIFEST_NAME))
+    )
+    return os.path.join(dest_root, completed[-1]) if completed else None
+
+
+def _stage_file(path: str, staged_path: str) -> Optional[bytes]:
+    """Pin a file's current content: hard-link it, or read it if links are unsupported"""
+    os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+    try:
+        os.link(path, staged_path)
+        return None
+    except OSError:
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def _begin_sqlite_snapshot(db_path: str) -> sqlite3.Connection:
+    """Open a read transaction; backing up through it copies the database as of now"""
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    conn.execute("BEGIN")
+    conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+    return conn
+
+
+def _sqlite_backup(conn: sqlite3.Connection) -> bytes:
+    fd, tmp_path = tempfile.mkstemp(suffix=SQLITE_SUFFIX)
+    os.close(fd)
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            conn.backup(target)
+        finally:
+            target.close()
+        with open(tmp_path, 'rb') as f:
+            return f.read()
+    finally:
+        os.unlink(tmp_path)
+
+
+def _read_prefix(path: str, size: int) -> bytes:
+    with open(path, 'rb') as f:
+        journal = f.read(size)
+    # A torn final line is dropped on replay anyway; keep only complete records
+    return journal[:journal.rfind(b"\n") + 1]
+
+
+class _BackupWriter:
+    """Writes files into a new backup, linking those unchanged since the previous one"""
+
+    def __init__(self, target_dir: str, previous_dir: Optional[str], previous_manifest: Dict):
+        self.target_dir = target_dir
+        self.previous_dir = previous_dir
+        self.previous_manifest = previous_manifest
+        self.manifest: Dict[str, Dict] = {}
+        self.stats = {"files": 0, "copied": 0, "linked": 0, "bytes_copied": 0}
+
+    def _link_previous(self, rel_path: str, entry: Dict) -> bool:
+        if self.previous_dir is None:
+            return False
+        target = os.path.join(self.target_dir, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(os.path.join(self.previous_dir, rel_path), target)
+        except OSError:
+            return False
+        self.manifest[rel_path] = entry
+        self.stats["files"] += 1
+        self.stats["linked"] += 1
+        return True
+
+    def add_unchanged_file(self, rel_path: str, st: os.stat_result) -> bool:
+        """Link a disk file whose size and mtime match the previous backup"""
+        previous = self.previous_manifest.get(rel_path)
+        if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+            return self._link_previous(rel_path, previous)
+        return False
+
+    def add(self, rel_path: str, payload: bytes, mtime_ns: Optional[int] = None):
+        entry = {"size": len(payload), "sha256": hashlib.sha256(payload).hexdigest(), "mtime_ns": mtime_ns}
+        previous = self.previous_manifest.get(rel_path)
+        if previous and previous.get("sha256") == entry["sha256"] and self._link_previous(rel_path, entry):
+            return
+        target = os.path.join(self.target_dir, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(payload)
+        self.manifest[rel_path] = entry
+        self.stats["files"] += 1
+        self.stats["copied"] += 1
+        self.stats["bytes_copied"] += len(payload)
+
+
+def create_backup(data_dir: str = "data", dest_root: str = DEFAULT_BACKUP_DIR,
+                  incremental: bool = True, cache: Optional[DocumentCache] = None,
+                  journals: Optional[Iterable[JournalStore]] = None) -> Dict:
+    """Take a point-in-time online backup of data_dir into a new directory under dest_root
+
+    Pass the running process's document cache to include changes it has not
+    flushed yet and to pause its writers during the capture phase; journals
+    default to every journal registered in this process.
+    """
+    os.makedirs(dest_root, exist_ok=True)
+    name = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    partial_dir = os.path.join(dest_root, f".{name}.partial")
+    os.makedirs(partial_dir)
+    # Inside data_dir so hard links work; dot directories are skipped by the walk
+    staging_dir = os.path.join(data_dir, f".backup-{name}")
+
+    previous_dir = _latest_backup(dest_root) if incremental else None
+    previous_manifest = {}
+    if previous_dir is not None:
+        with open(os.path.join(previous_dir, MANIFEST_NAME), 'rb') as f:
+            previous_manifest = loads_json(f.read())["files"]
+    writer = _BackupWriter(partial_dir, previous_dir, previous_manifest)
+    journals = registered_journals() if journals is None else list(journals)
+
+    # (rel_path, staged path or None, payload or None, journal length or None, sqlite snapshot)
+    captured: List[Tuple] = []
+    snapshots: List[sqlite3.Connection] = []
+    try:
+        with ExitStack() as paused:
+            # Journals before the cache: a unit of work may touch the cache while
+            # holding its journal, never the other way round
+            for journal in journals:
+                paused.enter_context(journal.locked())
+            unflushed = {}
+            if cache is not None:
+                paused.enter_context(cache.paused())
+                unflushed = {os.path.abspath(path): payload for path, payload in cache.snapshot_dirty().items()}
+
+            for root, dirs, files in os.walk(data_dir):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for file_name in sorted(files):
+                    if _skipped(file_name):
+                        continue
+                    path = os.path.join(root, file_name)
+                    rel_path = os.path.relpath(path, data_dir)
+                    staged_path = os.path.join(staging_dir, rel_path)
+                    if file_name.endswith(SNAPSHOT_SUFFIX) and os.path.exists(
+                            path[:-len(SNAPSHOT_SUFFIX)] + JOURNAL_SUFFIX):
+                        continue  # captured together with its journal
+                    try:
+                        if file_name.endswith(JOURNAL_SUFFIX):
+                            snapshot_path = path[:-len(JOURNAL_SUFFIX)] + SNAPSHOT_SUFFIX
+                            snapshot_rel = rel_path[:-len(JOURNAL_SUFFIX)] + SNAPSHOT_SUFFIX
+                            # Other processes append and compact under the exclusive lock
+                            with file_lock(path, shared=True):
+                                if os.path.exists(snapshot_path):
+                                    staged_snapshot = os.path.join(staging_dir, snapshot_rel)
+                                    payload = _stage_file(snapshot_path, staged_snapshot)
+                                    captured.append((snapshot_rel, staged_snapshot, payload, None, None))
+                                length = os.path.getsize(path)
+                                payload = _stage_file(path, staged_path)
+                            captured.append((rel_path, staged_path, payload, length, None))
+                        elif file_name.endswith(SQLITE_SUFFIX):
+                            snapshots.append(_begin_sqlite_snapshot(path))
+                            captured.append((rel_path, None, None, None, snapshots[-1]))
+                        elif os.path.abspath(path) in unflushed:
+                            captured.append((rel_path, None, unflushed.pop(os.path.abspath(path)), None, None))
+                        else:
+                            captured.append((rel_path, staged_path, _stage_file(path, staged_path), None, None))
+                    except FileNotFoundError:
+                        continue  # removed while we were walking
+            # Cached documents that have never been flushed have no file on disk yet
+            data_root = os.path.abspath(data_dir)
+            for path, payload in unflushed.items():
+                if path.startswith(data_root + os.sep):
+                    captured.append((os.path.relpath(path, data_root), None, payload, None, None))
+
+        # Writers run again; everything below reads the pinned copies
+        for rel_path, staged_path, payload, length, snapshot in captured:
+            if snapshot is not None:
+                writer.add(rel_path, _sqlite_backup(snapshot))
+            elif payload is not None:
+                writer.add(rel_path, payload if length is None else payload[:length])
+            elif length is not None:
+                writer.add(rel_path, _read_prefix(staged_path, length))
+            else:
+                st = os.stat(staged_path)
+                if not writer.add_unchanged_file(rel_path, st):
+                    with open(staged_path, 'rb') as f:
+                        writer.add(rel_path, f.read(), st.st_mtime_ns)
+
+        manifest = {"created_at": datetime.now().isoformat(), "base": previous_dir, "files": writer.manifest}
+        atomic_write(os.path.join(partial_dir, MANIFEST_NAME), dumps_json(manifest))
+        backup_dir = os.path.join(dest_root, name)
+        os.rename(partial_dir, backup_dir)
+    except BaseException:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        raise
+    finally:
+        for snapshot in snapshots:
+            snapshot.close()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    logger.info(
+        f"Backup written to {backup_dir}: {writer.stats['copied']} files copied, "
+        f"{writer.stats['linked']} unchanged files linked"
+    )
+    return {"path": backup_dir, "incremental": previous_dir is not None, **writer.stats}
+
+
+def main(argv=None) -> int:
+    from . import DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Take an online backup of the data directory")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--dest", default=DEFAULT_BACKUP_DIR)
+    parser.add_argument("--full", action="store_true", help="copy every file instead of linking unchanged ones")
+    args = parser.parse_args(argv)
+
+    result = create_backup(args.data_dir, args.dest, incremental=not args.full)
+    print(f"{result['path']}: {result['copied']} copied ({result['bytes_copied']} bytes), "
+          f"{result['linked']} linked")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
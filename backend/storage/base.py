@@ -0,0 +1,177 @@
+"""
+Storage interface for per-user plan data
+"""
+import copy
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .aio import run_io
+
+# (collection, user_id, record_id, update, default), as taken by update_record()
+RecordUpdate = Tuple[str, str, str, Callable[[Any], Any], Any]
+
+# Collections kept per user: child_id -> child, plan_id -> plan, child_id -> [test results]
+COLLECTIONS = ("children", "plans", "test_results")
+
+
+class PlanStore(ABC):
+    """Abstract store holding one document per (collection, user)"""
+
+    name = "base"
+
+    @abstractmethod
+    def load(self, collection: str, user_id: str) -> Dict:
+        """Load all records of a collection for one user"""
+
+    @abstractmethod
+    def save(self, collection: str, user_id: str, records: Dict):
+        """Replace all records of a collection for one user"""
+
+    @abstractmethod
+    def iter_users(self, collection: str) -> Iterator[str]:
+        """Iterate over user ids that have data in a collection"""
+
+    def get_record(self, collection: str, user_id: str, record_id: str) -> Optional[Any]:
+        """Load a single record"""
+        return self.load(collection, user_id).get(record_id)
+
+    def put_record(self, collection: str, user_id: str, record_id: str, value: Any):
+        """Insert or replace a single record"""
+        records = self.load(collection, user_id)
+        records[record_id] = value
+        self.save(collection, user_id, records)
+
+    def delete_record(self, collection: str, user_id: str, record_id: str):
+        """Remove a single record if it exists"""
+        records = self.load(collection, user_id)
+        if records.pop(record_id, None) is not None:
+            self.save(collection, user_id, records)
+
+    def update_record(self, collection: str, user_id: str, record_id: str,
+                      update: Callable[[Any], Any], default: Any = None) -> Any:
+        """Mutate one record and save it atomically, returning update()'s result
+
+        update() works on a copy: if it raises, nothing is saved. A missing
+        record starts from a copy of ``default``; without one, raises KeyError
+        when the record does not exist.
+        """
+        record = self.get_record(collection, user_id, record_id)
+        if record is None:
+            if default is None:
+                raise KeyError(record_id)
+            record = copy.deepcopy(default)
+        result = update(record)
+        self.put_record(collection, user_id, record_id, record)
+        return result
+
+    def update_records(self, updates: Iterable[RecordUpdate]) -> List[Any]:
+        """Apply several update_record() calls as one atomic step, returning their results
+
+        If any update raises, or a record without a default is missing (KeyError),
+        none of them is saved.
+        """
+        results, staged = apply_updates(updates, self.get_record)
+        self.put_records(
+            (collection, user_id, record_id, record)
+            for (collection, user_id, record_id), record in staged.items()
+        )
+        return results
+
+    def delete_records(self, collection: str, user_id: str,
+                       select: Callable[[Dict], Dict]) -> Dict:
+        """Remove the records picked by select() in one atomic step, returning them
+
+        select() gets a copy of the user's current records and returns the ones
+        to remove (record_id -> record). It runs while the records are locked,
+        so it may store them elsewhere first; if it raises, nothing is removed.
+        """
+        records = self.load(collection, user_id)
+        removed = select(copy.deepcopy(records))
+        if removed:
+            for record_id in removed:
+                records.pop(record_id, None)
+            self.save(collection, user_id, records)
+        return removed
+
+    def put_records(self, items: Iterable[Tuple[str, str, str, Any]]):
+        """Insert or replace a batch of (collection, user_id, record_id, value) records"""
+        for collection, user_id, record_id, value in items:
+            self.put_record(collection, user_id, record_id, value)
+
+    def iter_collection(self, collection: str) -> Iterator[Tuple[str, Dict]]:
+        """Iterate over (user_id, records) of a collection, one user in memory at a time"""
+        for user_id in self.iter_users(collection):
+            yield user_id, self.load(collection, user_id)
+
+    def load_child_plans(self, user_id: str, child_id: str) -> Dict:
+        """Load the plans belonging to one child"""
+        return {
+            plan_id: plan for plan_id, plan in self.load("plans", user_id).items()
+            if plan.get("child_id") == child_id
+        }
+
+    def close(self):
+        """Release resources held by the store"""
+
+    # ---------- awaitable variants, run on the storage thread pool ----------
+
+    async def aload(self, collection: str, user_id: str) -> Dict:
+        return await run_io(self.load, collection, user_id)
+
+    async def asave(self, collection: str, user_id: str, records: Dict):
+        await run_io(self.save, collection, user_id, records)
+
+    async def aget_record(self, collection: str, user_id: str, record_id: str) -> Optional[Any]:
+        return await run_io(self.get_record, collection, user_id, record_id)
+
+    async def aput_record(self, collection: str, user_id: str, record_id: str, value: Any):
+        await run_io(self.put_record, collection, user_id, record_id, value)
+
+    async def adelete_record(self, collection: str, user_id: str, record_id: str):
+        await run_io(self.delete_record, collection, user_id, record_id)
+
+    async def aupdate_record(self, collection: str, user_id: str, record_id: str,
+                             update: Callable[[Any], Any], default: Any = None) -> Any:
+        return await run_io(self.update_record, collection, user_id, record_id, update, default)
+
+    async def aupdate_records(self, updates: Iterable[RecordUpdate]) -> List[Any]:
+        return await run_io(self.update_records, list(updates))
+
+    async def adelete_records(self, collection: str, user_id: str,
+                              select: Callable[[Dict], Dict]) -> Dict:
+        return await run_io(self.delete_records, collection, user_id, select)
+
+    async def aput_records(self, items: Iterable[Tuple[str, str, str, Any]]):
+        await run_io(self.put_records, list(items))
+
+    async def aload_child_plans(self, user_id: str, child_id: str) -> Dict:
+        return await run_io(self.load_child_plans, user_id, child_id)
+
+
+def apply_updates(updates: Iterable[RecordUpdate],
+                  current: Callable[[str, str, str], Optional[Any]]) -> Tuple[List[Any], Dict]:
+    """Run update_record()-style updates on copies of the records returned by current()
+
+    Returns the updates' results and the new records keyed by
+    (collection, user_id, record_id); a record updated twice sees its first
+    update. Stores save the records only once every update has succeeded.
+    """
+    results, staged = [], {}
+    for collection, user_id, record_id, update, default in updates:
+        check_collection(collection)
+        key = (collection, user_id, record_id)
+        if key not in staged:
+            record = current(collection, user_id, record_id)
+            if record is None:
+                if default is None:
+                    raise KeyError(record_id)
+                record = default
+            staged[key] = copy.deepcopy(record)
+        results.append(update(staged[key]))
+    return results, staged
+
+
+def check_collection(collection: str):
+    """Reject unknown collection names"""
+    if collection not in COLLECTIONS:
+        raise ValueError(f"Unknown collection: {collection}")
@@ -0,0 +1,242 @@
+"""
+Streaming NDJSON export and import of per-user plan data
+
+Every line is one record:
+
+    {"type": "child", "user_id": ..., "id": <child_id>, "data": {...}}
+    {"type": "test_result", "user_id": ..., "child_id": ..., "data": {...}}
+    {"type": "plan", "user_id": ..., "id": <plan_id>, "data": {...}}
+
+Exports walk the store one user and collection at a time, and imports commit
+every ``batch_size`` records as one store batch, so memory stays bounded by a
+single family's data rather than the whole clinic. Re-importing a file is
+idempotent: children and plans are replaced by id and test results already
+present (same test_id) are skipped.
+
+Usage (from the backend directory):
+    python -m storage.bulk export [--out data.ndjson]
+    python -m storage.bulk import data.ndjson [--batch-size 500]
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .aio import iterate_io, run_io
+from .base import PlanStore, RecordUpdate
+from .serialization import dumps_json, loads_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("BULK_IMPORT_BATCH_SIZE", "500"))
+# Longest line a streamed import buffers before rejecting the request
+MAX_LINE_BYTES = int(os.environ.get("BULK_IMPORT_MAX_LINE_BYTES", str(8 * 1024 * 1024)))
+
+# record type -> store collection
+RECORD_TYPES = {"child": "children", "test_result": "test_results", "plan": "plans"}
+
+
+def _collection_records(collection: str, user_id: str, records: Dict) -> Iterator[Dict]:
+    if collection == "test_results":
+        for child_id, results in records.items():
+            for result in results:
+                yield {"type": "test_result", "user_id": user_id, "child_id": child_id, "data": result}
+        return
+    record_type = "child" if collection == "children" else "plan"
+    for record_id, value in records.items():
+        yield {"type": record_type, "user_id": user_id, "id": record_id, "data": value}
+
+
+def iter_user_records(store: PlanStore, user_id: str) -> Iterator[Dict]:
+    """Yield one user's children, test results and plans"""
+    for collection in RECORD_TYPES.values():
+        yield from _collection_records(collection, user_id, store.load(collection, user_id))
+
+
+def iter_records(store: PlanStore) -> Iterator[Dict]:
+    """Yield every user's records, holding one user's collection in memory at a time"""
+    for collection in RECORD_TYPES.values():
+        for user_id, records in store.iter_collection(collection):
+            yield from _collection_records(collection, user_id, records)
+
+
+def iter_ndjson(records: Iterable[Dict]) -> Iterator[bytes]:
+    for record in records:
+        yield dumps_json(record) + b"\n"
+
+
+def parse_line(line: Union[bytes, str], line_no: int) -> Optional[Dict]:
+    """Parse and validate one NDJSON line; blank lines yield None"""
+    if not line.strip():
+        return None
+    try:
+        record = loads_json(line)
+    except ValueError as e:
+        raise ValueError(f"line {line_no}: invalid JSON ({e})")
+    if not isinstance(record, dict) or record.get("type") not in RECORD_TYPES:
+        raise ValueError(f"line {line_no}: unknown record type")
+    key = "child_id" if record["type"] == "test_result" else "id"
+    if not record.get("user_id") or not record.get(key) or not isinstance(record.get("data"), dict):
+        raise ValueError(f"line {line_no}: missing user_id, {key} or data")
+    return record
+
+
+def _replace_with(value: Dict):
+    def replace(record: Dict):
+        record.clear()
+        record.update(value)
+    return replace
+
+
+def _merge_results(new_results: List[Dict]):
+    def merge(existing: List[Dict]) -> int:
+        known = {result.get("test_id") for result in existing if result.get("test_id")}
+        added = 0
+        for result in new_results:
+            if result.get("test_id") and result["test_id"] in known:
+                continue
+            existing.append(result)
+            known.add(result.get("test_id"))
+            added += 1
+        return added
+    return merge
+
+
+def import_batch(store: PlanStore, records: List[Dict], user_id: Optional[str] = None) -> Dict[str, int]:
+    """Write a batch of parsed records as one atomic store update
+
+    Test results are merged into the stored lists inside that update, so
+    results submitted meanwhile are kept. When user_id is given every record
+    is imported for that user, whatever its own user_id says.
+    """
+    updates: List[RecordUpdate] = []
+    results: Dict[Tuple[str, str], List[Dict]] = {}
+    counts = {"children": 0, "test_results": 0, "plans": 0}
+    for record in records:
+        owner = user_id or record["user_id"]
+        if record["type"] == "test_result":
+            results.setdefault((owner, record["child_id"]), []).append(record["data"])
+            continue
+        collection = RECORD_TYPES[record["type"]]
+        updates.append((collection, owner, record["id"], _replace_with(record["data"]), {}))
+        counts[collection] += 1
+
+    merged = len(updates)
+    for (owner, child_id), new_results in results.items():
+        updates.append(("test_results", owner, child_id, _merge_results(new_results), []))
+
+    counts["test_results"] = sum(store.update_records(updates)[merged:])
+    return counts
+
+
+def _add_counts(total: Dict[str, int], counts: Dict[str, int]):
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+    total["batches"] = total.get("batches", 0) + 1
+
+
+def import_records(store: PlanStore, lines: Iterable[Union[bytes, str]],
+                   batch_size: int = DEFAULT_BATCH_SIZE, user_id: Optional[str] = None) -> Dict[str, int]:
+    """Import NDJSON lines, committing every batch_size records
+
+    A malformed line raises ValueError; batches before it stay committed.
+    """
+    total = {"children": 0, "test_results": 0, "plans": 0, "batches": 0}
+    batch: List[Dict] = []
+    for line_no, line in enumerate(lines, 1):
+        record = parse_line(line, line_no)
+        if record is None:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            _add_counts(total, import_batch(store, batch, user_id))
+            batch = []
+    if batch:
+        _add_counts(total, import_batch(store, batch, user_id))
+    return total
+
+
+# ---------- async variants for streaming endpoints ----------
+
+async def aiter_ndjson(store: PlanStore, user_id: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Stream one user's records (or everybody's) as NDJSON, reading on the storage pool"""
+    records = iter_user_records(store, user_id) if user_id else iter_records(store)
+    async for line in iterate_io(iter_ndjson(records)):
+        yield line
+
+
+async def aimport_stream(store: PlanStore, chunks: AsyncIterator[bytes],
+                         batch_size: int = DEFAULT_BATCH_SIZE, user_id: Optional[str] = None) -> Dict[str, int]:
+    """Import an NDJSON request body as it arrives, one storage commit per batch
+
+    A line longer than MAX_LINE_BYTES raises ValueError as soon as it is seen,
+    so a body without newlines cannot grow the buffer without limit.
+    """
+    total = {"children": 0, "test_results": 0, "plans": 0, "batches": 0}
+    batch: List[Dict] = []
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"line {line_no + len(lines) + 1}: longer than {MAX_LINE_BYTES} bytes")
+        for line in lines:
+            line_no += 1
+            if len(line) > MAX_LINE_BYTES:
+                raise ValueError(f"line {line_no}: longer than {MAX_LINE_BYTES} bytes")
+            record = parse_line(line, line_no)
+            if record is not None:
+                batch.append(record)
+            if len(batch) >= batch_size:
+                _add_counts(total, await run_io(import_batch, store, batch, user_id))
+                batch = []
+    record = parse_line(buffer, line_no + 1)
+    if record is not None:
+        batch.append(record)
+    if batch:
+        _add_counts(total, await run_io(import_batch, store, batch, user_id))
+    return total
+
+
+def main(argv=None) -> int:
+    from . import DATA_DIR, DEFAULT_BACKEND, create_plan_store
+
+    parser = argparse.ArgumentParser(description="Export or import all plan data as NDJSON")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("--out", help="output file (default: stdout)")
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("file", help="NDJSON file, or - for stdin")
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    store = create_plan_store(os.environ.get("PLAN_STORE_BACKEND", DEFAULT_BACKEND), args.data_dir)
+    try:
+        if args.command == "export":
+            out = open(args.out, 'wb') if args.out else sys.stdout.buffer
+            try:
+                for line in iter_ndjson(iter_records(store)):
+                    out.write(line)
+            finally:
+                if args.out:
+                    out.close()
+        else:
+            source = open(args.file, 'rb') if args.file != "-" else sys.stdin.buffer
+            try:
+                counts = import_records(store, source, args.batch_size)
+            finally:
+                if args.file != "-":
+                    source.close()
+            print(f"{counts['children']} children, {counts['test_results']} test results and "
+                  f"{counts['plans']} plans imported in {counts['batches']} batches", file=sys.stderr)
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
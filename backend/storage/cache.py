@@ -0,0 +1,207 @@
+"""
+Process-wide write-behind cache for JSON documents under data/
+
+Documents are parsed once and kept in memory. Mutations are applied in place
+inside ``edit()`` and only mark the document dirty; a background flusher
+writes dirty documents atomically every ``flush_interval`` seconds, or
+immediately once ``max_dirty`` mutations have accumulated.
+
+With several worker processes (WEB_CONCURRENCY > 1) the cache switches to
+write-through: every edit holds the file's advisory lock, reloads the document
+if another process replaced it, and writes it back before releasing the lock.
+Worker count is not detected; a server started with more workers than
+WEB_CONCURRENCY says refuses to start (see locking.claim_data_dir).
+"""
+import atexit
+import copy
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from .files import atomic_write, encode_document, read_document
+from .locking import MULTI_PROCESS, file_lock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = float(os.environ.get("DOCUMENT_CACHE_FLUSH_INTERVAL", "1.0"))
+DEFAULT_MAX_DIRTY = int(os.environ.get("DOCUMENT_CACHE_MAX_DIRTY", "100"))
+
+
+class DocumentCache:
+    """In-memory documents keyed by file path with deferred atomic flushes"""
+
+    def __init__(self, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_dirty: int = DEFAULT_MAX_DIRTY, write_through: bool = MULTI_PROCESS):
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.write_through = write_through
+        self._docs: Dict[str, Dict] = {}
+        self._dirty: Dict[str, int] = {}
+        # (inode, mtime_ns, size) of the on-disk version each cached document came from
+        self._versions: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        # Guards documents and dirty counters; held while mutating or serializing
+        self._lock = threading.RLock()
+        # Serializes file writes so an older payload never overwrites a newer one
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def _load(self, path: str) -> Dict:
+        doc = self._docs.get(path)
+        if doc is None or (self.write_through and _disk_version(path) != self._versions.get(path)):
+            with file_lock(path, shared=True):
+                doc = read_document(path)
+                self._versions[path] = _disk_version(path)
+            self._docs[path] = doc
+        return doc
+
+    def read(self, path: str) -> Dict:
+        """Return the live document; callers must not mutate it outside edit()"""
+        if not self.write_through:
+            doc = self._docs.get(path)
+            if doc is not None:
+                return doc
+        with self._lock:
+            return self._load(path)
+
+    def read_uncached(self, path: str) -> Dict:
+        """Return a private copy of a document without adding it to the cache"""
+        with self._lock:
+            doc = self._docs.get(path)
+            if doc is not None and not (self.write_through and _disk_version(path) != self._versions.get(path)):
+                return copy.deepcopy(doc)
+        with file_lock(path, shared=True):
+            return read_document(path)
+
+    def is_cached(self, path: str) -> bool:
+        with self._lock:
+            return path in self._docs
+
+    def locked(self) -> threading.RLock:
+        """Hold the cache lock for consistent multi-step reads"""
+        return self._lock
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Hold off edits and flushes, e.g. while a backup pins a point in time"""
+        with self._flush_lock, self._lock:
+            yield
+
+    @contextmanager
+    def edit(self, path: str) -> Iterator[Dict]:
+        """Yield the live document for in-place mutation and mark it dirty afterwards"""
+        with self._lock, file_lock(path):
+            doc = self._load(path)
+            try:
+                yield doc
+            finally:
+                # Memory is the source of truth, so even a partial edit must reach disk
+                self._mark_dirty(path)
+
+    def replace(self, path: str, doc: Dict):
+        """Swap in a whole document"""
+        with self._lock, file_lock(path):
+            self._docs[path] = doc
+            self._mark_dirty(path)
+
+    def _mark_dirty(self, path: str):
+        if self.write_through:
+            # Caller holds the file lock, so no other process can interleave
+            self._write(path, encode_document(self._docs[path]))
+            return
+        self._dirty[path] = self._dirty.get(path, 0) + 1
+        self._ensure_flusher()
+        if sum(self._dirty.values()) >= self.max_dirty:
+            self._wakeup.set()
+
+    def is_dirty(self, path: Optional[str] = None) -> bool:
+        with self._lock:
+            return bool(self._dirty) if path is None else path in self._dirty
+
+    def snapshot_dirty(self) -> Dict[str, bytes]:
+        """Serialize the documents whose latest changes are not on disk yet"""
+        with self._lock:
+            return {path: encode_document(self._docs[path]) for path in self._dirty}
+
+    def flush(self, path: Optional[str] = None):
+        """Write dirty documents (or just one) to disk"""
+        with self._flush_lock:
+            with self._lock:
+                paths = [path] if path is not None else list(self._dirty)
+                payloads = []
+                for p in paths:
+                    if p in self._dirty:
+                        payloads.append((p, self._dirty[p], encode_document(self._docs[p])))
+            error = None
+            for p, edits, payload in payloads:
+                try:
+                    with file_lock(p):
+                        self._write(p, payload)
+                except Exception as e:
+                    logger.error(f"Error flushing {p}: {e}")
+                    error = e
+                    continue
+                # Stay dirty until the write lands, and if it was edited meanwhile
+                with self._lock:
+                    if self._dirty.get(p) == edits:
+                        del self._dirty[p]
+            if error is not None:
+                raise error
+
+    def _write(self, path: str, payload: bytes):
+        atomic_write(path, payload)
+        self._versions[path] = _disk_version(path)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Drop cached documents so the next read goes to disk (dirty data is flushed first)"""
+        self.flush(path)
+        with self._lock:
+            if path is None:
+                self._docs.clear()
+                self._versions.clear()
+            else:
+                self._docs.pop(path, None)
+                self._versions.pop(path, None)
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._stopped.clear()
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="document-cache-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Already logged; the document stays dirty and is retried next tick
+                pass
+
+    def close(self):
+        """Stop the flusher and write everything that is still dirty"""
+        self._stopped.set()
+        self._wakeup.set()
+        flusher = self._flusher
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join(timeout=5)
+        self._flusher = None
+        self.flush()
+
+
+def _disk_version(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+document_cache = DocumentCache()
+atexit.register(document_cache.close)
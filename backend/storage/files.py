@@ -0,0 +1,52 @@
+"""
+File helpers shared by the file-based stores
+"""
+import logging
+import os
+import tempfile
+from typing import Dict
+
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+def read_document(file_path: str) -> Dict:
+    """Load a document in any supported format, returning an empty dict when missing or unreadable"""
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, 'rb') as f:
+                return loads(f.read())
+        except Exception as e:
+            logger.error(f"Error loading {file_path}: {e}")
+            return {}
+    return {}
+
+
+def encode_document(data: Dict) -> bytes:
+    """Serialize a document in the configured on-disk format"""
+    return dumps(data)
+
+
+def atomic_write(file_path: str, payload: bytes):
+    """Write to a temp file in the same directory, fsync it, then rename over the target"""
+    directory = os.path.dirname(file_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file_path)}.", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_document_atomic(file_path: str, data: Dict):
+    """Serialize and atomically replace a document"""
+    atomic_write(file_path, encode_document(data))
@@ -0,0 +1,141 @@
+"""
+In-memory secondary indexes over a family's children, plans and daily tasks
+
+Per user the index maps:
+
+- child_id -> plan ids, in creation order
+- plan_id -> position of the plan in the user's plan list
+- (plan_id, day) -> positions of that day's tasks in ``daily_tasks``
+- child_id -> position of the child in the user's child list
+
+Owners rebuild a user's entries whenever they (re)load that user's data and
+report every mutation, so lookups no longer scan the family's history.
+Plan ids are only unique per user, hence everything is keyed by user first.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class _UserEntries:
+    __slots__ = ("child_plans", "plans", "tasks", "children")
+
+    def __init__(self):
+        self.child_plans: Dict[str, List[str]] = {}
+        # plan_id -> (child_id, position, days)
+        self.plans: Dict[str, tuple] = {}
+        self.tasks: Dict[tuple, List[int]] = {}
+        self.children: Dict[str, int] = {}
+
+
+class PlanIndex:
+    """Secondary indexes for child, plan and task lookups, keyed by user"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users: Dict[str, _UserEntries] = {}
+        # The plan mapping each user's entries were built from (see sync_plans)
+        self._sources: Dict[str, Any] = {}
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._sources.clear()
+
+    def drop_user(self, user_id: str):
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._sources.pop(user_id, None)
+
+    def _entries(self, user_id: str) -> _UserEntries:
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = _UserEntries()
+        return entries
+
+    # ---------- mutations ----------
+
+    def add_child(self, user_id: str, child_id: str, position: int):
+        with self._lock:
+            # Like the scans they replace, lookups resolve duplicates to the first entry
+            self._entries(user_id).children.setdefault(child_id, position)
+
+    def add_plan(self, user_id: str, plan_id: str, plan: Dict, position: Optional[int] = None):
+        """Index a plan; for dict-keyed stores (position None) this replaces the old entry"""
+        with self._lock:
+            entries = self._entries(user_id)
+            if plan_id in entries.plans:
+                if position is not None:
+                    return
+                self._remove_plan(entries, plan_id)
+            days = []
+            for i, task in enumerate(plan.get("daily_tasks") or []):
+                day = task.get("day")
+                entries.tasks.setdefault((plan_id, day), []).append(i)
+                days.append(day)
+            child_id = plan.get("child_id")
+            entries.plans[plan_id] = (child_id, position, days)
+            entries.child_plans.setdefault(child_id, []).append(plan_id)
+
+    def _remove_plan(self, entries: _UserEntries, plan_id: str):
+        child_id, _, days = entries.plans.pop(plan_id)
+        siblings = entries.child_plans.get(child_id, [])
+        if plan_id in siblings:
+            siblings.remove(plan_id)
+        for day in days:
+            entries.tasks.pop((plan_id, day), None)
+
+    def sync_plans(self, user_id: str, plans: Dict[str, Dict]):
+        """Rebuild a user's plan entries unless this exact mapping is already indexed"""
+        with self._lock:
+            if self._sources.get(user_id) is plans:
+                return
+            entries = self._entries(user_id)
+            entries.child_plans.clear()
+            entries.plans.clear()
+            entries.tasks.clear()
+            for plan_id, plan in plans.items():
+                self.add_plan(user_id, plan_id, plan)
+            self._sources[user_id] = plans
+
+    def plan_put(self, user_id: str, plans: Dict[str, Dict], plan_id: str, plan: Dict):
+        """Record an in-place put into a plan mapping previously passed to sync_plans"""
+        with self._lock:
+            if self._sources.get(user_id) is plans:
+                self.add_plan(user_id, plan_id, plan)
+
+    def plan_removed(self, user_id: str, plans: Dict[str, Dict], plan_id: str):
+        """Record an in-place delete from a plan mapping previously passed to sync_plans"""
+        with self._lock:
+            entries = self._users.get(user_id)
+            if self._sources.get(user_id) is plans and plan_id in entries.plans:
+                self._remove_plan(entries, plan_id)
+
+    # ---------- lookups ----------
+
+    def plans_for_child(self, user_id: str, child_id: str) -> List[str]:
+        entries = self._users.get(user_id)
+        return list(entries.child_plans.get(child_id, ())) if entries else []
+
+    def plan_position(self, user_id: str, plan_id: str) -> Optional[int]:
+        entries = self._users.get(user_id)
+        found = entries.plans.get(plan_id) if entries else None
+        return found[1] if found else None
+
+    def task_positions(self, user_id: str, plan_id: str, day: int) -> List[int]:
+        entries = self._users.get(user_id)
+        return list(entries.tasks.get((plan_id, day), ())) if entries else []
+
+    def child_position(self, user_id: str, child_id: str) -> Optional[int]:
+        entries = self._users.get(user_id)
+        return entries.children.get(child_id) if entries else None
+
+
+def find_task_position(daily_tasks: List[Dict], day: int) -> Optional[int]:
+    """Position of the first task for a day; generated plans keep day N at index N-1"""
+    if 0 < day <= len(daily_tasks) and daily_tasks[day - 1].get("day") == day:
+        if day == 1 or daily_tasks[day - 2].get("day") != day:
+            return day - 1
+    for i, task in enumerate(daily_tasks):
+        if task.get("day") == day:
+            return i
+    return None
@@ -0,0 +1,295 @@
+"""
+Append-only mutation journal with periodic snapshot compaction
+
+State lives in memory. Every mutation is a small JSON record that is applied
+to the in-memory state and appended as one NDJSON line, so a write costs
+O(record). The snapshot file holds ``{"seq": N, "data": {...}}``; on load the
+snapshot is read and every journal record with a higher seq is replayed.
+Compaction writes a fresh snapshot and drops the journal lines it covers.
+
+With several worker processes each one tails the shared journal: before a
+read it applies records appended by the others, and appends happen under the
+journal's advisory lock after catching up, so sequence numbers stay ordered.
+"""
+import atexit
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .files import atomic_write, read_document
+from .locking import MULTI_PROCESS, file_lock
+from .serialization import dumps, dumps_json, loads_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPACT_EVERY = int(os.environ.get("JOURNAL_COMPACT_EVERY", "1000"))
+
+ApplyFunction = Callable[[Dict, Dict], None]
+LoadFunction = Callable[[Dict], None]
+
+
+def _encode_record(record: Dict) -> bytes:
+    return dumps_json(record) + b"\n"
+
+
+class JournalStore:
+    """In-memory document backed by a snapshot file plus an NDJSON journal"""
+
+    def __init__(self, snapshot_path: str, journal_path: str, apply: ApplyFunction,
+                 compact_every: int = DEFAULT_COMPACT_EVERY, fsync: bool = False,
+                 legacy_path: Optional[str] = None, multi_process: bool = MULTI_PROCESS,
+                 on_load: Optional[LoadFunction] = None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.apply = apply
+        self.compact_every = compact_every
+        self.fsync = fsync
+        # Plain JSON document used to seed the state when no snapshot exists yet
+        self.legacy_path = legacy_path
+        self.multi_process = multi_process
+        # Called with the fresh state whenever it is (re)loaded, before the journal replays
+        self.on_load = on_load
+        self._lock = threading.RLock()
+        # Taken before _lock; keeps compactions from overlapping
+        self._compact_lock = threading.Lock()
+        self._state: Optional[Dict] = None
+        self._seq = 0
+        self._journal_records = 0
+        self._journal_file = None
+        # Inode and byte offset of the journal contents already applied to _state
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._compacting = False
+
+    # ---------- loading ----------
+
+    @property
+    def state(self) -> Dict:
+        """The live document; mutate it only through append()"""
+        if self._state is None or self.multi_process:
+            with self._lock:
+                if self._state is None:
+                    with file_lock(self.journal_path):
+                        self._load()
+                else:
+                    self._catch_up()
+        return self._state
+
+    def locked(self) -> threading.RLock:
+        """Hold the journal lock for consistent multi-step reads"""
+        return self._lock
+
+    def _load(self):
+        """Read the snapshot and replay the journal (caller holds the file lock)"""
+        seq = 0
+        if os.path.exists(self.snapshot_path):
+            snapshot = read_document(self.snapshot_path)
+            state = snapshot.get("data", {})
+            seq = snapshot.get("seq", 0)
+        elif self.legacy_path and os.path.exists(self.legacy_path):
+            state = read_document(self.legacy_path)
+            logger.info(f"Seeding journal state from legacy file {self.legacy_path}")
+        else:
+            state = {}
+
+        if self._journal_file is not None:
+            self._journal_file.close()
+        self._journal_file = open(self.journal_path, 'ab')
+        self._inode = os.fstat(self._journal_file.fileno()).st_ino
+        self._offset = 0
+        self._state = state
+        self._seq = seq
+        self._journal_records = 0
+        if self.on_load is not None:
+            self.on_load(state)
+
+        replayed = self._replay_tail(truncate_torn=True)
+        if replayed:
+            logger.info(f"Replayed {replayed} journal records from {self.journal_path}")
+
+    def _replay_tail(self, truncate_torn: bool = False) -> int:
+        """Apply journal records past the current offset"""
+        replayed = 0
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    record = loads_json(line)
+                except ValueError:
+                    if self._offset + len(line) < os.fstat(f.fileno()).st_size:
+                        # Records follow it (possibly appended by other workers): keep them
+                        logger.error(
+                            f"Skipping corrupt journal record at offset {self._offset} in {self.journal_path}"
+                        )
+                        self._offset += len(line)
+                        continue
+                    if truncate_torn:
+                        # Torn final write from a crash: nothing follows it, drop it
+                        logger.warning(f"Discarding corrupt journal tail in {self.journal_path}")
+                        f.close()
+                        with open(self.journal_path, 'r+b') as tf:
+                            tf.truncate(self._offset)
+                    break
+                self._offset += len(line)
+                self._journal_records += 1
+                if record["seq"] <= self._seq:
+                    continue
+                self.apply(self._state, record)
+                self._seq = record["seq"]
+                replayed += 1
+        return replayed
+
+    def _catch_up(self):
+        """Pick up records written by other processes (caller holds _lock)"""
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            st = None
+        if st is not None and st.st_ino == self._inode and st.st_size == self._offset:
+            return
+        with file_lock(self.journal_path, shared=True):
+            st = os.stat(self.journal_path) if os.path.exists(self.journal_path) else None
+            if st is None or st.st_ino != self._inode or st.st_size < self._offset:
+                # Another process compacted the journal: start over from its snapshot
+                self._load()
+            elif st.st_size > self._offset:
+                self._replay_tail()
+
+    # ---------- writing ----------
+
+    def append(self, *records: Dict):
+        """Apply records to the state and append them to the journal as one write"""
+        with self._lock:
+            state = self.state
+            with file_lock(self.journal_path):
+                if self.multi_process:
+                    self._catch_up()
+                    state = self._state
+                lines: List[bytes] = []
+                seq = self._seq
+                try:
+                    for record in records:
+                        seq += 1
+                        record = {**record, "seq": seq}
+                        self.apply(state, record)
+                        lines.append(_encode_record(record))
+                except Exception:
+                    # All or nothing: drop the partly applied batch by reloading
+                    # the state from disk, which still matches the journal
+                    self._load()
+                    raise
+                if lines:
+                    payload = b"".join(lines)
+                    self._journal_file.write(payload)
+                    self._journal_file.flush()
+                    if self.fsync:
+                        os.fsync(self._journal_file.fileno())
+                    self._seq = seq
+                    self._offset += len(payload)
+                    self._journal_records += len(lines)
+            should_compact = (
+                self._journal_records >= self.compact_every and not self._compacting
+            )
+            if should_compact:
+                self._compacting = True
+        if should_compact:
+            if self.multi_process:
+                self._compact_in_background()
+            else:
+                threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            # The caller may still hold _lock (e.g. inside a unit of work), so never wait
+            # behind a running compaction; the records simply stay for the next one
+            self.compact(blocking=False)
+        except Exception as e:
+            logger.error(f"Journal compaction failed for {self.journal_path}: {e}")
+
+    def compact(self, blocking: bool = True):
+        """Write a snapshot of the current state and drop the journal lines it covers"""
+        if not self._compact_lock.acquire(blocking):
+            return
+        try:
+            if self.multi_process:
+                # Other processes must neither append nor read a half-swapped pair
+                with self._lock, file_lock(self.journal_path):
+                    self.state
+                    self._catch_up()
+                    self._write_snapshot(self._snapshot_payload(), self._offset)
+                return
+            with self._lock:
+                self._compacting = True
+                self.state
+                payload = self._snapshot_payload()
+                offset = self._offset
+            # The snapshot is written outside the lock; appends keep going meanwhile
+            self._write_snapshot(payload, offset)
+        finally:
+            self._compacting = False
+            self._compact_lock.release()
+
+    def _snapshot_payload(self) -> bytes:
+        return dumps({"seq": self._seq, "data": self._state})
+
+    def _write_snapshot(self, payload: bytes, offset: int):
+        atomic_write(self.snapshot_path, payload)
+        with self._lock, file_lock(self.journal_path):
+            self._journal_file.close()
+            with open(self.journal_path, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+            atomic_write(self.journal_path, tail)
+            self._journal_file = open(self.journal_path, 'ab')
+            self._inode = os.fstat(self._journal_file.fileno()).st_ino
+            self._offset = len(tail)
+            self._journal_records = tail.count(b"\n")
+
+    def reset(self, state: Dict):
+        """Replace the whole state with a new snapshot"""
+        with self._compact_lock, self._lock, file_lock(self.journal_path):
+            self.state  # make sure the journal is loaded
+            self._state = state
+            if self.on_load is not None:
+                self.on_load(state)
+            self._write_snapshot(self._snapshot_payload(), self._offset)
+
+    def close(self):
+        """Compact pending records and close the journal file"""
+        if self._state is None:
+            return
+        if self._journal_records:
+            self.compact()
+        with self._lock:
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+            self._state = None
+            self._inode = None
+            self._offset = 0
+
+
+_open_journals: List[JournalStore] = []
+
+
+def register_journal(journal: JournalStore) -> JournalStore:
+    """Track a journal so it is compacted and closed at interpreter exit"""
+    _open_journals.append(journal)
+    return journal
+
+
+def registered_journals() -> List[JournalStore]:
+    """The journals opened by this process (e.g. to pause them during a backup)"""
+    return list(_open_journals)
+
+
+@atexit.register
+def close_journals():
+    for journal in _open_journals:
+        try:
+            journal.close()
+        except Exception as e:
+            logger.error(f"Error closing journal {journal.journal_path}: {e}")
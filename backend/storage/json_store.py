@@ -0,0 +1,123 @@
+"""
+Legacy JSON file backend: one file per collection holding every user
+"""
+import copy
+import os
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional
+
+from .base import PlanStore, apply_updates, check_collection
+from .cache import DocumentCache, document_cache
+from .indexes import PlanIndex
+
+COLLECTION_FILES = {
+    "children": "user_children.json",
+    "plans": "user_plans.json",
+    "test_results": "user_test_results.json",
+}
+
+
+class JsonPlanStore(PlanStore):
+    """Keeps each collection file in the write-behind document cache"""
+
+    name = "json"
+
+    def __init__(self, data_dir: str = "data", cache: Optional[DocumentCache] = None):
+        self.data_dir = data_dir
+        self.cache = cache or document_cache
+        self.plan_index = PlanIndex()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def path_for(self, collection: str) -> str:
+        check_collection(collection)
+        return os.path.join(self.data_dir, COLLECTION_FILES[collection])
+
+    def load(self, collection: str, user_id: str) -> Dict:
+        # Callers mutate what they load before deciding to save, so hand out a copy
+        with self.cache.locked():
+            data = self.cache.read(self.path_for(collection))
+            return copy.deepcopy(data.get(user_id, {}))
+
+    def get_record(self, collection: str, user_id: str, record_id: str):
+        with self.cache.locked():
+            data = self.cache.read(self.path_for(collection))
+            return copy.deepcopy(data.get(user_id, {}).get(record_id))
+
+    def load_child_plans(self, user_id: str, child_id: str) -> Dict:
+        with self.cache.locked():
+            plans = self.cache.read(self.path_for("plans")).get(user_id, {})
+            self.plan_index.sync_plans(user_id, plans)
+            return {
+                plan_id: copy.deepcopy(plans[plan_id])
+                for plan_id in self.plan_index.plans_for_child(user_id, child_id)
+            }
+
+    def save(self, collection: str, user_id: str, records: Dict):
+        with self.cache.edit(self.path_for(collection)) as data:
+            data[user_id] = records
+
+    def put_record(self, collection: str, user_id: str, record_id: str, value):
+        with self.cache.edit(self.path_for(collection)) as data:
+            records = data.setdefault(user_id, {})
+            records[record_id] = value
+            if collection == "plans":
+                self.plan_index.plan_put(user_id, records, record_id, value)
+
+    def put_records(self, items):
+        with self.cache.locked():
+            for collection, user_id, record_id, value in items:
+                self.put_record(collection, user_id, record_id, value)
+        self.cache.flush()
+
+    def delete_record(self, collection: str, user_id: str, record_id: str):
+        with self.cache.edit(self.path_for(collection)) as data:
+            records = data.get(user_id, {})
+            if records.pop(record_id, None) is not None and collection == "plans":
+                self.plan_index.plan_removed(user_id, records, record_id)
+
+    def update_record(self, collection: str, user_id: str, record_id: str, update, default=None):
+        with self.cache.edit(self.path_for(collection)) as data:
+            records = data.get(user_id, {})
+            if record_id not in records and default is None:
+                raise KeyError(record_id)
+            # Update a copy so an exception in update() leaves the cached record untouched
+            record = copy.deepcopy(records.get(record_id, default))
+            result = update(record)
+            records = data.setdefault(user_id, records)
+            records[record_id] = record
+            if collection == "plans":
+                self.plan_index.plan_put(user_id, records, record_id, records[record_id])
+            return result
+
+    def update_records(self, updates) -> List:
+        updates = list(updates)
+        paths = sorted({self.path_for(collection) for collection, *_ in updates})
+        with ExitStack() as stack:
+            # Hold every collection document (and its file lock) for the whole step, in a fixed order
+            docs = {path: stack.enter_context(self.cache.edit(path)) for path in paths}
+            results, staged = apply_updates(
+                updates, lambda collection, user_id, record_id:
+                    docs[self.path_for(collection)].get(user_id, {}).get(record_id)
+            )
+            for (collection, user_id, record_id), record in staged.items():
+                records = docs[self.path_for(collection)].setdefault(user_id, {})
+                records[record_id] = record
+                if collection == "plans":
+                    self.plan_index.plan_put(user_id, records, record_id, record)
+            return results
+
+    def delete_records(self, collection: str, user_id: str, select) -> Dict:
+        with self.cache.edit(self.path_for(collection)) as data:
+            records = data.get(user_id, {})
+            removed = select(copy.deepcopy(records))
+            for record_id in removed:
+                if records.pop(record_id, None) is not None and collection == "plans":
+                    self.plan_index.plan_removed(user_id, records, record_id)
+            return removed
+
+    def iter_users(self, collection: str) -> Iterator[str]:
+        with self.cache.locked():
+            return iter(list(self.cache.read(self.path_for(collection)).keys()))
+
+    def close(self):
+        self.cache.flush()
@@ -0,0 +1,117 @@
+"""
+Advisory file locks shared by every store under data/
+
+Each data file gets a sibling ``<file>.lock``; holding its fcntl lock is what
+makes a read-modify-write safe across uvicorn worker processes. Locks are
+reentrant within a thread and also serialize threads of the same process.
+On platforms without fcntl only the in-process part applies.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Worker processes share the data directory when uvicorn runs with --workers N;
+# uvicorn reads the same variable for its default worker count.
+WORKER_PROCESSES = int(os.environ.get("WEB_CONCURRENCY", "1") or 1)
+MULTI_PROCESS = WORKER_PROCESSES > 1
+
+# Held by every server process for its lifetime, see claim_data_dir
+SERVER_LOCK_FILE = ".server.lock"
+
+
+class FileLock:
+    """Reentrant process-local + fcntl lock on ``<path>.lock``"""
+
+    def __init__(self, path: str):
+        self.lock_path = f"{path}.lock"
+        self._thread_lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+
+    def _open(self) -> int:
+        if self._fd is None:
+            directory = os.path.dirname(self.lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def acquire(self, shared: bool = False):
+        self._thread_lock.acquire()
+        try:
+            if fcntl is not None:
+                if self._depth == 0:
+                    fcntl.flock(self._open(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                    self._exclusive = not shared
+                elif not shared and not self._exclusive:
+                    # Upgrade a shared lock held further up the stack
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                    self._exclusive = True
+            self._depth += 1
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._exclusive = False
+        self._thread_lock.release()
+
+
+_locks: Dict[str, FileLock] = {}
+_locks_guard = threading.Lock()
+
+
+def get_file_lock(path: str) -> FileLock:
+    """Return the process-wide lock object for a data file"""
+    key = os.path.abspath(path)
+    lock = _locks.get(key)
+    if lock is None:
+        with _locks_guard:
+            lock = _locks.setdefault(key, FileLock(path))
+    return lock
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """Hold the advisory lock for a data file"""
+    lock = get_file_lock(path)
+    lock.acquire(shared=shared)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def claim_data_dir(data_dir: str, multi_process: bool = MULTI_PROCESS) -> Optional[int]:
+    """Register a server process on data_dir, failing fast when it is shared unsafely
+
+    Single-process mode writes behind and assumes it is the only writer, so it
+    holds the lock exclusively: a second worker started without WEB_CONCURRENCY
+    (e.g. uvicorn --workers N or gunicorn -w N) refuses to start instead of
+    silently losing updates. Multi-process workers share the lock. Returns the
+    descriptor to keep open for the life of the process (None without fcntl).
+    """
+    if fcntl is None:
+        return None
+    os.makedirs(data_dir, exist_ok=True)
+    fd = os.open(os.path.join(data_dir, SERVER_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_SH if multi_process else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        raise RuntimeError(
+            f"{data_dir} is already used by another server process. Set WEB_CONCURRENCY to the "
+            f"number of worker processes (currently {WORKER_PROCESSES}) so every worker locks "
+            "and writes through across processes"
+        ) from None
+    return fd
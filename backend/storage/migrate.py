@@ -0,0 +1,98 @@
+"""
+One-shot migration between plan store backends
+
+Usage (from the backend directory):
+    python -m storage.migrate                       # legacy JSON files -> SQLite
+    python -m storage.migrate --target sharded      # legacy JSON files -> data/users/<id>/
+    python -m storage.migrate --source sqlite --target json
+
+The server also runs migrate_legacy_json() at startup, so legacy JSON files
+left in the data directory are imported automatically into an empty store.
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, Optional
+
+from . import COLLECTIONS, DATA_DIR, PLAN_STORE_BACKENDS, PlanStore, create_plan_store
+from .cache import DocumentCache
+from .json_store import COLLECTION_FILES, JsonPlanStore
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(source: PlanStore, target: PlanStore) -> Dict[str, int]:
+    """Copy every user's collections from source to target, returning user counts"""
+    counts = {}
+    for collection in COLLECTIONS:
+        count = 0
+        for user_id in source.iter_users(collection):
+            target.save(collection, user_id, source.load(collection, user_id))
+            count += 1
+        counts[collection] = count
+        logger.info(f"Migrated {collection}: {count} users")
+    return counts
+
+
+def migrate_legacy_json(target: PlanStore, data_dir: str = DATA_DIR) -> Optional[Dict[str, int]]:
+    """Import legacy data/*.json files into the store if it is still empty
+
+    Returns the migrated user counts, or None when there was nothing to do.
+    """
+    if target.name == JsonPlanStore.name:
+        return None
+    legacy_files = [
+        name for name in COLLECTION_FILES.values() if os.path.exists(os.path.join(data_dir, name))
+    ]
+    if not legacy_files:
+        return None
+    if any(next(iter(target.iter_users(collection)), None) is not None for collection in COLLECTIONS):
+        return None  # already migrated (or in use): never merge the legacy files again
+
+    logger.warning(
+        f"Plan store '{target.name}' is empty but legacy JSON files exist in {data_dir} "
+        f"({', '.join(legacy_files)}); migrating them"
+    )
+    # Private cache so the legacy documents don't stay in the shared one
+    source = JsonPlanStore(data_dir, cache=DocumentCache(write_through=True))
+    try:
+        counts = migrate(source, target)
+    except Exception:
+        logger.error(
+            f"Migrating legacy JSON files from {data_dir} failed; the plan store is missing that "
+            f"data until `python -m storage.migrate --target {target.name}` succeeds",
+            exc_info=True,
+        )
+        return None
+    finally:
+        source.close()
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Migrate plan data between storage backends")
+    parser.add_argument("--source", default="json", choices=sorted(PLAN_STORE_BACKENDS))
+    parser.add_argument("--target", default="sqlite", choices=sorted(PLAN_STORE_BACKENDS))
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    if args.source == args.target:
+        parser.error("source and target backends must differ")
+
+    source = create_plan_store(args.source, args.data_dir)
+    target = create_plan_store(args.target, args.data_dir)
+    try:
+        counts = migrate(source, target)
+    finally:
+        source.close()
+        target.close()
+
+    for collection, count in counts.items():
+        print(f"{collection}: {count} users migrated")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
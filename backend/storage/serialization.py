@@ -0,0 +1,90 @@
+"""
+Serialization for persisted documents
+
+Documents are written in the format named by the STORAGE_FORMAT environment
+variable:
+
+- ``json`` (default): compact UTF-8 JSON, encoded with orjson when installed
+- ``msgpack``: binary MessagePack (requires the msgpack package)
+- ``pretty``: the original ``indent=2`` JSON, for hand-editing
+
+Loading detects the format from the payload itself, so files written in any
+format keep working; they are converted the next time they are saved.
+"""
+import json
+import logging
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json", "msgpack", "pretty")
+
+# First bytes a JSON document can start with (after optional BOM/whitespace)
+_JSON_START = frozenset(b'{["-0123456789tfn \t\r\n')
+
+
+def _configured_format() -> str:
+    fmt = os.environ.get("STORAGE_FORMAT", "json")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown STORAGE_FORMAT: {fmt} (expected one of {', '.join(FORMATS)})")
+    if fmt == "msgpack" and msgpack is None:
+        logger.warning("STORAGE_FORMAT=msgpack but msgpack is not installed, using json")
+        return "json"
+    return fmt
+
+
+STORAGE_FORMAT = _configured_format()
+
+
+def dumps_json(data: Any) -> bytes:
+    """Compact single-line UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads_json(payload) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def dumps(data: Any, fmt: str = None) -> bytes:
+    """Encode a document in the configured (or given) format"""
+    fmt = fmt or STORAGE_FORMAT
+    if fmt == "json":
+        return dumps_json(data)
+    if fmt == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    if fmt == "pretty":
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    raise ValueError(f"Unknown storage format: {fmt}")
+
+
+def detect_format(payload: bytes) -> str:
+    """Tell JSON text from MessagePack by the leading byte"""
+    if payload.startswith(b'\xef\xbb\xbf') or not payload or payload[0] in _JSON_START:
+        return "json"
+    return "msgpack"
+
+
+def loads(payload: bytes) -> Any:
+    """Decode a document written in any supported format"""
+    if detect_format(payload) == "msgpack":
+        if msgpack is None:
+            raise ValueError("Document is MessagePack-encoded but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    if payload.startswith(b'\xef\xbb\xbf'):
+        payload = payload[3:]
+    return loads_json(payload)
@@ -0,0 +1,144 @@
+"""
+Per-user sharded JSON backend: data/users/<user_id>/{children,plans,test_results}.json
+
+Each request only reads and rewrites the caller's own shard files, so write
+amplification scales with one family's data rather than the whole user base.
+"""
+import copy
+import os
+import re
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .base import PlanStore, apply_updates, check_collection
+from .cache import DocumentCache, document_cache
+from .indexes import PlanIndex
+
+USERS_DIR_NAME = "users"
+
+_SAFE_USER_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+class ShardedJsonPlanStore(PlanStore):
+    """One small JSON document per (user, collection), kept in the document cache"""
+
+    name = "sharded"
+
+    def __init__(self, data_dir: str = "data", cache: Optional[DocumentCache] = None):
+        self.users_dir = os.path.join(data_dir, USERS_DIR_NAME)
+        self.cache = cache or document_cache
+        self.plan_index = PlanIndex()
+        os.makedirs(self.users_dir, exist_ok=True)
+
+    def shard_dir(self, user_id: str) -> str:
+        if not _SAFE_USER_ID.match(user_id):
+            raise ValueError(f"Invalid user id for sharded storage: {user_id!r}")
+        return os.path.join(self.users_dir, user_id)
+
+    def path_for(self, collection: str, user_id: str) -> str:
+        check_collection(collection)
+        return os.path.join(self.shard_dir(user_id), f"{collection}.json")
+
+    def load(self, collection: str, user_id: str) -> Dict:
+        path = self.path_for(collection, user_id)
+        with self.cache.locked():
+            return copy.deepcopy(self.cache.read(path))
+
+    def get_record(self, collection: str, user_id: str, record_id: str):
+        path = self.path_for(collection, user_id)
+        with self.cache.locked():
+            return copy.deepcopy(self.cache.read(path).get(record_id))
+
+    def load_child_plans(self, user_id: str, child_id: str) -> Dict:
+        path = self.path_for("plans", user_id)
+        with self.cache.locked():
+            plans = self.cache.read(path)
+            self.plan_index.sync_plans(user_id, plans)
+            return {
+                plan_id: copy.deepcopy(plans[plan_id])
+                for plan_id in self.plan_index.plans_for_child(user_id, child_id)
+            }
+
+    def save(self, collection: str, user_id: str, records: Dict):
+        self.cache.replace(self.path_for(collection, user_id), records)
+
+    def put_record(self, collection: str, user_id: str, record_id: str, value):
+        with self.cache.edit(self.path_for(collection, user_id)) as records:
+            records[record_id] = value
+            if collection == "plans":
+                self.plan_index.plan_put(user_id, records, record_id, value)
+
+    def put_records(self, items):
+        touched = set()
+        with self.cache.locked():
+            for collection, user_id, record_id, value in items:
+                path = self.path_for(collection, user_id)
+                if not self.cache.is_cached(path):
+                    touched.add(path)
+                self.put_record(collection, user_id, record_id, value)
+        self.cache.flush()
+        # Bulk imports touch many families once; don't keep their shards in memory
+        for path in touched:
+            self.cache.invalidate(path)
+
+    def delete_record(self, collection: str, user_id: str, record_id: str):
+        with self.cache.edit(self.path_for(collection, user_id)) as records:
+            if records.pop(record_id, None) is not None and collection == "plans":
+                self.plan_index.plan_removed(user_id, records, record_id)
+
+    def update_record(self, collection: str, user_id: str, record_id: str, update, default=None):
+        with self.cache.edit(self.path_for(collection, user_id)) as records:
+            if record_id not in records and default is None:
+                raise KeyError(record_id)
+            # Update a copy so an exception in update() leaves the cached record untouched
+            record = copy.deepcopy(records.get(record_id, default))
+            result = update(record)
+            records[record_id] = record
+            if collection == "plans":
+                self.plan_index.plan_put(user_id, records, record_id, records[record_id])
+            return result
+
+    def update_records(self, updates) -> List:
+        updates = list(updates)
+        paths = sorted({self.path_for(collection, user_id) for collection, user_id, *_ in updates})
+        touched = [path for path in paths if not self.cache.is_cached(path)]
+        with ExitStack() as stack:
+            # Hold every shard (and its file lock) for the whole step, in a fixed order
+            docs = {path: stack.enter_context(self.cache.edit(path)) for path in paths}
+            results, staged = apply_updates(
+                updates, lambda collection, user_id, record_id:
+                    docs[self.path_for(collection, user_id)].get(record_id)
+            )
+            for (collection, user_id, record_id), record in staged.items():
+                records = docs[self.path_for(collection, user_id)]
+                records[record_id] = record
+                if collection == "plans":
+                    self.plan_index.plan_put(user_id, records, record_id, record)
+        # As with put_records, don't keep shards that were only loaded for this step
+        for path in touched:
+            self.cache.invalidate(path)
+        return results
+
+    def delete_records(self, collection: str, user_id: str, select) -> Dict:
+        with self.cache.edit(self.path_for(collection, user_id)) as records:
+            removed = select(copy.deepcopy(records))
+            for record_id in removed:
+                if records.pop(record_id, None) is not None and collection == "plans":
+                    self.plan_index.plan_removed(user_id, records, record_id)
+            return removed
+
+    def iter_users(self, collection: str) -> Iterator[str]:
+        check_collection(collection)
+        file_name = f"{collection}.json"
+        # Shards only exist on disk once flushed
+        self.cache.flush()
+        for user_id in sorted(os.listdir(self.users_dir)):
+            if os.path.exists(os.path.join(self.users_dir, user_id, file_name)):
+                yield user_id
+
+    def iter_collection(self, collection: str) -> Iterator[Tuple[str, Dict]]:
+        for user_id in self.iter_users(collection):
+            yield user_id, self.cache.read_uncached(self.path_for(collection, user_id))
+
+    def close(self):
+        self.cache.flush()
@@ -0,0 +1,228 @@
+"""
+SQLite backend: one row per user record, so reads and writes touch a single user
+"""
+import copy
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .base import PlanStore, apply_updates, check_collection
+from .serialization import dumps_json, loads_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_NAME = "plans.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_records (
+    user_id TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, collection, record_id)
+) WITHOUT ROWID;
+-- Secondary index for child -> plans lookups
+CREATE INDEX IF NOT EXISTS user_plans_by_child
+    ON user_records (user_id, json_extract(data, '$.child_id'))
+    WHERE collection = 'plans';
+"""
+
+
+class SqlitePlanStore(PlanStore):
+    """Stores records keyed by (user_id, collection, record_id) in WAL mode"""
+
+    name = "sqlite"
+
+    def __init__(self, data_dir: str = "data", db_name: str = DEFAULT_DB_NAME):
+        os.makedirs(data_dir, exist_ok=True)
+        self.db_path = os.path.join(data_dir, db_name)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        with self._transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the calling thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connect())
+
+    def load(self, collection: str, user_id: str) -> Dict:
+        check_collection(collection)
+        rows = self._connect().execute(
+            "SELECT record_id, data FROM user_records WHERE user_id = ? AND collection = ?",
+            (user_id, collection),
+        )
+        return {record_id: loads_json(data) for record_id, data in rows}
+
+    def save(self, collection: str, user_id: str, records: Dict):
+        check_collection(collection)
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM user_records WHERE user_id = ? AND collection = ?",
+                (user_id, collection),
+            )
+            conn.executemany(
+                "INSERT INTO user_records (user_id, collection, record_id, data) VALUES (?, ?, ?, ?)",
+                [
+                    (user_id, collection, record_id, _encode(value))
+                    for record_id, value in records.items()
+                ],
+            )
+
+    def get_record(self, collection: str, user_id: str, record_id: str) -> Optional[Any]:
+        check_collection(collection)
+        row = self._connect().execute(
+            "SELECT data FROM user_records WHERE user_id = ? AND collection = ? AND record_id = ?",
+            (user_id, collection, record_id),
+        ).fetchone()
+        return loads_json(row[0]) if row else None
+
+    def put_record(self, collection: str, user_id: str, record_id: str, value: Any):
+        check_collection(collection)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO user_records (user_id, collection, record_id, data) "
+                "VALUES (?, ?, ?, ?)",
+                (user_id, collection, record_id, _encode(value)),
+            )
+
+    def put_records(self, items):
+        rows = []
+        for collection, user_id, record_id, value in items:
+            check_collection(collection)
+            rows.append((user_id, collection, record_id, _encode(value)))
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_records (user_id, collection, record_id, data) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete_record(self, collection: str, user_id: str, record_id: str):
+        check_collection(collection)
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM user_records WHERE user_id = ? AND collection = ? AND record_id = ?",
+                (user_id, collection, record_id),
+            )
+
+    def update_record(self, collection: str, user_id: str, record_id: str,
+                      update: Callable[[Any], Any], default: Any = None) -> Any:
+        check_collection(collection)
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM user_records WHERE user_id = ? AND collection = ? AND record_id = ?",
+                (user_id, collection, record_id),
+            ).fetchone()
+            if row is None:
+                if default is None:
+                    raise KeyError(record_id)
+                record = copy.deepcopy(default)
+            else:
+                record = loads_json(row[0])
+            result = update(record)
+            conn.execute(
+                "INSERT OR REPLACE INTO user_records (user_id, collection, record_id, data) "
+                "VALUES (?, ?, ?, ?)",
+                (user_id, collection, record_id, _encode(record)),
+            )
+        return result
+
+    def update_records(self, updates) -> List[Any]:
+        with self._transaction() as conn:
+            def current(collection: str, user_id: str, record_id: str) -> Optional[Any]:
+                row = conn.execute(
+                    "SELECT data FROM user_records WHERE user_id = ? AND collection = ? AND record_id = ?",
+                    (user_id, collection, record_id),
+                ).fetchone()
+                return loads_json(row[0]) if row else None
+
+            results, staged = apply_updates(updates, current)
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_records (user_id, collection, record_id, data) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (user_id, collection, record_id, _encode(record))
+                    for (collection, user_id, record_id), record in staged.items()
+                ],
+            )
+        return results
+
+    def delete_records(self, collection: str, user_id: str,
+                       select: Callable[[Dict], Dict]) -> Dict:
+        check_collection(collection)
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT record_id, data FROM user_records WHERE user_id = ? AND collection = ?",
+                (user_id, collection),
+            )
+            removed = select({record_id: loads_json(data) for record_id, data in rows})
+            conn.executemany(
+                "DELETE FROM user_records WHERE user_id = ? AND collection = ? AND record_id = ?",
+                [(user_id, collection, record_id) for record_id in removed],
+            )
+        return removed
+
+    def load_child_plans(self, user_id: str, child_id: str) -> Dict:
+        rows = self._connect().execute(
+            "SELECT record_id, data FROM user_records "
+            "WHERE user_id = ? AND collection = 'plans' AND json_extract(data, '$.child_id') = ?",
+            (user_id, child_id),
+        )
+        return {record_id: loads_json(data) for record_id, data in rows}
+
+    def iter_users(self, collection: str) -> Iterator[str]:
+        check_collection(collection)
+        rows = self._connect().execute(
+            "SELECT DISTINCT user_id FROM user_records WHERE collection = ?",
+            (collection,),
+        ).fetchall()
+        return (row[0] for row in rows)
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Connection owned by another thread that is still alive
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+
+class _Transaction:
+    """Context manager wrapping BEGIN IMMEDIATE / COMMIT / ROLLBACK"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+def _encode(value: Any) -> str:
+    return dumps_json(value).decode('utf-8')
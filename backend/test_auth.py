@@ -0,0 +1,158 @@
+"""
+测试登录认证：会话缓存、会话过期清理、签名令牌及吊销列表、登录时间缓冲、密码哈希
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage.cache import DocumentCache
+
+
+@pytest.fixture
+def auth_module(tmp_path, monkeypatch):
+    import auth
+    from utils.lru_cache import LRUCache
+
+    monkeypatch.setattr(auth, "USERS_FILE", str(tmp_path / "users.json"))
+    monkeypatch.setattr(auth, "SESSIONS_FILE", str(tmp_path / "sessions.json"))
+    monkeypatch.setattr(auth, "document_cache", DocumentCache())
+    monkeypatch.setattr(auth, "session_cache", LRUCache(maxsize=2, ttl=60))
+    monkeypatch.setattr(auth, "session_expiry_queue", auth.SessionExpiryQueue())
+    monkeypatch.setattr(auth, "REVOKED_TOKENS_FILE", str(tmp_path / "revoked_tokens.json"))
+    monkeypatch.setattr(auth, "TOKEN_SECRET_FILE", str(tmp_path / "token_secret"))
+    monkeypatch.setattr(auth, "_token_secret", None)
+    monkeypatch.setattr(auth, "revocation_list", auth.RevocationList(bloom_bits=1024))
+    monkeypatch.setattr(auth, "last_login_buffer", auth.LastLoginBuffer())
+    monkeypatch.setattr(auth, "PASSWORD_SCRYPT_N", 2 ** 10)
+    yield auth
+
+
+def test_session_cache_hits_and_invalidation(auth_module):
+    user = auth_module.register_user("a@example.com", "pw", "A")
+    token = auth_module.create_session(user.id)
+
+    assert auth_module.get_user_from_session(token).id == user.id
+    assert auth_module.get_user_from_session(token).id == user.id
+    stats = auth_module.session_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # A login updates last_login, so the cached user must not be served again
+    auth_module.authenticate_user("a@example.com", "pw")
+    assert auth_module.get_user_from_session(token).last_login is not None
+
+    auth_module.delete_session(token)
+    assert auth_module.get_user_from_session(token) is None
+    assert len(auth_module.session_cache) == 0
+
+
+def test_email_index_is_case_insensitive_and_unique(auth_module):
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi import HTTPException
+
+    user = auth_module.register_user("Mixed@Example.com", "pw", "A")
+    assert auth_module.authenticate_user("mixed@example.COM", "pw").id == user.id
+    assert auth_module.authenticate_user("mixed@example.com", "wrong") is None
+    assert auth_module.authenticate_user("nobody@example.com", "pw") is None
+
+    def register(i):
+        try:
+            return auth_module.register_user(" same@example.com", "pw", f"user{i}").id
+        except HTTPException:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        registered = [user_id for user_id in pool.map(register, range(16)) if user_id]
+    assert len(registered) == 1
+
+    # A replaced users document rebuilds the index
+    auth_module.save_users({"u9": {"email": "new@example.com", "password_hash": auth_module.hash_password("pw")}})
+    assert auth_module.authenticate_user("NEW@example.com", "pw").id == "u9"
+    assert auth_module.authenticate_user("Mixed@Example.com", "pw") is None
+
+
+def test_expired_sessions_are_purged_in_bulk(auth_module):
+    from datetime import datetime, timedelta
+
+    now = datetime.now()
+    # Sessions already on disk, e.g. from before a restart
+    auth_module.save_sessions({
+        "old1": {"user_id": "u1", "expires_at": (now - timedelta(days=2)).isoformat()},
+        "old2": {"user_id": "u1", "expires_at": (now - timedelta(days=1)).isoformat()},
+        "live": {"user_id": "u1", "expires_at": (now + timedelta(days=1)).isoformat()},
+    })
+    fresh = auth_module.create_session("u2")
+    auth_module.delete_session("old2")
+
+    assert auth_module.purge_expired_sessions(now) == 1
+    assert set(auth_module.load_sessions()) == {"live", fresh}
+    assert auth_module.purge_expired_sessions(now) == 0
+    # Thirty-day tokens expire once their lifetime has passed
+    assert auth_module.purge_expired_sessions(now + timedelta(days=31)) == 2
+    assert auth_module.load_sessions() == {}
+
+
+def test_signed_tokens_validate_without_sessions_and_can_be_revoked(auth_module, monkeypatch):
+    monkeypatch.setattr(auth_module, "AUTH_TOKEN_MODE", "signed")
+    user = auth_module.register_user("s@example.com", "pw", "S")
+    token = auth_module.issue_token(user)
+    other = auth_module.issue_token(user)
+
+    assert auth_module.load_sessions() == {}
+    assert set(auth_module.decode_signed_token(token)) == {"sub", "jti", "exp"}
+    assert auth_module.get_user_from_session(token).email == "s@example.com"
+    # The profile is looked up on use, so a later login shows up
+    auth_module.authenticate_user("s@example.com", "pw")
+    assert auth_module.get_user_from_session(token).last_login is not None
+    body, _, signature = token.partition(".")
+    assert auth_module.get_user_from_session(body[:-2] + "xx." + signature) is None
+
+    auth_module.delete_session(token)
+    assert auth_module.get_user_from_session(token) is None
+    assert auth_module.get_user_from_session(other) is not None
+
+    # Revocations are dropped once the token would have expired anyway
+    expires = auth_module.decode_signed_token(other)["exp"]
+    assert auth_module.revocation_list.prune(expires + 1) == 1
+    assert auth_module.document_cache.read(auth_module.REVOKED_TOKENS_FILE) == {}
+
+    # Tokens of deleted users no longer resolve
+    auth_module.save_users({})
+    assert auth_module.get_user_from_session(other) is None
+
+
+def test_logins_are_buffered_and_flushed_in_one_write(auth_module):
+    users = [auth_module.register_user(f"u{i}@example.com", "pw", "U") for i in range(3)]
+    token = auth_module.create_session(users[0].id)
+    auth_module.document_cache.flush()
+    users_file = auth_module.USERS_FILE
+    mtime = os.stat(users_file).st_mtime_ns
+
+    for user in users:
+        assert auth_module.authenticate_user(user.email, "pw").last_login is not None
+    assert not auth_module.document_cache.is_dirty(users_file)
+    assert auth_module.get_user_from_session(token).last_login is not None
+
+    assert auth_module.last_login_buffer.flush() == 3
+    assert auth_module.last_login_buffer.flush() == 0
+    auth_module.document_cache.flush()
+    assert os.stat(users_file).st_mtime_ns != mtime
+    assert all(auth_module.load_users()[user.id]["last_login"] for user in users)
+
+
+def test_legacy_password_hashes_are_upgraded_on_login(auth_module):
+    legacy = auth_module._legacy_hash("pw")
+    auth_module.save_users({"u1": {"email": "old@example.com", "password_hash": legacy}})
+
+    assert asyncio.run(auth_module.authenticate_user_async("old@example.com", "nope")) is None
+    assert auth_module.load_users()["u1"]["password_hash"] == legacy
+
+    assert asyncio.run(auth_module.authenticate_user_async("old@example.com", "pw")).id == "u1"
+    upgraded = auth_module.load_users()["u1"]["password_hash"]
+    assert upgraded.startswith("scrypt$1024$") and not auth_module.needs_rehash(upgraded)
+    assert auth_module.verify_password("pw", upgraded)
+    assert not auth_module.verify_password("nope", upgraded)
+    assert auth_module.authenticate_user("old@example.com", "pw").id == "u1"
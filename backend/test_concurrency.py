@@ -0,0 +1,133 @@
+"""
+多进程并发写入压力测试（模拟 uvicorn --workers N）
+"""
+import json
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKERS = 4
+OPS_PER_WORKER = 30
+SHARED_USER = "shared_user"
+
+
+def _hammer(work_dir: str, worker_id: int, start_event):
+    os.environ["WEB_CONCURRENCY"] = str(WORKERS)
+    # Compact often so workers also race against each other's snapshot swaps
+    os.environ["JOURNAL_COMPACT_EVERY"] = "7"
+    # The race is about file writes, not password hashing cost
+    os.environ["PASSWORD_SCRYPT_N"] = "1024"
+    os.chdir(work_dir)
+
+    import auth
+    import user_data
+    from storage.cache import document_cache
+
+    start_event.wait()
+    for i in range(OPS_PER_WORKER):
+        user = auth.register_user(f"w{worker_id}-{i}@example.com", "secret", f"user {i}")
+        auth.create_session(user.id)
+        user_data.add_child(SHARED_USER, f"child {worker_id}-{i}", 6, "male", {})
+    document_cache.close()
+
+
+def _update_plan(work_dir: str, worker_id: int, start_event, backend: str):
+    os.environ["WEB_CONCURRENCY"] = str(WORKERS)
+    os.environ["PLAN_STORE_BACKEND"] = backend
+    os.chdir(work_dir)
+
+    from storage import get_plan_store
+    from storage.cache import document_cache
+
+    def mark(i):
+        def apply(plan):
+            plan["daily_tasks"][0]["marks"].append(f"{worker_id}-{i}")
+        return apply
+
+    store = get_plan_store()
+    start_event.wait()
+    for i in range(OPS_PER_WORKER):
+        store.update_record("plans", SHARED_USER, "p1", mark(i))
+    document_cache.close()
+
+
+def _run_workers(work_dir: str, target=_hammer, *args):
+    ctx = multiprocessing.get_context("spawn")
+    start_event = ctx.Event()
+    processes = [
+        ctx.Process(target=target, args=(work_dir, worker_id, start_event, *args))
+        for worker_id in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    start_event.set()
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+
+def test_concurrent_writers_do_not_lose_updates(tmp_path):
+    _run_workers(str(tmp_path))
+    data_dir = tmp_path / "data"
+
+    users = json.loads((data_dir / "users.json").read_text(encoding="utf-8"))
+    sessions = json.loads((data_dir / "sessions.json").read_text(encoding="utf-8"))
+    assert len(users) == WORKERS * OPS_PER_WORKER
+    assert len(sessions) == WORKERS * OPS_PER_WORKER
+
+    from storage.journal import JournalStore
+    from user_data import _apply_record
+
+    journal = JournalStore(
+        str(data_dir / "user_data.snapshot.json"),
+        str(data_dir / "user_data.journal.ndjson"),
+        _apply_record,
+    )
+    children = journal.state[SHARED_USER]["children"]
+    assert len(children) == WORKERS * OPS_PER_WORKER
+    assert {c["name"] for c in children} == {
+        f"child {w}-{i}" for w in range(WORKERS) for i in range(OPS_PER_WORKER)
+    }
+    journal.close()
+
+
+@pytest.mark.parametrize("backend", ["json", "sharded"])
+def test_concurrent_plan_updates_do_not_lose_updates(tmp_path, backend):
+    from storage import PLAN_STORE_BACKENDS
+    from storage.cache import DocumentCache
+
+    data_dir = str(tmp_path / "data")
+    store = PLAN_STORE_BACKENDS[backend](data_dir, cache=DocumentCache(write_through=True))
+    store.put_record("plans", SHARED_USER, "p1", {"child_id": "c1", "daily_tasks": [{"day": 1, "marks": []}]})
+    store.close()
+
+    _run_workers(str(tmp_path), _update_plan, backend)
+
+    store = PLAN_STORE_BACKENDS[backend](data_dir, cache=DocumentCache())
+    marks = store.get_record("plans", SHARED_USER, "p1")["daily_tasks"][0]["marks"]
+    assert sorted(marks) == sorted(f"{w}-{i}" for w in range(WORKERS) for i in range(OPS_PER_WORKER))
+
+
+def test_workers_started_without_web_concurrency_fail_fast(tmp_path):
+    pytest.importorskip("fcntl")
+    from storage.locking import claim_data_dir
+
+    data_dir = str(tmp_path / "data")
+    single = claim_data_dir(data_dir, multi_process=False)
+    # 写回模式的进程独占数据目录：再启动任何工作进程都直接失败
+    with pytest.raises(RuntimeError, match="WEB_CONCURRENCY"):
+        claim_data_dir(data_dir, multi_process=False)
+    with pytest.raises(RuntimeError, match="WEB_CONCURRENCY"):
+        claim_data_dir(data_dir, multi_process=True)
+    os.close(single)
+
+    # 写穿模式的工作进程可以共享
+    shared = [claim_data_dir(data_dir, multi_process=True) for _ in range(2)]
+    with pytest.raises(RuntimeError):
+        claim_data_dir(data_dir, multi_process=False)
+    for fd in shared:
+        os.close(fd)
@@ -0,0 +1,166 @@
+"""
+测试训练计划生成：共享模板目录、模板引用存储格式、家长指导缓存、批量生成及得分统计
+"""
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import plan_generator as generator_module
+from models.plan_generator import (
+    ChildInfo, PlanGenerator, TestResult, add_test_score, aggregate_test_results, average_score,
+    summarize_plan_progress,
+)
+
+
+@pytest.fixture
+def planning():
+    """共用的孩子、测试结果，以及创建独立生成器（模板目录和缓存互不影响）的工厂"""
+    return SimpleNamespace(
+        child=ChildInfo("c1", "Kid", 7, "m", "2017-01-01", "Parent", "2024-01-01T00:00:00"),
+        result=TestResult("t1", "c1", "schulte", {}, 40, "needs_improvement", "2024-01-01T00:00:00"),
+        new_generator=PlanGenerator,
+    )
+
+
+def test_apply_test_result_adjusts_future_tasks_only(planning):
+    tasks = [
+        {"day": day, "completed": day == 3, "activities": [{"duration": 10}]}
+        for day in range(1, 5)
+    ]
+    task = planning.new_generator().apply_test_result_to_tasks(tasks, 1, 4, planning.result)
+
+    assert task["test_completed"] is True and task["test_result"]["score"] == 40
+    assert [t["activities"][0]["duration"] for t in tasks] == [10, 10, 10, 15]
+
+
+def test_adjusting_a_plan_leaves_shared_templates_untouched(planning):
+    generator, child, result = planning.new_generator(), planning.child, planning.result
+
+    first = generator.generate_plan(child, [result], language="en")
+    generator.update_plan_with_test_result(first, 1, result)
+    second = generator.generate_plan(child, [result], language="en")
+
+    catalog = generator._load_activity_templates("en")
+    for task in second.daily_tasks:
+        for activity in task.activities:
+            assert activity["duration"] == catalog.by_id[activity["template_id"]].duration
+    assert first.daily_tasks[-1].activities[0]["duration"] > second.daily_tasks[-1].activities[0]["duration"]
+    with pytest.raises(AttributeError):
+        catalog.by_id["color_match"].duration = 30
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        plans = list(pool.map(lambda lang: (lang, generator.generate_plan(child, [result], language=lang)),
+                              ["en", "zh"] * 4))
+    for language, plan in plans:
+        names = {template.name for template in generator._load_activity_templates(language).by_id.values()}
+        assert all(a["name"] in names for task in plan.daily_tasks for a in task.activities)
+
+
+def test_plans_are_stored_as_template_refs_and_rendered_per_language(planning):
+    generator, child, result = planning.new_generator(), planning.child, planning.result
+    zh_plan = asdict(generator.generate_plan(child, [result], "monthly", language="zh"))
+    en_plan = asdict(generator.generate_plan(child, [result], "monthly", language="en"))
+
+    stored = generator.compact_plan(zh_plan)
+    def size(document):
+        return len(json.dumps(document, ensure_ascii=False).encode("utf-8"))
+
+    assert size(stored) * 5 < size(zh_plan)
+    assert all("parent_guidance" not in task for task in stored["daily_tasks"])
+    assert set(stored["daily_tasks"][0]["activities"][0]) == {"template_id", "duration"}
+
+    for language, expected in (("zh", zh_plan), ("en", en_plan)):
+        rendered = generator.render_plan(stored, language)
+        assert rendered["daily_tasks"] == expected["daily_tasks"]
+
+    # 旧格式（完整文本）的计划按活动名称找到模板，也能渲染为其他语言
+    legacy = dict(zh_plan, daily_tasks=[
+        dict(task, activities=[{k: v for k, v in a.items() if k != "template_id"} for a in task["activities"]])
+        for task in zh_plan["daily_tasks"]
+    ])
+    assert generator.render_plan(legacy, "en")["daily_tasks"] == en_plan["daily_tasks"]
+    assert generator.compact_plan(legacy) == stored
+    custom = {"type": "custom", "name": "Walk", "duration": 5, "description": "Walk outside"}
+    assert generator.render_plan({"daily_tasks": [{"day": 1, "activities": [custom]}]}, "en")[
+        "daily_tasks"][0]["activities"] == [custom]
+
+
+def test_parent_guidance_is_memoized(planning):
+    generator = planning.new_generator()
+    stored = generator.compact_plan(
+        asdict(generator.generate_plan(planning.child, [planning.result], language="en"))
+    )
+    misses = generator.guidance_cache.misses
+
+    first = generator.render_plan(stored, "en")
+    second = generator.render_plan(stored, "en")
+    assert first == second
+    stats = generator.guidance_cache.stats()
+    assert stats["misses"] == misses and stats["hits"] == 2 * len(stored["daily_tasks"])
+
+    stored["daily_tasks"][-1]["activities"][0]["duration"] += 5
+    adjusted = generator.render_plan(stored, "en")["daily_tasks"][-1]["parent_guidance"]
+    assert adjusted != first["daily_tasks"][-1]["parent_guidance"]
+    assert generator.guidance_cache.misses == misses + 1
+    zh_guidance = generator.render_plan(stored, "zh")["daily_tasks"][0]["parent_guidance"]
+    assert zh_guidance != first["daily_tasks"][0]["parent_guidance"]
+
+
+def test_batch_generation_runs_on_process_pool_in_order(planning, monkeypatch):
+    monkeypatch.setattr(generator_module, "PLAN_GENERATION_WORKERS", 2)
+    jobs = [
+        {"child": dict(asdict(planning.child), child_id=f"c{i}"),
+         "test_results": [dict(asdict(planning.result), child_id=f"c{i}")],
+         "plan_type": "weekly", "language": "en"}
+        for i in range(5)
+    ]
+    jobs.insert(2, {"child": {"child_id": "bad"}, "test_results": [], "plan_type": "weekly"})
+    try:
+        results = asyncio.run(generator_module.run_batch_generation(jobs))
+    finally:
+        generator_module.shutdown_generation_executor()
+
+    assert "error" in results[2]
+    plans = [r["plan"] for r in results if "plan" in r]
+    assert [plan["child_id"] for plan in plans] == [f"c{i}" for i in range(5)]
+    assert all(set(plan["daily_tasks"][0]["activities"][0]) == {"template_id", "duration"} for plan in plans)
+
+
+def test_score_aggregates_replace_history_scans(planning):
+    generator = planning.new_generator()
+    history = [
+        TestResult(f"t{i}", "c1", test_type, {}, score, level, "2024-01-01T00:00:00")
+        for i, (test_type, score, level) in enumerate([
+            ("schulte", 40, "needs_improvement"), ("memory", 55, "average"),
+            ("shape_sort", 80, "good"), ("initial", 60, "average"),
+        ])
+    ]
+    aggregates = {}
+    for result in history:
+        add_test_score(aggregates, result.test_type, result.score, result.performance_level)
+    assert aggregates == aggregate_test_results(history)
+    assert aggregates["attention"]["count"] == 2 and aggregates["cognitive"]["count"] == 2
+    assert aggregates["overall"]["first"] == 40 and aggregates["overall"]["last_level"] == "average"
+    assert average_score(aggregates, "attention") == 60
+    assert average_score(aggregates, "social") is None
+
+    from_history = generator.generate_plan(planning.child, history, language="en")
+    from_summary = generator.generate_plan(planning.child, [], language="en", score_aggregates=aggregates)
+    assert from_summary.focus_areas == from_history.focus_areas == ["attention", "cognitive"]
+    assert from_summary.goals == from_history.goals
+    assert [t.activities for t in from_summary.daily_tasks] == [t.activities for t in from_history.daily_tasks]
+
+    stored = generator.compact_plan(asdict(from_summary))
+    stored["daily_tasks"][1].update(completed=True, test_completed=True, test_result={"score": 70})
+    stats = summarize_plan_progress(stored["daily_tasks"])
+    assert stored["progress_stats"]["tasks_completed"] == 0
+    assert (stats["tasks_total"], stats["tasks_completed"], stats["tests_completed"]) == (7, 1, 1)
+    assert stats["tests_total"] == 4 and stats["scores"]["last"] == 70
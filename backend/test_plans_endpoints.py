@@ -0,0 +1,196 @@
+"""
+测试训练计划API端点（孩子、计划、任务更新、批量生成）
+"""
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import storage
+from auth import UserResponse, get_current_user
+from api import plans as plans_api
+from models import plan_generator as generator_module
+from storage import PlanArchive, SqlitePlanStore, set_plan_store
+
+USER_ID = "u1"
+HEADERS = {"X-Language": "en"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    plan_store = SqlitePlanStore(str(tmp_path))
+    set_plan_store(plan_store)
+    monkeypatch.setattr(storage, "_plan_archive", PlanArchive(str(tmp_path)))
+    yield plan_store
+    set_plan_store(None)
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+    app.include_router(plans_api.router)
+    app.dependency_overrides[get_current_user] = lambda: UserResponse(
+        id=USER_ID, email="a@example.com", name="A", created_at="2024-01-01T00:00:00"
+    )
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _create_plan(client, plan_type="weekly"):
+    child = client.post("/api/plans/children", headers=HEADERS, json={
+        "name": "Kid", "age": 7, "gender": "male", "birth_date": "2017-01-01", "parent_name": "Parent",
+    }).json()["data"]
+    plan = client.post("/api/plans/plans", headers=HEADERS, json={
+        "child_id": child["child_id"], "plan_type": plan_type, "test_results": [],
+    }).json()["data"]
+    return child["child_id"], plan["plan_id"]
+
+
+def test_user_data_returns_rendered_plans(client, store):
+    _, plan_id = _create_plan(client)
+    # 存储中只有模板引用
+    stored = store.get_record("plans", USER_ID, plan_id)
+    assert set(stored["daily_tasks"][0]["activities"][0]) == {"template_id", "duration"}
+
+    plans = client.get("/api/plans/user-data", headers=HEADERS).json()["data"]["plans"]
+    assert [plan["plan_id"] for plan in plans] == [plan_id]
+    for task in plans[0]["daily_tasks"]:
+        assert task["parent_guidance"]
+        for activity in task["activities"]:
+            assert activity["name"] and activity["description"]
+
+
+def _submit_test(client, child_id, score):
+    return client.post("/api/plans/test-results", headers=HEADERS, json={
+        "child_id": child_id, "test_type": "schulte", "test_data": {},
+        "score": score, "performance_level": "good",
+    })
+
+
+def test_submit_test_result_updates_results_and_aggregates(client, store):
+    child_id, _ = _create_plan(client)
+    assert _submit_test(client, child_id, 80).status_code == 200
+    assert _submit_test(client, child_id, 60).status_code == 200
+
+    assert [r["score"] for r in store.get_record("test_results", USER_ID, child_id)] == [80, 60]
+    overall = store.get_record("children", USER_ID, child_id)["score_aggregates"]["overall"]
+    assert (overall["count"], overall["sum"]) == (2, 140)
+
+
+def test_failed_test_submission_saves_neither_result_nor_aggregates(client, store, monkeypatch):
+    child_id, _ = _create_plan(client)
+    child_before = store.get_record("children", USER_ID, child_id)
+    results_before = store.get_record("test_results", USER_ID, child_id)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    # 得分统计更新失败时，结果列表也不能单独落盘
+    monkeypatch.setattr(plans_api, "add_test_score", fail)
+    assert _submit_test(client, child_id, 80).status_code == 500
+
+    assert store.get_record("test_results", USER_ID, child_id) == results_before
+    assert store.get_record("children", USER_ID, child_id) == child_before
+
+
+def test_batch_create_reports_each_item_and_keeps_plan_ids_unique(client, store, monkeypatch):
+    child_id, first_plan_id = _create_plan(client)
+    store.delete_record("plans", USER_ID, first_plan_id)
+    for plan_id in ("plan_fixed", "plan_fixed_0"):
+        store.put_record("plans", USER_ID, plan_id, {"plan_id": plan_id, "child_id": child_id})
+
+    # 进程池由 test_plan_generator 覆盖，这里在当前进程中生成
+    monkeypatch.setattr(generator_module, "PLAN_GENERATION_WORKERS", 0)
+    real_generation = plans_api.run_batch_generation
+
+    async def same_ids(jobs):
+        # 模拟同一秒内生成：所有计划得到相同的ID
+        generated = await real_generation(jobs)
+        for item in generated:
+            item["plan"]["plan_id"] = "plan_fixed"
+        return generated
+
+    monkeypatch.setattr(plans_api, "run_batch_generation", same_ids)
+    response = client.post("/api/plans/plans/batch", headers=HEADERS, json={"items": [
+        {"child_id": child_id, "test_results": []},
+        {"child_id": child_id, "plan_type": "monthly", "test_results": []},
+        {"child_id": "missing", "test_results": []},
+        {"child_id": child_id, "test_results": [{"score": 50}]},
+    ]})
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert (data["succeeded"], data["failed"]) == (2, 2)
+    results = data["results"]
+    # 已有 plan_fixed、plan_fixed_0，本批次第一个计划又占用了 plan_fixed_1
+    assert [r["success"] for r in results] == [True, True, False, False]
+    assert [r.get("plan_id") for r in results[:2]] == ["plan_fixed_1", "plan_fixed_2"]
+    assert "invalid test result" in results[3]["error"]
+    assert set(store.load("plans", USER_ID)) == {"plan_fixed", "plan_fixed_0", "plan_fixed_1", "plan_fixed_2"}
+    assert store.get_record("plans", USER_ID, "plan_fixed") == {"plan_id": "plan_fixed", "child_id": child_id}
+
+
+def _update_task(client, plan_id, day, completed=True, test_result=None):
+    return client.put(f"/api/plans/plans/{plan_id}/tasks/{day}", headers=HEADERS, json={
+        "task_id": f"task_{day}", "completed": completed, "test_result": test_result,
+    })
+
+
+def test_task_updates_keep_progress_stats(client, store):
+    child_id, plan_id = _create_plan(client)
+
+    assert _update_task(client, plan_id, 1).json()["data"]["completed"] is True
+    response = _update_task(client, plan_id, 2, test_result={"score": 80, "performance_level": "good"})
+    assert response.json()["data"]["test_completed"] is True
+    # 重新提交同一天的测试：测试数不变，分数按最新结果重算
+    _update_task(client, plan_id, 2, test_result={"score": 60, "performance_level": "average"})
+    _update_task(client, plan_id, 1, completed=False)
+
+    stats = store.get_record("plans", USER_ID, plan_id)["progress_stats"]
+    assert (stats["tasks_total"], stats["tasks_completed"]) == (7, 1)
+    assert (stats["tests_total"], stats["tests_completed"]) == (4, 1)
+    assert (stats["scores"]["count"], stats["scores"]["sum"]) == (1, 60)
+    # 孩子的得分统计只计入第一次提交
+    overall = store.get_record("children", USER_ID, child_id)["score_aggregates"]["overall"]
+    assert (overall["count"], overall["sum"]) == (1, 80)
+
+
+def test_legacy_plan_is_compacted_on_first_task_update(client, store):
+    _, plan_id = _create_plan(client)
+    # 旧格式计划：保存完整文本，没有进度统计
+    legacy = plans_api._translate_plan_data(store.get_record("plans", USER_ID, plan_id), "en")
+    legacy.pop("progress_stats")
+    legacy["daily_tasks"][2]["completed"] = True
+    store.put_record("plans", USER_ID, plan_id, legacy)
+
+    assert _update_task(client, plan_id, 1).status_code == 200
+
+    stored = store.get_record("plans", USER_ID, plan_id)
+    assert stored["progress_stats"]["tasks_completed"] == 2
+    for task in stored["daily_tasks"]:
+        assert "parent_guidance" not in task
+        for activity in task["activities"]:
+            assert set(activity) == {"template_id", "duration"}
+
+
+def test_plan_status_follows_task_completion(client, store):
+    _, plan_id = _create_plan(client)
+    for day in range(1, 8):
+        _update_task(client, plan_id, day)
+    assert store.get_record("plans", USER_ID, plan_id)["status"] == "completed"
+
+    _update_task(client, plan_id, 3, completed=False)
+    assert store.get_record("plans", USER_ID, plan_id)["status"] == "active"
+
+
+def test_task_update_returns_404_for_missing_plan_or_day(client, store):
+    _, plan_id = _create_plan(client)
+    before = store.get_record("plans", USER_ID, plan_id)
+
+    assert _update_task(client, "missing", 1).status_code == 404
+    assert _update_task(client, plan_id, 99).status_code == 404
+    assert store.get_record("plans", USER_ID, plan_id) == before
@@ -0,0 +1,729 @@
+"""
+测试存储后端（JSON / SQLite）、序列化格式及迁移
+"""
+import asyncio
+import json
+from datetime import date
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage import JsonPlanStore, ShardedJsonPlanStore, SqlitePlanStore, serialization
+from storage.aio import run_io
+from storage.archive import PlanArchive, archive_plans, is_archivable
+from storage.backup import create_backup
+from storage import bulk
+from storage.bulk import aimport_stream, import_records, iter_ndjson, iter_records
+from storage.cache import DocumentCache
+from storage.indexes import PlanIndex, find_task_position
+from storage.journal import JournalStore
+from storage.migrate import migrate, migrate_legacy_json
+
+
+@pytest.fixture(params=["json", "sharded", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        store = JsonPlanStore(str(tmp_path), cache=DocumentCache())
+    elif request.param == "sharded":
+        store = ShardedJsonPlanStore(str(tmp_path), cache=DocumentCache())
+    else:
+        store = SqlitePlanStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def test_records_are_isolated_per_user(store):
+    store.save("children", "u1", {"c1": {"name": "小明"}})
+    store.save("children", "u2", {"c2": {"name": "小红"}})
+
+    assert store.load("children", "u1") == {"c1": {"name": "小明"}}
+    assert store.load("children", "u2") == {"c2": {"name": "小红"}}
+    assert store.load("plans", "u1") == {}
+    assert sorted(store.iter_users("children")) == ["u1", "u2"]
+
+
+def test_put_and_get_record(store):
+    store.put_record("plans", "u1", "p1", {"plan_id": "p1", "daily_tasks": []})
+    store.put_record("plans", "u1", "p2", {"plan_id": "p2", "daily_tasks": []})
+    store.put_record("plans", "u1", "p1", {"plan_id": "p1", "status": "completed"})
+
+    assert store.get_record("plans", "u1", "p1") == {"plan_id": "p1", "status": "completed"}
+    assert store.get_record("plans", "u1", "missing") is None
+    assert set(store.load("plans", "u1")) == {"p1", "p2"}
+
+
+def test_save_replaces_previous_records(store):
+    store.save("test_results", "u1", {"c1": [{"score": 80}], "c2": []})
+    store.save("test_results", "u1", {"c1": [{"score": 90}]})
+
+    assert store.load("test_results", "u1") == {"c1": [{"score": 90}]}
+
+
+def test_unknown_collection_rejected(store):
+    with pytest.raises(ValueError):
+        store.load("sessions", "u1")
+
+
+def test_migrate_json_to_sqlite(tmp_path):
+    source = JsonPlanStore(str(tmp_path), cache=DocumentCache())
+    source.save("children", "u1", {"c1": {"name": "小明"}})
+    source.save("plans", "u1", {"p1": {"child_id": "c1"}})
+    source.save("test_results", "u2", {"c9": [{"score": 55}]})
+
+    target = SqlitePlanStore(str(tmp_path))
+    counts = migrate(source, target)
+
+    assert counts == {"children": 1, "plans": 1, "test_results": 1}
+    assert target.load("plans", "u1") == {"p1": {"child_id": "c1"}}
+    assert target.load("test_results", "u2") == {"c9": [{"score": 55}]}
+    target.close()
+
+
+def test_legacy_json_is_migrated_into_empty_store_only(tmp_path):
+    source = JsonPlanStore(str(tmp_path), cache=DocumentCache())
+    source.save("plans", "u1", {"p1": {"child_id": "c1"}})
+    source.close()
+
+    target = SqlitePlanStore(str(tmp_path))
+    assert migrate_legacy_json(target, str(tmp_path)) == {"children": 0, "plans": 1, "test_results": 0}
+    assert target.load("plans", "u1") == {"p1": {"child_id": "c1"}}
+
+    # Once the store has data the legacy files are left alone
+    target.delete_record("plans", "u1", "p1")
+    target.put_record("children", "u2", "c2", {"name": "小红"})
+    assert migrate_legacy_json(target, str(tmp_path)) is None
+    assert target.load("plans", "u1") == {}
+    target.close()
+
+
+def test_sharded_store_writes_only_callers_shard(tmp_path):
+    source = JsonPlanStore(str(tmp_path), cache=DocumentCache())
+    source.save("plans", "u1", {"p1": {"child_id": "c1"}})
+    source.save("plans", "u2", {"p2": {"child_id": "c2"}})
+
+    target = ShardedJsonPlanStore(str(tmp_path), cache=DocumentCache())
+    migrate(source, target)
+    target.close()
+
+    u1_plans = tmp_path / "users" / "u1" / "plans.json"
+    u2_plans = tmp_path / "users" / "u2" / "plans.json"
+    u2_mtime = u2_plans.stat().st_mtime_ns
+
+    target.put_record("plans", "u1", "p3", {"child_id": "c1"})
+    target.close()
+
+    assert set(json.loads(u1_plans.read_text(encoding="utf-8"))) == {"p1", "p3"}
+    assert u2_plans.stat().st_mtime_ns == u2_mtime
+    with pytest.raises(ValueError):
+        target.load("plans", "../u2")
+
+
+def test_cache_defers_writes_until_flush(tmp_path):
+    cache = DocumentCache(flush_interval=60, max_dirty=1000)
+    path = str(tmp_path / "users.json")
+
+    with cache.edit(path) as users:
+        users["u1"] = {"email": "a@example.com"}
+
+    assert cache.read(path) == {"u1": {"email": "a@example.com"}}
+    assert not os.path.exists(path)
+
+    cache.flush()
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"u1": {"email": "a@example.com"}}
+    assert not cache.is_dirty(path)
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".")] == []
+    cache.close()
+
+
+def test_cache_flushes_on_dirty_threshold(tmp_path):
+    cache = DocumentCache(flush_interval=60, max_dirty=3)
+    path = str(tmp_path / "sessions.json")
+
+    for i in range(3):
+        with cache.edit(path) as sessions:
+            sessions[f"token{i}"] = {"user_id": "u1"}
+
+    deadline = time.time() + 5
+    while cache.is_dirty(path) and time.time() < deadline:
+        time.sleep(0.01)
+
+    with open(path, encoding="utf-8") as f:
+        assert len(json.load(f)) == 3
+    cache.close()
+
+
+def _apply_counter(state, record):
+    state[record["key"]] = state.get(record["key"], 0) + record["amount"]
+
+
+def _journal(tmp_path, **kwargs):
+    return JournalStore(
+        str(tmp_path / "state.snapshot.json"),
+        str(tmp_path / "state.journal.ndjson"),
+        _apply_counter,
+        **kwargs,
+    )
+
+
+def test_journal_replays_snapshot_and_tail(tmp_path):
+    journal = _journal(tmp_path, compact_every=1000)
+    journal.append({"key": "a", "amount": 1})
+    journal.compact()
+    journal.append({"key": "a", "amount": 2}, {"key": "b", "amount": 5})
+    # Simulate a crash: no close(), so the last two records only live in the journal
+    journal._journal_file.flush()
+
+    recovered = _journal(tmp_path)
+    assert recovered.state == {"a": 3, "b": 5}
+    recovered.close()
+
+
+def test_journal_discards_torn_tail(tmp_path):
+    journal = _journal(tmp_path)
+    journal.append({"key": "a", "amount": 1})
+    journal._journal_file.write(b'{"key": "a", "amo')
+    journal._journal_file.flush()
+
+    recovered = _journal(tmp_path)
+    assert recovered.state == {"a": 1}
+    recovered.append({"key": "a", "amount": 1})
+    recovered.close()
+
+    assert _journal(tmp_path).state == {"a": 2}
+
+
+def test_journal_keeps_records_after_a_corrupt_line(tmp_path):
+    journal = _journal(tmp_path)
+    journal.append({"key": "a", "amount": 1})
+    # A bad line followed by records another worker appended after it
+    journal._journal_file.write(b'{"key": "a", "amo\n')
+    journal._journal_file.write(b'{"key": "a", "amount": 4, "seq": 2}\n')
+    journal._journal_file.flush()
+
+    assert _journal(tmp_path).state == {"a": 5}
+
+
+def test_journal_append_is_all_or_nothing(tmp_path):
+    journal = _journal(tmp_path)
+    journal.append({"key": "a", "amount": 1})
+    with pytest.raises(TypeError):
+        journal.append({"key": "a", "amount": 2}, {"key": "a", "amount": "bad"})
+    assert journal.state == {"a": 1}
+
+    journal.append({"key": "a", "amount": 3})
+    journal.close()
+    assert _journal(tmp_path).state == {"a": 4}
+
+
+def test_journal_compaction_drops_covered_records(tmp_path):
+    journal = _journal(tmp_path, compact_every=1000)
+    for _ in range(10):
+        journal.append({"key": "a", "amount": 1})
+    journal.compact()
+
+    assert (tmp_path / "state.journal.ndjson").read_bytes() == b""
+    snapshot = json.loads((tmp_path / "state.snapshot.json").read_text(encoding="utf-8"))
+    assert snapshot == {"seq": 10, "data": {"a": 10}}
+    journal.close()
+
+
+def test_serialization_round_trip_keeps_unicode():
+    document = {"u1": {"name": "小明", "scores": [1, 2.5, None], "done": True}}
+    payload = serialization.dumps(document, "json")
+    assert b"\n" not in payload
+    assert serialization.loads(payload) == document
+    assert serialization.loads(serialization.dumps(document, "pretty")) == document
+
+
+def test_legacy_pretty_json_is_converted_on_next_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(serialization, "STORAGE_FORMAT", "json")
+    legacy = {"u1": {"c1": {"name": "小明"}}}
+    path = tmp_path / "user_children.json"
+    path.write_bytes(b"\xef\xbb\xbf" + json.dumps(legacy, indent=2, ensure_ascii=False).encode("utf-8"))
+
+    store = JsonPlanStore(str(tmp_path), cache=DocumentCache())
+    assert store.load("children", "u1") == legacy["u1"]
+    store.put_record("children", "u2", "c2", {"name": "小红"})
+    store.close()
+
+    assert path.read_bytes() == serialization.dumps_json({**legacy, "u2": {"c2": {"name": "小红"}}})
+
+
+def test_msgpack_documents_are_detected(tmp_path, monkeypatch):
+    pytest.importorskip("msgpack")
+    monkeypatch.setattr(serialization, "STORAGE_FORMAT", "msgpack")
+    store = ShardedJsonPlanStore(str(tmp_path), cache=DocumentCache())
+    store.put_record("plans", "u1", "p1", {"title": "周计划", "days": 7})
+    store.close()
+
+    payload = (tmp_path / "users" / "u1" / "plans.json").read_bytes()
+    assert serialization.detect_format(payload) == "msgpack"
+
+    monkeypatch.setattr(serialization, "STORAGE_FORMAT", "json")
+    reopened = ShardedJsonPlanStore(str(tmp_path), cache=DocumentCache())
+    assert reopened.get_record("plans", "u1", "p1") == {"title": "周计划", "days": 7}
+    reopened.close()
+
+
+def test_async_store_methods_round_trip(store):
+    async def scenario():
+        await store.aput_record("plans", "u1", "p1", {"title": "周计划"})
+        assert await store.aget_record("plans", "u1", "p1") == {"title": "周计划"}
+        await store.asave("children", "u1", {"c1": {"name": "小明"}})
+        return await store.aload("children", "u1")
+
+    assert asyncio.run(scenario()) == {"c1": {"name": "小明"}}
+
+
+def test_run_io_does_not_block_event_loop():
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        await run_io(time.sleep, 0.2)
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+
+
+def test_load_child_plans_follows_mutations(store):
+    store.put_record("plans", "u1", "p1", {"child_id": "c1", "daily_tasks": []})
+    store.put_record("plans", "u1", "p2", {"child_id": "c2", "daily_tasks": []})
+    store.put_record("plans", "u2", "p3", {"child_id": "c1", "daily_tasks": []})
+    assert set(store.load_child_plans("u1", "c1")) == {"p1"}
+
+    store.put_record("plans", "u1", "p3", {"child_id": "c1", "daily_tasks": []})
+    store.put_record("plans", "u1", "p2", {"child_id": "c1", "daily_tasks": []})
+    assert set(store.load_child_plans("u1", "c1")) == {"p1", "p2", "p3"}
+
+    store.save("plans", "u1", {"p4": {"child_id": "c1", "daily_tasks": []}})
+    assert set(store.load_child_plans("u1", "c1")) == {"p4"}
+    assert store.load_child_plans("u1", "c2") == {}
+
+
+def test_plan_index_lookups():
+    index = PlanIndex()
+    plan = {"child_id": "c1", "daily_tasks": [{"day": 1}, {"day": 2}, {"day": 2}]}
+    index.add_child("u1", "c1", 0)
+    index.add_plan("u1", "p1", plan, 0)
+    index.add_plan("u1", "p1", {"child_id": "c9", "daily_tasks": []}, 1)
+
+    assert index.plans_for_child("u1", "c1") == ["p1"]
+    assert index.plan_position("u1", "p1") == 0
+    assert index.task_positions("u1", "p1", 2) == [1, 2]
+    assert index.child_position("u1", "c1") == 0
+    assert index.plan_position("u2", "p1") is None
+
+    index.drop_user("u1")
+    assert index.plans_for_child("u1", "c1") == []
+
+
+def test_find_task_position():
+    tasks = [{"day": day} for day in range(1, 31)]
+    assert find_task_position(tasks, 17) == 16
+    assert find_task_position(tasks, 31) is None
+    assert find_task_position([{"day": 3}, {"day": 1}], 1) == 1
+
+
+def test_journal_on_load_sees_every_reload(tmp_path):
+    loads = []
+    journal = _journal(tmp_path, on_load=lambda state: loads.append(dict(state)))
+    journal.append({"key": "a", "amount": 1})
+    journal.reset({"b": 2})
+    assert loads == [{}, {"b": 2}]
+    journal.close()
+
+
+@pytest.fixture
+def user_data_module(tmp_path, monkeypatch):
+    import user_data
+
+    journal = JournalStore(
+        str(tmp_path / "user_data.snapshot.json"),
+        str(tmp_path / "user_data.journal.ndjson"),
+        user_data._apply_record,
+        on_load=user_data._rebuild_index,
+    )
+    monkeypatch.setattr(user_data, "user_data_journal", journal)
+    yield user_data
+    journal.close()
+
+
+def test_get_user_data_does_not_write(user_data_module, tmp_path):
+    assert user_data_module.get_user_data("new_user")["children"] == []
+    assert "new_user" not in user_data_module.load_user_data()
+    assert (tmp_path / "user_data.journal.ndjson").read_bytes() == b""
+
+
+def test_unit_of_work_commits_once(user_data_module, tmp_path):
+    appended = []
+    journal = user_data_module.user_data_journal
+    original_append = journal.append
+    journal.append = lambda *records: (appended.append(len(records)), original_append(*records))
+
+    with user_data_module.unit_of_work("u1"):
+        child_id = user_data_module.add_child("u1", "小明", 6, "male", {})
+        user_data_module.add_test_result("u1", child_id, "schulte", {"score": 80})
+        user_data_module.create_training_plan(
+            "u1", child_id, "plan", "2024-01-01", "2024-01-07", [{"day": 1}]
+        )
+        # Earlier mutations are visible inside the unit of work, not outside it yet
+        assert [child["id"] for child in user_data_module.get_children("u1")] == [child_id]
+        assert user_data_module.get_child("u1", child_id)["name"] == "小明"
+        assert user_data_module.load_user_data() == {}
+        plan = user_data_module.get_training_plans("u1", child_id)[0]
+        user_data_module.update_daily_task("u1", plan["id"], 1, "completed")
+
+    assert appended == [4]
+    assert user_data_module.get_training_plan("u1", plan["id"])["completed_days"] == [1]
+
+
+def test_getters_return_copies_outside_unit_of_work(user_data_module):
+    child_id = user_data_module.add_child("u1", "小明", 6, "male", {})
+    plan_id = user_data_module.create_training_plan(
+        "u1", child_id, "plan", "2024-01-01", "2024-01-07", [{"day": 1}]
+    )
+
+    user_data_module.get_user_data("u1")["children"].clear()
+    user_data_module.get_child("u1", child_id)["name"] = "changed"
+    user_data_module.get_training_plans("u1")[0]["daily_tasks"].clear()
+    plan = user_data_module.get_training_plan("u1", plan_id)
+    user_data_module.update_daily_task("u1", plan_id, 1, "completed")
+
+    # Neither caller mutations nor later appends show through what was returned
+    assert plan["completed_days"] == []
+    assert user_data_module.get_child("u1", child_id)["name"] == "小明"
+    tasks = user_data_module.get_training_plan("u1", plan_id)["daily_tasks"]
+    assert [(task["day"], task["status"]) for task in tasks] == [(1, "completed")]
+
+
+def test_unit_of_work_discards_on_error(user_data_module):
+    with pytest.raises(RuntimeError):
+        with user_data_module.unit_of_work("u1"):
+            user_data_module.add_child("u1", "小明", 6, "male", {})
+            raise RuntimeError("boom")
+
+    assert user_data_module.get_children("u1") == []
+    with pytest.raises(Exception, match="Training plan not found"):
+        user_data_module.update_daily_task("u1", "missing", 1, "completed")
+
+
+def test_update_record_patches_one_record(store):
+    store.put_record("plans", "u1", "p1", {"child_id": "c1", "daily_tasks": [{"day": 1}]})
+    store.put_record("plans", "u1", "p2", {"child_id": "c1", "daily_tasks": []})
+
+    def complete(plan):
+        plan["daily_tasks"][0]["completed"] = True
+        return "done"
+
+    assert store.update_record("plans", "u1", "p1", complete) == "done"
+    assert store.get_record("plans", "u1", "p1")["daily_tasks"] == [{"day": 1, "completed": True}]
+    assert store.get_record("plans", "u1", "p2") == {"child_id": "c1", "daily_tasks": []}
+    with pytest.raises(KeyError):
+        store.update_record("plans", "u1", "missing", complete)
+
+
+def test_failed_update_record_leaves_record_untouched(store):
+    store.put_record("plans", "u1", "p1", {"child_id": "c1", "daily_tasks": [{"day": 1}]})
+
+    def fail_halfway(plan):
+        plan["daily_tasks"][0]["completed"] = True
+        raise IndexError(2)
+
+    with pytest.raises(IndexError):
+        store.update_record("plans", "u1", "p1", fail_halfway)
+    assert store.get_record("plans", "u1", "p1") == {"child_id": "c1", "daily_tasks": [{"day": 1}]}
+
+def test_update_record_starts_missing_records_from_default(store):
+    store.update_record("test_results", "u1", "c1", lambda results: results.append({"score": 1}), default=[])
+    store.update_record("test_results", "u1", "c1", lambda results: results.append({"score": 2}), default=[])
+    assert store.get_record("test_results", "u1", "c1") == [{"score": 1}, {"score": 2}]
+
+
+
+def test_update_records_saves_all_or_nothing(store):
+    store.put_record("children", "u1", "c1", {"name": "a"})
+
+    def fail(child):
+        child["name"] = "b"
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        store.update_records([
+            ("test_results", "u1", "c1", lambda results: results.append({"score": 1}), []),
+            ("children", "u1", "c1", fail, None),
+        ])
+    with pytest.raises(KeyError):
+        store.update_records([
+            ("test_results", "u1", "c1", lambda results: results.append({"score": 1}), []),
+            ("children", "u1", "missing", lambda child: None, None),
+        ])
+    assert store.get_record("test_results", "u1", "c1") is None
+    assert store.get_record("children", "u1", "c1") == {"name": "a"}
+
+    results = store.update_records([
+        ("test_results", "u1", "c1", lambda results: results.append({"score": 1}) or len(results), []),
+        ("children", "u1", "c1", lambda child: child.update(count=1), None),
+        ("test_results", "u1", "c1", lambda results: results.append({"score": 2}) or len(results), []),
+    ])
+    assert results == [1, None, 2]
+    assert store.get_record("test_results", "u1", "c1") == [{"score": 1}, {"score": 2}]
+    assert store.get_record("children", "u1", "c1") == {"name": "a", "count": 1}
+    today = date(2024, 3, 1)
+    assert is_archivable({"end_date": "2024-02-20", "status": "completed"}, today, grace_days=30)
+    assert not is_archivable({"end_date": "2024-02-20", "status": "active"}, today, grace_days=30)
+    assert is_archivable({"end_date": "2024-01-01", "status": "active"}, today, grace_days=30)
+    assert not is_archivable({"end_date": "2024-03-01", "status": "completed"}, today, grace_days=30)
+    assert not is_archivable({"status": "completed"}, today, grace_days=30)
+
+
+def test_archive_moves_cold_plans_out_of_hot_store(store, tmp_path):
+    store.put_record("plans", "u1", "old", {"child_id": "c1", "end_date": "2024-01-07", "status": "completed"})
+    store.put_record("plans", "u1", "live", {"child_id": "c1", "end_date": "2024-03-07", "status": "active"})
+    store.load_child_plans("u1", "c1")
+    archive = PlanArchive(str(tmp_path))
+
+    counts = archive_plans(store, archive, today=date(2024, 3, 1))
+
+    assert counts == {"users": 1, "plans": 1}
+    assert set(store.load("plans", "u1")) == {"live"}
+    assert set(store.load_child_plans("u1", "c1")) == {"live"}
+    assert archive.get("u1", "old")["status"] == "completed"
+    assert list(archive.iter_users()) == ["u1"]
+    # Running again is a no-op and keeps what was archived
+    assert archive_plans(store, archive, today=date(2024, 3, 1))["plans"] == 0
+    assert set(archive.load("u1")) == {"old"}
+
+
+def test_archive_keeps_updates_made_while_it_runs(store, tmp_path):
+    store.put_record("plans", "u1", "old", {"child_id": "c1", "end_date": "2024-01-07", "status": "completed", "n": 0})
+    archive = PlanArchive(str(tmp_path))
+    started = threading.Event()
+    last = []
+
+    def bump(plan):
+        plan["n"] += 1
+        return plan["n"]
+
+    def writer():
+        while True:
+            try:
+                last.append(store.update_record("plans", "u1", "old", bump))
+            except KeyError:
+                return
+            started.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    started.wait()
+    counts = archive_plans(store, archive, today=date(2024, 3, 1))
+    thread.join()
+
+    assert counts["plans"] == 1
+    assert store.get_record("plans", "u1", "old") is None
+    # The archived copy is the last version written, not the one seen before the delete
+    assert archive.get("u1", "old")["n"] == last[-1]
+
+
+def test_archive_failure_leaves_plans_in_place(store, tmp_path):
+    store.put_record("plans", "u1", "old", {"child_id": "c1", "end_date": "2024-01-07", "status": "completed"})
+
+    class BrokenArchive(PlanArchive):
+        def add(self, user_id, plans):
+            raise OSError("disk full")
+
+    assert archive_plans(store, BrokenArchive(str(tmp_path)), today=date(2024, 3, 1))["plans"] == 0
+    assert set(store.load("plans", "u1")) == {"old"}
+
+
+def _reopen(store, data_dir):
+    if isinstance(store, SqlitePlanStore):
+        return SqlitePlanStore(data_dir)
+    return type(store)(data_dir, cache=DocumentCache())
+
+
+def test_backup_is_consistent_and_restorable(tmp_path):
+    data_dir = str(tmp_path / "data")
+    stores = [
+        ShardedJsonPlanStore(data_dir, cache=DocumentCache(flush_interval=3600)),
+        SqlitePlanStore(data_dir),
+    ]
+    for store in stores:
+        store.put_record("plans", "u1", "p1", {"child_id": "c1", "status": "active"})
+    journal = JournalStore(
+        os.path.join(data_dir, "state.snapshot.json"),
+        os.path.join(data_dir, "state.journal.ndjson"),
+        _apply_counter, compact_every=2,
+    )
+    for _ in range(3):
+        journal.append({"key": "a", "amount": 1})
+
+    # The sharded store's write is still only in its cache
+    result = create_backup(data_dir, str(tmp_path / "backups"), cache=stores[0].cache)
+    assert not any(name.endswith(".lock") for name in os.listdir(result["path"]))
+
+    for store in stores:
+        restored = _reopen(store, result["path"])
+        assert restored.get_record("plans", "u1", "p1") == {"child_id": "c1", "status": "active"}
+        restored.close()
+        store.close()
+    restored_journal = JournalStore(
+        os.path.join(result["path"], "state.snapshot.json"),
+        os.path.join(result["path"], "state.journal.ndjson"),
+        _apply_counter,
+    )
+    assert restored_journal.state == {"a": 3}
+
+
+def test_backup_is_a_point_in_time_copy_while_writers_run(tmp_path):
+    data_dir = str(tmp_path / "data")
+    sharded = ShardedJsonPlanStore(data_dir, cache=DocumentCache(flush_interval=0.001, max_dirty=1))
+    sqlite_store = SqlitePlanStore(data_dir)
+    journal = JournalStore(
+        os.path.join(data_dir, "state.snapshot.json"),
+        os.path.join(data_dir, "state.journal.ndjson"),
+        _apply_counter, compact_every=5,
+    )
+    stop = threading.Event()
+
+    def write():
+        # Each iteration changes two shards, the database and the journal together
+        i = 0
+        while not stop.is_set():
+            i += 1
+            with journal.locked(), sharded.cache.locked():
+                sharded.put_record("plans", "u1", "p1", {"n": i})
+                sharded.put_record("plans", "u2", "p2", {"n": i})
+                sqlite_store.put_record("plans", "u1", "p1", {"n": i})
+                journal.append({"key": "n", "amount": 1})
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        results = []
+        for _ in range(10):
+            time.sleep(0.01)
+            results.append(create_backup(
+                data_dir, str(tmp_path / "backups"), cache=sharded.cache, journals=[journal]
+            ))
+    finally:
+        stop.set()
+        writer.join()
+
+    for result in results:
+        restored_sharded = ShardedJsonPlanStore(result["path"], cache=DocumentCache())
+        restored_sqlite = SqlitePlanStore(result["path"])
+        restored_journal = JournalStore(
+            os.path.join(result["path"], "state.snapshot.json"),
+            os.path.join(result["path"], "state.journal.ndjson"),
+            _apply_counter,
+        )
+        n = restored_sharded.get_record("plans", "u1", "p1")["n"]
+        assert n > 0
+        assert restored_sharded.get_record("plans", "u2", "p2")["n"] == n
+        assert restored_sqlite.get_record("plans", "u1", "p1")["n"] == n
+        assert restored_journal.state == {"n": n}
+        restored_sqlite.close()
+    assert not any(name.startswith(".backup-") for name in os.listdir(data_dir))
+    sharded.close()
+    sqlite_store.close()
+
+
+def test_incremental_backup_copies_changed_shards_only(tmp_path):
+    data_dir = str(tmp_path / "data")
+    store = ShardedJsonPlanStore(data_dir, cache=DocumentCache(flush_interval=3600))
+    for user_id in ("u1", "u2", "u3"):
+        store.put_record("plans", user_id, "p1", {"child_id": "c1"})
+    store.cache.flush()
+    first = create_backup(data_dir, str(tmp_path / "backups"))
+
+    store.put_record("plans", "u2", "p2", {"child_id": "c1"})
+    store.cache.flush()
+    second = create_backup(data_dir, str(tmp_path / "backups"))
+
+    assert (first["copied"], first["linked"]) == (3, 0)
+    assert (second["copied"], second["linked"]) == (1, 2)
+    linked = os.path.join("users", "u1", "plans.json")
+    assert os.path.samefile(os.path.join(first["path"], linked), os.path.join(second["path"], linked))
+    assert set(_reopen(store, second["path"]).load("plans", "u2")) == {"p1", "p2"}
+    store.close()
+
+
+def test_bulk_export_import_round_trip(store, tmp_path):
+    store.put_record("children", "u1", "c1", {"name": "小明"})
+    store.put_record("test_results", "u1", "c1", [{"test_id": "t1", "score": 80}])
+    store.put_record("plans", "u1", "p1", {"child_id": "c1", "daily_tasks": []})
+    store.put_record("plans", "u2", "p1", {"child_id": "c9", "daily_tasks": []})
+    lines = list(iter_ndjson(iter_records(store)))
+    assert len(lines) == 4
+
+    target = SqlitePlanStore(str(tmp_path / "target"))
+    counts = import_records(target, lines, batch_size=3)
+    assert counts == {"children": 1, "test_results": 1, "plans": 2, "batches": 2}
+    # Importing again replaces by id and skips known test results
+    assert import_records(target, lines)["test_results"] == 0
+    for collection in ("children", "test_results", "plans"):
+        for user_id in ("u1", "u2"):
+            assert target.load(collection, user_id) == store.load(collection, user_id)
+    target.close()
+
+
+def test_bulk_import_keeps_test_results_submitted_meanwhile(store):
+    submitted = 200
+
+    def submit():
+        for i in range(submitted):
+            store.update_record(
+                "test_results", "u1", "c1", lambda results: results.append({"test_id": f"s{i}"}), default=[]
+            )
+
+    thread = threading.Thread(target=submit)
+    thread.start()
+    lines = [
+        json.dumps({"type": "test_result", "user_id": "u1", "child_id": "c1", "data": {"test_id": f"i{i}"}})
+        for i in range(submitted)
+    ]
+    assert import_records(store, lines, batch_size=1)["test_results"] == submitted
+    thread.join()
+
+    test_ids = {result["test_id"] for result in store.get_record("test_results", "u1", "c1")}
+    assert test_ids == {f"s{i}" for i in range(submitted)} | {f"i{i}" for i in range(submitted)}
+
+
+def test_streamed_import_rejects_overlong_lines(store, monkeypatch):
+    monkeypatch.setattr(bulk, "MAX_LINE_BYTES", 64)
+    line = json.dumps({"type": "plan", "user_id": "u1", "id": "p1", "data": {}}).encode()
+
+    async def chunks(*parts):
+        for part in parts:
+            yield part
+
+    # A body that never sends a newline is rejected before it is all buffered
+    with pytest.raises(ValueError, match="line 2: longer than 64 bytes"):
+        asyncio.run(aimport_stream(store, chunks(line + b"\n", *[b"x" * 40] * 100)))
+    with pytest.raises(ValueError, match="line 1: longer than 64 bytes"):
+        asyncio.run(aimport_stream(store, chunks(b"x" * 100 + b"\n")))
+    assert asyncio.run(aimport_stream(store, chunks(line[:20], line[20:] + b"\n")))["plans"] == 1
+
+
+def test_bulk_import_rejects_bad_lines_and_can_pin_user(store):
+    line = json.dumps({"type": "plan", "user_id": "other", "id": "p1", "data": {"child_id": "c1"}})
+    assert import_records(store, [line, "", line], user_id="u1")["plans"] == 2
+    assert store.load("plans", "other") == {}
+    assert store.get_record("plans", "u1", "p1") == {"child_id": "c1"}
+
+    with pytest.raises(ValueError, match="line 2"):
+        import_records(store, [line, '{"type": "nope"}'])
@@ -2,18 +2,28 @@
 User Data Management System
 Manages children information and training progress for each user
 """
+import copy
 import os
-import json
 import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 from pydantic import BaseModel
 
+from storage.indexes import PlanIndex
+from storage.journal import JournalStore, register_journal
+
 logger = logging.getLogger(__name__)
 
 # Data storage paths
 DATA_DIR = "data"
 USER_DATA_FILE = os.path.join(DATA_DIR, "user_data.json")
+USER_DATA_SNAPSHOT_FILE = os.path.join(DATA_DIR, "user_data.snapshot.json")
+USER_DATA_JOURNAL_FILE = os.path.join(DATA_DIR, "user_data.journal.ndjson")
+
+# Create data directory if it doesn't exist
+os.makedirs(DATA_DIR, exist_ok=True)
 
 # ==================== Data Models ====================
 
@@ -50,56 +60,212 @@ class UserData(BaseModel):
     last_updated: str
 
 # ==================== Storage Functions ====================
+# user_data.snapshot.json holds a periodic snapshot and user_data.journal.ndjson
+# the mutations made since; the legacy user_data.json seeds the first snapshot.
+
+def _new_user(user_id: str, timestamp: str) -> Dict:
+    return {
+        'user_id': user_id,
+        'children': [],
+        'test_results': [],
+        'training_plans': [],
+        'last_updated': timestamp
+    }
+
+def _apply_record(all_data: Dict, record: Dict, index: Optional[PlanIndex] = None):
+    """Apply one journal record to the in-memory data and its indexes"""
+    index = user_data_index if index is None else index
+    op = record['op']
+    user_id = record['user_id']
+    timestamp = record['ts']
+    
+    if op == 'set_user':
+        all_data[user_id] = record['data']
+        _index_user(user_id, record['data'], index)
+    else:
+        user = all_data.setdefault(user_id, _new_user(user_id, timestamp))
+        if op == 'add_child':
+            user['children'].append(record['child'])
+            index.add_child(user_id, record['child']['id'], len(user['children']) - 1)
+        elif op == 'add_test_result':
+            user['test_results'].append(record['test_result'])
+        elif op == 'create_training_plan':
+            user['training_plans'].append(record['plan'])
+            index.add_plan(
+                user_id, record['plan']['id'], record['plan'], len(user['training_plans']) - 1
+            )
+        elif op == 'update_daily_task':
+            _apply_task_update(user, record, index)
+        elif op != 'init_user':
+            raise ValueError(f"Unknown journal operation: {op}")
+    
+    all_data[user_id]['last_updated'] = timestamp
+
+def _apply_task_update(user: Dict, record: Dict, index: PlanIndex):
+    plan = _find_plan(record['user_id'], user, record['plan_id'], index)
+    if plan is None:
+        raise Exception("Training plan not found")
+    
+    day = record['day']
+    positions = index.task_positions(record['user_id'], record['plan_id'], day)
+    if positions:
+        task = plan['daily_tasks'][positions[0]]
+        task['status'] = record['status']
+        if record.get('notes'):
+            task['notes'] = record['notes']
+        if 'completed_at' not in task:
+            task['completed_at'] = record['ts']
+    
+    if day not in plan['completed_days']:
+        plan['completed_days'].append(day)
+
+# ==================== Indexes ====================
+# child_id -> position, child_id -> plan ids, plan_id -> position and
+# (plan_id, day) -> task positions for every user; rebuilt whenever the journal
+# (re)loads its state and kept current by _apply_record.
+
+user_data_index = PlanIndex()
+
+def _index_user(user_id: str, user: Dict, index: Optional[PlanIndex] = None):
+    index = user_data_index if index is None else index
+    index.drop_user(user_id)
+    for position, child in enumerate(user.get('children', [])):
+        index.add_child(user_id, child['id'], position)
+    for position, plan in enumerate(user.get('training_plans', [])):
+        index.add_plan(user_id, plan['id'], plan, position)
+
+def _rebuild_index(all_data: Dict):
+    user_data_index.clear()
+    for user_id, user in all_data.items():
+        _index_user(user_id, user)
+
+def _find_plan(user_id: str, user: Dict, plan_id: str, index: Optional[PlanIndex] = None) -> Optional[Dict]:
+    index = _index_for(user_id) if index is None else index
+    position = index.plan_position(user_id, plan_id)
+    return user['training_plans'][position] if position is not None else None
+
+def _index_for(user_id: str) -> PlanIndex:
+    """The index matching get_user_data(user_id): the unit of work's copy while one is active"""
+    active = getattr(_active_work, 'uow', None)
+    if active is not None and active.user_id == user_id:
+        return active.index
+    return user_data_index
+
+user_data_journal = register_journal(JournalStore(
+    snapshot_path=USER_DATA_SNAPSHOT_FILE,
+    journal_path=USER_DATA_JOURNAL_FILE,
+    apply=_apply_record,
+    legacy_path=USER_DATA_FILE,
+    on_load=_rebuild_index
+))
+
+def _record(op: str, user_id: str, **fields) -> Dict:
+    return {'op': op, 'user_id': user_id, 'ts': datetime.now().isoformat(), **fields}
 
 def load_user_data() -> Dict:
-    """Load all user data from file"""
-    if os.path.exists(USER_DATA_FILE):
-        try:
-            with open(USER_DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading user data: {e}")
-            return {}
-    return {}
+    """Load all user data (in memory, rebuilt from snapshot + journal)"""
+    return user_data_journal.state
 
 def save_user_data(data: Dict):
-    """Save all user data to file"""
-    try:
-        with open(USER_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.error(f"Error saving user data: {e}")
-        raise Exception("Failed to save user data")
+    """Replace all user data with a new snapshot"""
+    user_data_journal.reset(data)
+
+def _read_user(user_id: str, read: Callable[[Dict, PlanIndex], Any]) -> Any:
+    """Run read() on a user's data and the matching index
+    
+    Inside a unit of work for that user it sees the working copy and its result
+    is returned as is. Everywhere else it runs under the journal lock and the
+    result is a deep copy, so callers neither see later appends nor change the
+    shared state by mutating what they got back.
+    """
+    active = getattr(_active_work, 'uow', None)
+    if active is not None and active.user_id == user_id:
+        return read(active.user, active.index)
+    with user_data_journal.locked():
+        user_data = load_user_data().get(user_id)
+        if user_data is None:
+            return read(_new_user(user_id, datetime.now().isoformat()), user_data_index)
+        return copy.deepcopy(read(user_data, user_data_index))
 
 def get_user_data(user_id: str) -> Dict:
-    """Get data for a specific user"""
-    all_data = load_user_data()
-    if user_id not in all_data:
-        # Initialize with empty data
-        all_data[user_id] = {
-            'user_id': user_id,
-            'children': [],
-            'test_results': [],
-            'training_plans': [],
-            'last_updated': datetime.now().isoformat()
-        }
-        save_user_data(all_data)
+    """Get data for a specific user (an empty, unsaved record for new users)
     
-    return all_data[user_id]
+    Inside a unit of work for that user this is the working copy, so mutations
+    recorded earlier in the unit are visible before it commits; outside one it
+    is a copy.
+    """
+    return _read_user(user_id, lambda user, index: user)
 
 def update_user_data(user_id: str, data: Dict):
     """Update data for a specific user"""
-    all_data = load_user_data()
-    all_data[user_id] = data
-    all_data[user_id]['last_updated'] = datetime.now().isoformat()
-    save_user_data(all_data)
+    with unit_of_work(user_id) as uow:
+        uow.record('set_user', data=data)
+
+# ==================== Unit of Work ====================
+
+class UnitOfWork:
+    """Queues one user's mutations as journal records and commits them in one append
+    
+    Each record is applied to a private copy of the user (and a private index)
+    as soon as it is recorded, so later steps of the same unit read their own
+    writes; the shared state only changes when the batch is committed.
+    """
+    
+    def __init__(self, user_id: str, journal: JournalStore):
+        self.user_id = user_id
+        self.journal = journal
+        self.user = load_user_data().get(user_id) or _new_user(user_id, datetime.now().isoformat())
+        self.index = user_data_index
+        self.records: List[Dict] = []
+        self._working: Optional[Dict] = None
+    
+    def record(self, op: str, **fields):
+        """Apply a mutation to the working copy and queue it for the commit"""
+        if self._working is None:
+            # Copy on first write; reads before that use the live user
+            self._working = {self.user_id: copy.deepcopy(self.user)}
+            self.index = PlanIndex()
+            _index_user(self.user_id, self._working[self.user_id], self.index)
+        record = _record(op, self.user_id, **fields)
+        _apply_record(self._working, record, self.index)
+        self.user = self._working[self.user_id]
+        self.records.append(record)
+    
+    def commit(self):
+        if self.records:
+            records, self.records = self.records, []
+            self.journal.append(*records)
+
+_active_work = threading.local()
+
+@contextmanager
+def unit_of_work(user_id: str) -> Iterator[UnitOfWork]:
+    """Load the user's data once, batch mutations and commit them when the block exits
+    
+    Nested calls for the same user join the outer unit of work, so a request
+    that calls several mutating functions still commits exactly once. Nothing
+    is written if the block raises.
+    """
+    active = getattr(_active_work, 'uow', None)
+    if active is not None:
+        if active.user_id != user_id:
+            raise ValueError(f"Unit of work for {active.user_id} is already active")
+        yield active
+        return
+    
+    with user_data_journal.locked():
+        uow = UnitOfWork(user_id, user_data_journal)
+        _active_work.uow = uow
+        try:
+            yield uow
+            uow.commit()
+        finally:
+            _active_work.uow = None
 
 # ==================== Child Management Functions ====================
 
 def add_child(user_id: str, name: str, age: int, gender: str, birth_date: Dict) -> str:
     """Add a child to user's profile"""
-    user_data = get_user_data(user_id)
-    
     child = Child(
         id=f"child_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
         name=name,
@@ -109,31 +275,28 @@ def add_child(user_id: str, name: str, age: int, gender: str, birth_date: Dict)
         created_at=datetime.now().isoformat()
     )
     
-    user_data['children'].append(child.dict())
-    update_user_data(user_id, user_data)
+    with unit_of_work(user_id) as uow:
+        uow.record('add_child', child=child.dict())
     
     logger.info(f"Child added for user {user_id}: {name}")
     return child.id
 
 def get_children(user_id: str) -> List[Dict]:
     """Get all children for a user"""
-    user_data = get_user_data(user_id)
-    return user_data.get('children', [])
+    return _read_user(user_id, lambda user, index: user.get('children', []))
 
 def get_child(user_id: str, child_id: str) -> Optional[Dict]:
     """Get a specific child"""
-    children = get_children(user_id)
-    for child in children:
-        if child['id'] == child_id:
-            return child
-    return None
+    def read(user: Dict, index: PlanIndex) -> Optional[Dict]:
+        position = index.child_position(user_id, child_id)
+        return user['children'][position] if position is not None else None
+    
+    return _read_user(user_id, read)
 
 # ==================== Test Result Management Functions ====================
 
 def add_test_result(user_id: str, child_id: str, test_type: str, results: Dict) -> str:
     """Add a test result"""
-    user_data = get_user_data(user_id)
-    
     test_result = TestResult(
         id=f"test_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
         child_id=child_id,
@@ -142,29 +305,27 @@ def add_test_result(user_id: str, child_id: str, test_type: str, results: Dict)
         timestamp=datetime.now().isoformat()
     )
     
-    user_data['test_results'].append(test_result.dict())
-    update_user_data(user_id, user_data)
+    with unit_of_work(user_id) as uow:
+        uow.record('add_test_result', test_result=test_result.dict())
     
     logger.info(f"Test result added for child {child_id}: {test_type}")
     return test_result.id
 
 def get_test_results(user_id: str, child_id: Optional[str] = None) -> List[Dict]:
     """Get test results for a user or specific child"""
-    user_data = get_user_data(user_id)
-    results = user_data.get('test_results', [])
-    
-    if child_id:
-        results = [r for r in results if r['child_id'] == child_id]
+    def read(user: Dict, index: PlanIndex) -> List[Dict]:
+        results = user.get('test_results', [])
+        if child_id:
+            results = [r for r in results if r['child_id'] == child_id]
+        return results
     
-    return results
+    return _read_user(user_id, read)
 
 # ==================== Training Plan Management Functions ====================
 
 def create_training_plan(user_id: str, child_id: str, plan_name: str, 
                         start_date: str, end_date: str, daily_tasks: List[Dict]) -> str:
     """Create a new training plan"""
-    user_data = get_user_data(user_id)
-    
     plan = TrainingPlan(
         id=f"plan_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
         child_id=child_id,
@@ -176,58 +337,37 @@ def create_training_plan(user_id: str, child_id: str, plan_name: str,
         created_at=datetime.now().isoformat()
     )
     
-    user_data['training_plans'].append(plan.dict())
-    update_user_data(user_id, user_data)
+    with unit_of_work(user_id) as uow:
+        uow.record('create_training_plan', plan=plan.dict())
     
     logger.info(f"Training plan created for child {child_id}: {plan_name}")
     return plan.id
 
 def get_training_plans(user_id: str, child_id: Optional[str] = None) -> List[Dict]:
     """Get training plans for a user or specific child"""
-    user_data = get_user_data(user_id)
-    plans = user_data.get('training_plans', [])
+    def read(user: Dict, index: PlanIndex) -> List[Dict]:
+        plans = user.get('training_plans', [])
+        if child_id:
+            plans = [
+                plans[index.plan_position(user_id, plan_id)]
+                for plan_id in index.plans_for_child(user_id, child_id)
+            ]
+        return plans
     
-    if child_id:
-        plans = [p for p in plans if p['child_id'] == child_id]
-    
-    return plans
+    return _read_user(user_id, read)
 
 def get_training_plan(user_id: str, plan_id: str) -> Optional[Dict]:
     """Get a specific training plan"""
-    plans = get_training_plans(user_id)
-    for plan in plans:
-        if plan['id'] == plan_id:
-            return plan
-    return None
+    return _read_user(user_id, lambda user, index: _find_plan(user_id, user, plan_id, index))
 
 def update_daily_task(user_id: str, plan_id: str, day: int, status: str, notes: Optional[str] = None):
     """Update a daily task status"""
-    plan = get_training_plan(user_id, plan_id)
-    if not plan:
-        raise Exception("Training plan not found")
-    
-    # Update task
-    for task in plan['daily_tasks']:
-        if task['day'] == day:
-            task['status'] = status
-            if notes:
-                task['notes'] = notes
-            if 'completed_at' not in task:
-                task['completed_at'] = datetime.now().isoformat()
-            break
-    
-    # Update completed days
-    if day not in plan['completed_days']:
-        plan['completed_days'].append(day)
-    
-    # Save updated plan
-    user_data = get_user_data(user_id)
-    for i, p in enumerate(user_data['training_plans']):
-        if p['id'] == plan_id:
-            user_data['training_plans'][i] = plan
-            break
+    with unit_of_work(user_id) as uow:
+        if not _find_plan(user_id, uow.user, plan_id):
+            raise Exception("Training plan not found")
+        
+        uow.record('update_daily_task', plan_id=plan_id, day=day, status=status, notes=notes)
     
-    update_user_data(user_id, user_data)
     logger.info(f"Task day {day} updated in plan {plan_id}")
 
 def get_current_task(user_id: str, child_id: str) -> Optional[Dict]:
@@ -250,7 +390,9 @@ def get_current_task(user_id: str, child_id: str) -> Optional[Dict]:
     day = (current_date - start_date).days + 1
     
     # Find tasks for current day
-    current_tasks = [t for t in plan['daily_tasks'] if t['day'] == day]
+    current_tasks = [
+        plan['daily_tasks'][i] for i in _index_for(user_id).task_positions(user_id, plan['id'], day)
+    ]
     
     return {
         'plan': plan,
@@ -0,0 +1,30 @@
+"""
+Minimal Bloom filter for fast negative membership checks
+"""
+import hashlib
+from typing import Iterable
+
+
+class BloomFilter:
+    """Bit array with double hashing; false positives possible, false negatives not"""
+
+    def __init__(self, num_bits: int, num_hashes: int = 4, keys: Iterable[str] = ()):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = num_hashes
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        for key in keys:
+            self.add(key)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
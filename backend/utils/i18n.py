@@ -21,8 +21,10 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "success.test_result_submitted": "Test result submitted successfully",
         "success.plan_created": "Training plan created successfully",
         "success.plan_generated": "Training plan generated successfully",
+        "success.plans_batch_generated": "Generated {succeeded} of {total} training plans",
         "success.task_updated": "Task updated successfully",
         "success.user_data_retrieved": "User data retrieved successfully",
+        "success.user_data_imported": "User data imported successfully",
         "success.assessment_completed": "Assessment analysis completed",
         "success.model_training_started": "Model training started, please check status later",
         
@@ -48,6 +50,7 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "error.get_current_task_failed": "Failed to get current task",
         "error.get_progress_failed": "Failed to get progress",
         "error.get_user_data_failed": "Failed to get user data",
+        "error.import_user_data_failed": "Failed to import user data",
         "error.insufficient_data": "Insufficient data",
         
         # Activity Types and Names
@@ -220,8 +223,10 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "success.test_result_submitted": "测试结果提交成功",
         "success.plan_created": "训练计划创建成功",
         "success.plan_generated": "训练计划生成成功",
+        "success.plans_batch_generated": "已生成 {succeeded}/{total} 个训练计划",
         "success.task_updated": "任务更新成功",
         "success.user_data_retrieved": "用户数据获取成功",
+        "success.user_data_imported": "用户数据导入成功",
         "success.assessment_completed": "评估分析完成",
         "success.model_training_started": "模型训练已开始，请稍后查看状态",
         
@@ -247,6 +252,7 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "error.get_current_task_failed": "获取当前任务失败",
         "error.get_progress_failed": "获取进度失败",
         "error.get_user_data_failed": "获取用户数据失败",
+        "error.import_user_data_failed": "导入用户数据失败",
         "error.insufficient_data": "数据不足",
         
         # Activity Types and Names